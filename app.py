@@ -1,25 +1,60 @@
-import random
+from collections import Counter
+import io
+import json
+from datetime import date, datetime, timedelta, timezone
+from html import escape
 from pathlib import Path
+import hashlib
+import tempfile
+import time
+import uuid
 
 import streamlit as st
-
+import streamlit.components.v1 as components
+
+import boot_metrics
+import rerun_profiler
+from catalog_cache import (
+    backend_name as catalog_cache_backend,
+    find_cached_published_story,
+    get_cached_active_collections,
+    get_cached_all_published_stories,
+    get_cached_published_stories,
+    invalidate_catalog,
+    revalidate_catalog,
+)
+from models import StorySummary
 from stories_repository import (
-    get_active_collections,
-    get_all_published_stories,
-    get_published_stories_by_collection,
+    get_family_by_slug,
+    get_published_story,
     list_collections_for_admin,
     create_collection,
     update_collection,
     list_stories_for_collection_admin,
     create_story,
     update_story,
+    bulk_update_stories,
     update_story_media,
+    refresh_missing_story_artifacts,
     delete_story,
     log_story_read,
     get_recent_reads,
     get_read_count_by_story,
+    list_reading_log_partitions,
+    apply_reading_log_retention,
+    enqueue_media_job,
+    list_media_jobs,
+    retry_failed_media_jobs,
+    list_flagged_media,
 )
+from media_health import MEDIA_FIELD_LABELS, run_media_health_scan
+from media_jobs import media_job_key
+from reading_log_export import EXPORT_FORMATS, export_reading_log, parquet_available, write_month_archive
+from story_artifacts import format_reading_time
+from story_pages import load_page, page_count, prefetch_page
+from story_sampler import DEFAULT_NO_REPEAT, StorySampler, catalog_signature, rarity_weights
 from supabase_client import get_supabase_client
+from warmup import start_background_warmup
 
 
 def upload_media_file(client, bucket: str, path: str, file_obj):
@@ -41,6 +76,58 @@ def upload_media_file(client, bucket: str, path: str, file_obj):
         return None
 
 
+def media_source_path(folder: str, name: str, file_obj, default_ext: str) -> str:
+    """Caminho do arquivo original enviado, único por conteúdo (``<pasta>/<nome>-original-<hash><ext>``).
+
+    Com um caminho fixo, o upsert troca o arquivo e a URL continua a mesma: um job
+    antigo ainda na fila passaria pela conferência de URL da troca de mídia e
+    gravaria por cima a versão processada do arquivo anterior.
+    """
+
+    digest = hashlib.sha256(file_obj.getvalue()).hexdigest()[:16]
+    ext = Path(file_obj.name).suffix or default_ext
+    return f"{folder}/{name}-original-{digest}{ext}"
+
+
+def enqueue_media_processing(client, kind: str, owner_id: str, bucket: str, path: str, file_obj, public_url: str) -> bool:
+    """Enfileira o processamento (hash, redução, conversão) do arquivo recém-enviado.
+
+    O trabalho roda em tools/media_worker.py; aqui só gravamos o job, então o
+    salvamento do admin volta na hora. ``owner_id`` é a história ou, para capas
+    (``kind="cover"``), a coleção.
+    """
+
+    fingerprint = getattr(file_obj, "file_id", None) or f"{file_obj.name}:{file_obj.size}"
+    is_cover = kind == "cover"
+    return enqueue_media_job(
+        client,
+        media_job_key(kind, owner_id, path, fingerprint),
+        kind,
+        None if is_cover else owner_id,
+        {"bucket": bucket, "path": path, "source_url": public_url},
+        collection_id=owner_id if is_cover else None,
+    )
+
+
+def save_collection_cover(client, collection_id: str, cover_file) -> bool:
+    """Envia a capa original, limpa a miniatura antiga e enfileira a geração da nova."""
+
+    cover_path = media_source_path(f"collections/{collection_id}", "cover", cover_file, ".png")
+    cover_url = upload_media_file(client, "story-images", cover_path, cover_file)
+    if not cover_url:
+        return False
+
+    update_collection(
+        client,
+        collection_id,
+        {"cover_url": cover_url, "cover_thumb_url": None, "cover_placeholder": None},
+    )
+    enqueue_media_processing(
+        client, "cover", collection_id, "story-images", cover_path, cover_file, cover_url
+    )
+    return True
+
+
 def get_mode_from_query_params() -> str:
     """Lê o parâmetro de querystring e define o modo atual."""
     params = st.experimental_get_query_params()
@@ -50,11 +137,43 @@ def get_mode_from_query_params() -> str:
     return "reader"
 
 
-def reader_pin_gate() -> bool:
-    """Valida o PIN do modo leitor usando secrets e session_state."""
+DEFAULT_FAMILY_SLUG = "principal"
+
+
+def get_family_slug() -> str:
+    """Família da URL (``?family=slug``); sem ela, DEFAULT_FAMILY dos secrets ou a família padrão."""
+
+    params = st.experimental_get_query_params()
+    slug = params.get("family", [""])[0].strip().lower()
+    if slug:
+        return slug
+    try:
+        slug = st.secrets.get("DEFAULT_FAMILY")
+    except Exception:
+        slug = None
+    return str(slug or DEFAULT_FAMILY_SLUG).strip().lower()
+
+
+def get_current_family(client):
+    """Família atual (id, slug, nome e PIN), buscada uma vez por sessão. None se não existir."""
+
+    slug = get_family_slug()
+    families = st.session_state.setdefault("families", {})
+    if slug not in families:
+        family = get_family_by_slug(client, slug)
+        # Falhas não ficam guardadas: a próxima interação tenta de novo
+        if family is None:
+            return None
+        families[slug] = family
+    return families[slug]
+
+
+def reader_pin_gate(family=None) -> bool:
+    """Valida o PIN do modo leitor (o da família ou READER_PIN dos secrets) usando session_state."""
 
+    auth_key = f"reader_authenticated_{family['slug']}" if family else "reader_authenticated"
     try:
-        configured_pin = st.secrets.get("READER_PIN")
+        configured_pin = (family or {}).get("reader_pin") or st.secrets.get("READER_PIN")
     except Exception:
         st.warning(
             "Não foi possível verificar o PIN nos secrets. O acesso está liberado,"
@@ -70,7 +189,7 @@ def reader_pin_gate() -> bool:
         )
         return True
 
-    if st.session_state.get("reader_authenticated") is True:
+    if st.session_state.get(auth_key) is True:
         return True
 
     st.subheader("Digite o PIN para continuar")
@@ -78,7 +197,7 @@ def reader_pin_gate() -> bool:
 
     if st.button("Entrar"):
         if pin_input == str(configured_pin):
-            st.session_state["reader_authenticated"] = True
+            st.session_state[auth_key] = True
             st.rerun()
         else:
             st.error("PIN incorreto. Tente novamente.")
@@ -125,34 +244,252 @@ def admin_login_gate() -> bool:
     return False
 
 
-def render_story_content(story: dict) -> None:
-    """Exibe título, corpo, imagem e mensagens auxiliares da história."""
-    st.header(story.get("title", "História"))
+@rerun_profiler.profiled("conteúdo da história")
+def render_story_content(client, story: StorySummary) -> None:
+    """Exibe título, imagem, a página atual do texto e mensagens auxiliares da história."""
+    st.header(story.title)
+
+    reading_time = format_reading_time(story.reading_time_seconds)
+    if reading_time:
+        st.caption(reading_time)
 
-    image_url = story.get("image_url")
+    image_url = story.image_url
     if image_url:
         st.image(image_url, use_column_width=True)
-        button_key = f"view_image_{story.get('id', 'story')}"
+        button_key = f"view_image_{story.id}"
         if st.button("Ver imagem em tela cheia", key=button_key):
             with st.modal("Imagem da história"):
                 st.image(image_url, use_column_width=True)
 
-    body = story.get("body", "") or ""
-    paragraphs = [p.strip() for p in body.split("\n\n") if p.strip()]
-    if not paragraphs:
-        paragraphs = [body]
+    # Leitura paginada: lembra a página de cada história enquanto a aba estiver aberta
+    story_id = story.id
+    total_pages = page_count(story)
+    pages_by_story = st.session_state.setdefault("reader_page_by_story", {})
+    current_page = min(max(int(pages_by_story.get(story_id, 0)), 0), total_pages - 1)
 
+    family_id = st.session_state.get("reader_family_id")
+    with rerun_profiler.phase("texto da página"):
+        paragraphs = load_page(client, story, current_page, family_id)
     for paragraph in paragraphs:
         st.write(paragraph)
 
-    audio_url = story.get("audio_url")
-    if audio_url:
+    # Enquanto a página atual é lida, a próxima já é buscada em segundo plano
+    prefetch_page(client, story, current_page + 1, family_id)
+
+    if total_pages > 1:
+        prev_col, info_col, next_col = st.columns([1, 2, 1])
+        with prev_col:
+            if st.button(
+                "Página anterior",
+                key=f"prev_page_{story_id}",
+                disabled=current_page == 0,
+                use_container_width=True,
+            ):
+                pages_by_story[story_id] = current_page - 1
+                st.rerun()
+        with info_col:
+            st.caption(f"Página {current_page + 1} de {total_pages}")
+        with next_col:
+            if st.button(
+                "Próxima página",
+                key=f"next_page_{story_id}",
+                disabled=current_page >= total_pages - 1,
+                use_container_width=True,
+            ):
+                pages_by_story[story_id] = current_page + 1
+                st.rerun()
+
+    audio_url = story.audio_url
+    if story.audio_playlist_url:
+        render_segmented_audio(story.audio_playlist_url, audio_url)
+        st.caption("Ouvir esta história")
+    elif audio_url:
         st.audio(audio_url)
         st.caption("Ouvir esta história")
     else:
         st.info("Áudio desta história ainda não está disponível.")
 
 
+HLS_JS_URL = "https://cdn.jsdelivr.net/npm/hls.js@1/dist/hls.light.min.js"
+
+
+def render_segmented_audio(playlist_url: str, fallback_url=None) -> None:
+    """Player do áudio em segmentos (HLS): toca a partir do primeiro trecho, sem baixar a narração inteira.
+
+    Safari toca a playlist direto; nos demais navegadores o hls.js busca os
+    segmentos sob demanda. Nada é baixado antes do play. Sem suporte a HLS, cai
+    para o arquivo único.
+    """
+
+    # "</" escapado para a URL não conseguir fechar a tag <script>
+    playlist = json.dumps(playlist_url).replace("</", "<\\/")
+    fallback = json.dumps(fallback_url or "").replace("</", "<\\/")
+    components.html(
+        f"""
+<audio id="player" controls preload="none" style="width: 100%;"></audio>
+<script src="{escape(HLS_JS_URL)}"></script>
+<script>
+  const audio = document.getElementById("player");
+  const playlist = {playlist};
+  const fallback = {fallback};
+  if (audio.canPlayType("application/vnd.apple.mpegurl")) {{
+    audio.src = playlist;
+  }} else if (window.Hls && Hls.isSupported()) {{
+    const hls = new Hls({{ autoStartLoad: false }});
+    hls.loadSource(playlist);
+    hls.attachMedia(audio);
+    audio.addEventListener("play", () => hls.startLoad(), {{ once: true }});
+  }} else if (fallback) {{
+    audio.src = fallback;
+  }}
+</script>
+""",
+        height=64,
+    )
+
+
+def render_collection_cover(collection) -> None:
+    """Capa da coleção: placeholder embutido no HTML e miniatura carregada sob demanda.
+
+    O placeholder (poucos bytes, já vem no catálogo em cache) aparece na hora; a
+    miniatura só é baixada pelo navegador quando o cartão fica visível.
+    """
+
+    image_url = collection.cover_thumb_url or collection.cover_url
+    if not image_url and not collection.cover_placeholder:
+        return
+
+    background = (
+        f"background: #f1ece4 url('{escape(collection.cover_placeholder)}') center / cover no-repeat;"
+        if collection.cover_placeholder
+        else "background: #f1ece4;"
+    )
+    image = (
+        f'<img src="{escape(image_url)}" alt="" loading="lazy" decoding="async"'
+        ' style="width: 100%; height: 100%; object-fit: cover; display: block;">'
+        if image_url
+        else ""
+    )
+    st.markdown(
+        f'<div style="aspect-ratio: 4 / 3; border-radius: 12px; overflow: hidden; {background}">{image}</div>',
+        unsafe_allow_html=True,
+    )
+
+
+NIGHT_STORY_HISTORY_SIZE = 30
+
+
+def get_night_story_settings():
+    """Lê NIGHT_STORY_NO_REPEAT e NIGHT_STORY_WEIGHT_BY_READS dos secrets."""
+
+    try:
+        no_repeat = st.secrets.get("NIGHT_STORY_NO_REPEAT")
+        weight_by_reads = st.secrets.get("NIGHT_STORY_WEIGHT_BY_READS", False)
+    except Exception:
+        return DEFAULT_NO_REPEAT, False
+
+    try:
+        no_repeat = int(no_repeat) if no_repeat is not None else DEFAULT_NO_REPEAT
+    except (TypeError, ValueError):
+        no_repeat = DEFAULT_NO_REPEAT
+    return max(0, no_repeat), str(weight_by_reads).lower() in {"1", "true", "sim", "yes"}
+
+
+READ_EVENT_DEDUPE_SECONDS = 300
+
+
+def record_story_open(client, story_id, collection_id, source: str, family_id=None) -> None:
+    """Registra a abertura de uma história no histórico, no máximo uma vez por abertura.
+
+    Reabrir a mesma história na sessão dentro de ``READ_EVENT_DEDUPE_SECONDS``
+    (reruns, toques duplos) conta como a mesma leitura e não grava nada. Se a
+    gravação anterior falhou, ela é repetida com o mesmo id e horário: o banco
+    ignora o evento se ele já tiver chegado.
+    """
+
+    now = time.time()
+    events = st.session_state.setdefault("read_events", {})
+    for key in [key for key, event in events.items() if now - event["at"] > READ_EVENT_DEDUPE_SECONDS]:
+        del events[key]
+
+    event = events.get(story_id)
+    if event is None:
+        event = {
+            "id": str(uuid.uuid4()),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "at": now,
+            "logged": False,
+        }
+        events[story_id] = event
+    if event["logged"]:
+        return
+
+    event["logged"] = log_story_read(
+        client,
+        story_id,
+        collection_id,
+        source=source,
+        event_id=event["id"],
+        created_at=event["created_at"],
+        family_id=family_id,
+    )
+
+
+def remember_night_story(story_id, drawn_by=None) -> None:
+    """Guarda a história aberta no histórico da sessão usado para evitar repetições.
+
+    O histórico vale para o sorteio geral e para cada coleção: a história também
+    entra na memória de noites recentes dos sorteadores da sessão (menos o que a
+    sorteou, ``drawn_by``, que já a registrou).
+    """
+
+    history = st.session_state.setdefault("night_story_history", [])
+    history.append(story_id)
+    del history[:-NIGHT_STORY_HISTORY_SIZE]
+    for _, _, sampler in st.session_state.get("night_story_samplers", {}).values():
+        if sampler is not drawn_by:
+            sampler.remember(story_id)
+
+
+def draw_night_story(client, candidate_stories, collection_id, family_id=None):
+    """Sorteia a "História da noite" com o sorteador da sessão para esta coleção.
+
+    A sessão guarda, por coleção, a tupla de histórias do cache do catálogo, um
+    índice id -> história e o sorteador. Enquanto o cache devolve a mesma tupla,
+    cada clique só tira a próxima carta; uma tupla nova (lista buscada de novo)
+    só remonta o sorteador se o conjunto de histórias mudou.
+    """
+
+    samplers = st.session_state.setdefault("night_story_samplers", {})
+    key = collection_id or "__all__"
+
+    entry = samplers.get(key)
+    if entry is None or entry[0] is not candidate_stories:
+        story_ids = [s.id for s in candidate_stories]
+        stories_by_id = {s.id: s for s in candidate_stories}
+        sampler = entry[2] if entry else None
+        if sampler is None or sampler.signature != catalog_signature(story_ids):
+            no_repeat, weight_by_reads = get_night_story_settings()
+            weights = None
+            if weight_by_reads:
+                read_counts = {
+                    item.get("story_id"): item.get("read_count", 0)
+                    for item in get_read_count_by_story(client, family_id)
+                }
+                weights = rarity_weights(story_ids, read_counts)
+            # O histórico é da sessão inteira: o sorteador novo começa com as últimas noites
+            history = st.session_state.get("night_story_history", [])
+            sampler = StorySampler(story_ids, weights=weights, no_repeat=no_repeat)
+            if sampler.window:
+                sampler.recent.extend(history[-sampler.window:])
+        entry = samplers[key] = (candidate_stories, stories_by_id, sampler)
+
+    _, stories_by_id, sampler = entry
+    chosen_id = sampler.draw()
+    remember_night_story(chosen_id, drawn_by=sampler)
+    return stories_by_id[chosen_id]
+
+
 def render_reader_mode() -> None:
     """Renderiza a tela principal para leitura das histórias."""
     st.title("Histórias do Benício")
@@ -173,15 +510,14 @@ def render_reader_mode() -> None:
         """
     )
 
-    if not reader_pin_gate():
+    client = get_supabase_client()
+    family = get_current_family(client) if client is not None else None
+    if client is not None and family is None:
+        st.error(f"Família \"{get_family_slug()}\" não encontrada. Confira o endereço recebido.")
         return
 
-    st.session_state.setdefault("current_collection_id", None)
-    st.session_state.setdefault("current_story_id", None)
-    st.session_state.setdefault("last_random_story_id", None)
-    st.session_state.setdefault("reader_focus_mode", False)
-
-    client = get_supabase_client()
+    if not reader_pin_gate(family):
+        return
 
     if client is None:
         st.info(
@@ -191,13 +527,38 @@ def render_reader_mode() -> None:
         )
         return
 
+    family_id = family["id"]
+    # Trocar de família na mesma sessão recomeça a navegação e os sorteios
+    if st.session_state.get("reader_family_id") != family_id:
+        for key in (
+            "current_collection_id",
+            "current_story_id",
+            "last_random_story_id",
+            "reader_focus_mode",
+            "night_story_samplers",
+            "night_story_history",
+            "read_events",
+        ):
+            st.session_state.pop(key, None)
+        st.session_state["reader_family_id"] = family_id
+
+    st.session_state.setdefault("current_collection_id", None)
+    st.session_state.setdefault("current_story_id", None)
+    st.session_state.setdefault("last_random_story_id", None)
+    st.session_state.setdefault("reader_focus_mode", False)
+
+    # Uma consulta pequena às versões do catálogo; só listas alteradas são buscadas de novo
+    with rerun_profiler.phase("revalidação do catálogo"):
+        revalidate_catalog(client, family_id)
+
     def fetch_story_by_id(story_id: str):
-        try:
-            all_published = get_all_published_stories(client)
-            return next((s for s in all_published if s.get("id") == story_id), None)
-        except Exception as exc:  # pragma: no cover - log simples
-            print(f"[Supabase] Erro ao buscar história por id: {exc}")
-            return None
+        # Busca só os dados da história (do cache, quando possível); o texto vem por
+        # páginas em render_story_content
+        story = find_cached_published_story(story_id, family_id)
+        if story is None:
+            row = get_published_story(client, story_id, family_id)
+            story = StorySummary.from_row(row) if row else None
+        return story
 
     # Modo focado: mostra apenas a história escolhida e um botão de voltar
     if st.session_state.get("reader_focus_mode") and st.session_state.get("current_story_id"):
@@ -208,7 +569,7 @@ def render_reader_mode() -> None:
             return
 
         if story:
-            render_story_content(story)
+            render_story_content(client, story)
             return
 
         st.info(
@@ -217,55 +578,57 @@ def render_reader_mode() -> None:
         st.session_state["reader_focus_mode"] = False
         st.session_state["current_story_id"] = None
 
-    collections = get_active_collections(client)
+    with rerun_profiler.phase("coleções"):
+        collections = get_cached_active_collections(client, family_id)
 
     if not collections:
         st.info("Nenhuma coleção disponível ainda. Cadastre novas coleções no Supabase.")
         return
 
     selected_collection = next(
-        (c for c in collections if c.get("id") == st.session_state.get("current_collection_id")),
+        (c for c in collections if c.id == st.session_state.get("current_collection_id")),
         None,
     )
 
     st.markdown("### Escolha uma coleção")
     cols_per_row = min(3, len(collections)) or 1
-    for start in range(0, len(collections), cols_per_row):
-        row = st.columns(cols_per_row)
-        for col, collection in zip(row, collections[start : start + cols_per_row]):
-            with col:
-                st.markdown(f"#### {collection.get('name', 'Coleção')}")
-                if collection.get("description"):
-                    st.caption(collection.get("description"))
-
-                is_selected = selected_collection and collection.get("id") == selected_collection.get("id")
-                button_label = "Coleção selecionada" if is_selected else "Ler esta coleção"
-                if st.button(button_label, key=f"collection_btn_{collection.get('id')}", use_container_width=True):
-                    st.session_state["current_collection_id"] = collection.get("id")
-                    st.session_state["current_story_id"] = None
-                    st.session_state["last_random_story_id"] = None
-                    st.session_state["reader_focus_mode"] = False
-                    selected_collection = collection
-                    st.rerun()
+    with rerun_profiler.phase("grade de coleções"):
+        for start in range(0, len(collections), cols_per_row):
+            row = st.columns(cols_per_row)
+            for col, collection in zip(row, collections[start : start + cols_per_row]):
+                with col:
+                    render_collection_cover(collection)
+                    st.markdown(f"#### {collection.name}")
+                    if collection.description:
+                        st.caption(collection.description)
+
+                    is_selected = selected_collection and collection.id == selected_collection.id
+                    button_label = "Coleção selecionada" if is_selected else "Ler esta coleção"
+                    if st.button(button_label, key=f"collection_btn_{collection.id}", use_container_width=True):
+                        st.session_state["current_collection_id"] = collection.id
+                        st.session_state["current_story_id"] = None
+                        st.session_state["last_random_story_id"] = None
+                        st.session_state["reader_focus_mode"] = False
+                        selected_collection = collection
+                        st.rerun()
 
     if selected_collection:
-        st.success(f"Coleção escolhida: {selected_collection.get('name')}")
+        st.success(f"Coleção escolhida: {selected_collection.name}")
     else:
         st.info("Escolha uma coleção acima ou use o botão de sorteio.")
 
     stories_in_collection = []
     if selected_collection:
-        stories_in_collection = get_published_stories_by_collection(
-            client, selected_collection.get("id")
-        )
-        for story in stories_in_collection:
-            story.setdefault("collection_id", selected_collection.get("id"))
+        with rerun_profiler.phase("histórias da coleção"):
+            stories_in_collection = get_cached_published_stories(
+                client, family_id, selected_collection.id
+            )
 
     st.markdown("---")
     st.markdown("### História da noite")
     if st.button("História da noite", use_container_width=True):
         candidate_stories = (
-            stories_in_collection if selected_collection else get_all_published_stories(client)
+            stories_in_collection if selected_collection else get_cached_all_published_stories(client, family_id)
         )
 
         if not candidate_stories:
@@ -273,17 +636,22 @@ def render_reader_mode() -> None:
                 "Ainda não há histórias publicadas para sortear. Cadastre e publique histórias no painel admin."
             )
         else:
-            last_id = st.session_state.get("last_random_story_id")
-            pool = [s for s in candidate_stories if s.get("id") != last_id] or candidate_stories
-            chosen_story = random.choice(pool)
-            st.session_state["last_random_story_id"] = chosen_story.get("id")
-            st.session_state["current_story_id"] = chosen_story.get("id")
-            chosen_collection_id = chosen_story.get("collection_id")
+            chosen_story = draw_night_story(
+                client,
+                candidate_stories,
+                selected_collection.id if selected_collection else None,
+                family_id,
+            )
+            st.session_state["last_random_story_id"] = chosen_story.id
+            st.session_state["current_story_id"] = chosen_story.id
+            chosen_collection_id = chosen_story.collection_id
             if chosen_collection_id:
                 st.session_state["current_collection_id"] = chosen_collection_id
 
             st.session_state["reader_focus_mode"] = True
-            log_story_read(client, chosen_story.get("id"), chosen_collection_id, source="random")
+            record_story_open(
+                client, chosen_story.id, chosen_collection_id, source="random", family_id=family_id
+            )
             st.success("História sorteada! Aproveitem a leitura.")
             st.rerun()
 
@@ -299,40 +667,47 @@ def render_reader_mode() -> None:
                 "Toque em uma das histórias abaixo ou use o botão de sorteio para descobrir a história da noite."
             )
             cols_per_row = 2
-            for start in range(0, len(stories_in_collection), cols_per_row):
-                row = st.columns(cols_per_row)
-                for col, story in zip(row, stories_in_collection[start : start + cols_per_row]):
-                    with col:
-                        st.markdown(f"**{story.get('title', 'História')}**")
-                        if st.button("Ler esta história", key=f"story_btn_{story.get('id')}", use_container_width=True):
-                            st.session_state["current_story_id"] = story.get("id")
-                            st.session_state["last_random_story_id"] = None
-                            st.session_state["reader_focus_mode"] = True
-                            log_story_read(
-                                client,
-                                story.get("id"),
-                                st.session_state.get("current_collection_id"),
-                                source="manual",
-                            )
-                            st.rerun()
+            with rerun_profiler.phase("grade de histórias"):
+                for start in range(0, len(stories_in_collection), cols_per_row):
+                    row = st.columns(cols_per_row)
+                    for col, story in zip(row, stories_in_collection[start : start + cols_per_row]):
+                        with col:
+                            st.markdown(f"**{story.title}**")
+                            reading_time = format_reading_time(story.reading_time_seconds)
+                            if reading_time:
+                                st.caption(reading_time)
+                            if st.button("Ler esta história", key=f"story_btn_{story.id}", use_container_width=True):
+                                st.session_state["current_story_id"] = story.id
+                                st.session_state["last_random_story_id"] = None
+                                st.session_state["reader_focus_mode"] = True
+                                remember_night_story(story.id)
+                                record_story_open(
+                                    client,
+                                    story.id,
+                                    st.session_state.get("current_collection_id"),
+                                    source="manual",
+                                    family_id=family_id,
+                                )
+                                st.rerun()
 
     # Caso o usuário já tenha uma história selecionada, exibe o conteúdo padrão
     if st.session_state.get("current_story_id"):
         story_to_display = fetch_story_by_id(st.session_state.get("current_story_id"))
         if story_to_display:
             st.markdown("---")
-            render_story_content(story_to_display)
+            render_story_content(client, story_to_display)
         else:
             st.info("Escolha ou sorteie uma história para começar a leitura.")
     else:
         st.info("Escolha ou sorteie uma história para começar a leitura.")
 
 
-def render_collections_admin(client) -> None:
-    """Interface de criação e edição de coleções."""
+@rerun_profiler.profiled("admin: coleções")
+def render_collections_admin(client, family_id) -> None:
+    """Interface de criação e edição das coleções da família."""
 
     st.header("Coleções")
-    collections = list_collections_for_admin(client)
+    collections = list_collections_for_admin(client, family_id)
 
     if collections:
         st.table(
@@ -355,6 +730,12 @@ def render_collections_admin(client) -> None:
         description = st.text_area("Descrição", key="create_collection_description")
         sort_order = st.number_input("Ordem", value=0, step=1, key="create_collection_sort")
         is_active = st.checkbox("Coleção ativa", value=True, key="create_collection_active")
+        cover_file = st.file_uploader(
+            "Capa da coleção (opcional)",
+            type=["png", "jpg", "jpeg", "webp"],
+            accept_multiple_files=False,
+            key="create_collection_cover_upload",
+        )
         submitted = st.form_submit_button("Criar coleção")
 
         if submitted:
@@ -368,11 +749,17 @@ def render_collections_admin(client) -> None:
                         "description": description.strip() if description else None,
                         "sort_order": int(sort_order),
                         "is_active": is_active,
+                        "family_id": family_id,
                     },
                 )
                 if created:
-                    st.success("Coleção criada com sucesso!")
-                    st.rerun()
+                    cover_ok = not cover_file or save_collection_cover(client, created.get("id"), cover_file)
+                    invalidate_catalog(family_id)
+                    if cover_ok:
+                        st.success("Coleção criada com sucesso!")
+                        st.rerun()
+                    else:
+                        st.error("Coleção criada, mas não foi possível enviar a capa. Tente novamente.")
                 else:
                     st.error("Não foi possível criar a coleção agora. Tente novamente.")
 
@@ -409,6 +796,14 @@ def render_collections_admin(client) -> None:
             value=bool(selected_collection.get("is_active", True)),
             key="edit_collection_active",
         )
+        if selected_collection.get("cover_url"):
+            st.caption("Esta coleção já tem capa; envie outra imagem para trocá-la.")
+        edit_cover_file = st.file_uploader(
+            "Capa da coleção (opcional)",
+            type=["png", "jpg", "jpeg", "webp"],
+            accept_multiple_files=False,
+            key="edit_collection_cover_upload",
+        )
 
         save_changes = st.form_submit_button("Salvar alterações")
         if save_changes:
@@ -426,13 +821,226 @@ def render_collections_admin(client) -> None:
                     },
                 )
                 if updated:
-                    st.success("Coleção atualizada com sucesso!")
-                    st.rerun()
+                    cover_ok = not edit_cover_file or save_collection_cover(
+                        client, selected_collection.get("id"), edit_cover_file
+                    )
+                    invalidate_catalog(family_id)
+                    if cover_ok:
+                        st.success("Coleção atualizada com sucesso!")
+                        st.rerun()
+                    else:
+                        st.error("Coleção atualizada, mas não foi possível enviar a capa. Tente novamente.")
                 else:
                     st.error("Não foi possível atualizar a coleção. Tente novamente.")
 
 
-def render_stories_admin(client, collections) -> None:
+@rerun_profiler.profiled("admin: edição em lote")
+def render_stories_bulk_editor(client, collections, stories, family_id) -> None:
+    """Tabela editável para reordenar, publicar e mover várias histórias de uma vez."""
+
+    # A coluna de seleção do Streamlit não tem format_func: cada coleção ganha um rótulo
+    # único (nomes repetidos levam o início do id) e o rótulo escolhido volta para o id
+    name_counts = Counter(c.get("name", "Coleção") for c in collections)
+    collection_labels = {
+        c.get("id"): c.get("name", "Coleção")
+        if name_counts[c.get("name", "Coleção")] == 1
+        else f"{c.get('name', 'Coleção')} ({str(c.get('id'))[:8]})"
+        for c in collections
+    }
+    collection_ids = {label: cid for cid, label in collection_labels.items()}
+
+    st.caption(
+        "Edite ordem, publicação e coleção direto na tabela e salve tudo de uma vez."
+    )
+    edited_rows = st.data_editor(
+        [
+            {
+                "id": s.get("id"),
+                "título": s.get("title"),
+                "publicada": bool(s.get("is_published")),
+                "ordem": int(s.get("sort_order") or 0),
+                "coleção": collection_labels.get(s.get("collection_id"), ""),
+            }
+            for s in stories
+        ],
+        column_config={
+            "id": None,
+            "título": st.column_config.TextColumn("título", disabled=True),
+            "publicada": st.column_config.CheckboxColumn("publicada"),
+            "ordem": st.column_config.NumberColumn("ordem", step=1),
+            "coleção": st.column_config.SelectboxColumn(
+                "coleção", options=list(collection_ids.keys()), required=True
+            ),
+        },
+        hide_index=True,
+        use_container_width=True,
+        key=f"bulk_stories_editor_{stories[0].get('collection_id')}",
+    )
+    if hasattr(edited_rows, "to_dict"):
+        edited_rows = edited_rows.to_dict("records")
+
+    originals = {s.get("id"): s for s in stories}
+    updates = []
+    for row in edited_rows:
+        original = originals.get(row.get("id"))
+        if not original:
+            continue
+        change = {
+            "id": row.get("id"),
+            "sort_order": int(row.get("ordem") or 0),
+            "is_published": bool(row.get("publicada")),
+            "collection_id": collection_ids.get(row.get("coleção"), original.get("collection_id")),
+        }
+        if (
+            change["sort_order"] != int(original.get("sort_order") or 0)
+            or change["is_published"] != bool(original.get("is_published"))
+            or change["collection_id"] != original.get("collection_id")
+        ):
+            updates.append(change)
+
+    save_col, publish_col, unpublish_col = st.columns(3)
+    with save_col:
+        save_bulk = st.button(
+            f"Salvar alterações em lote ({len(updates)})",
+            disabled=not updates,
+            use_container_width=True,
+        )
+    pending_help = "Salva junto as alterações da tabela." if updates else None
+    with publish_col:
+        publish_all = st.button("Publicar todas", help=pending_help, use_container_width=True)
+    with unpublish_col:
+        unpublish_all = st.button("Despublicar todas", help=pending_help, use_container_width=True)
+
+    if publish_all or unpublish_all:
+        # As edições ainda não salvas da tabela (ordem, coleção) vão junto na mesma gravação
+        pending = {change["id"]: change for change in updates}
+        updates = []
+        for s in stories:
+            change = dict(pending.get(s.get("id"), {"id": s.get("id")}))
+            change["is_published"] = bool(publish_all)
+            if s.get("id") in pending or bool(s.get("is_published")) != bool(publish_all):
+                updates.append(change)
+
+    if save_bulk or publish_all or unpublish_all:
+        if not updates:
+            st.info("Nenhuma alteração para salvar.")
+        elif bulk_update_stories(client, updates, family_id):
+            invalidate_catalog(family_id)
+            st.success(f"{len(updates)} história(s) atualizada(s).")
+            st.rerun()
+        else:
+            st.error("Não foi possível salvar as alterações em lote. Tente novamente.")
+
+
+MEDIA_JOB_STATUS_LABELS = {
+    "pending": "Na fila",
+    "running": "Processando",
+    "done": "Concluído",
+    "failed": "Falhou",
+}
+MEDIA_JOB_KIND_LABELS = {"image": "Imagem", "audio": "Áudio", "cover": "Capa"}
+
+
+@rerun_profiler.profiled("admin: jobs de mídia")
+def render_media_jobs_status(client, stories, collection) -> None:
+    """Situação do processamento de mídia (fila media_jobs) das histórias e da capa da coleção."""
+
+    story_titles = {s.get("id"): s.get("title", "História") for s in stories}
+    collection_id = collection.get("id")
+    cover_label = f"Capa: {collection.get('name', 'Coleção')}"
+    jobs = list_media_jobs(client, list(story_titles), collection_id)
+    if not jobs:
+        return
+
+    pending = sum(1 for job in jobs if job.get("status") in {"pending", "running"})
+    failed = [job for job in jobs if job.get("status") == "failed"]
+    label = "Processamento de mídia"
+    if pending or failed:
+        label += f" ({pending} na fila, {len(failed)} com falha)"
+
+    with st.expander(label, expanded=bool(failed)):
+        st.caption(
+            "Imagens, áudios e capas enviados são reduzidos e convertidos em segundo plano por"
+            " tools/media_worker.py. A história (ou a coleção) continua com o arquivo original"
+            " até o job terminar."
+        )
+        st.dataframe(
+            [
+                {
+                    "história": story_titles.get(job.get("story_id"), "—") if job.get("story_id") else cover_label,
+                    "tipo": MEDIA_JOB_KIND_LABELS.get(job.get("kind"), job.get("kind")),
+                    "situação": MEDIA_JOB_STATUS_LABELS.get(job.get("status"), job.get("status")),
+                    "tentativas": f"{job.get('attempts', 0)}/{job.get('max_attempts', 0)}",
+                    # O erro gravado é um traceback curto; a última linha resume a causa
+                    "último erro": ((job.get("last_error") or "").strip().splitlines() or [""])[-1],
+                    "atualizado em": job.get("updated_at"),
+                }
+                for job in jobs
+            ],
+            use_container_width=True,
+            hide_index=True,
+        )
+        if failed and st.button("Reprocessar falhas", key="retry_media_jobs"):
+            retried = retry_failed_media_jobs(client, list(story_titles), collection_id)
+            st.success(f"{retried} job(s) voltaram para a fila.")
+            st.rerun()
+
+
+@rerun_profiler.profiled("admin: saúde dos links")
+def render_media_health_admin(client, family_id) -> None:
+    """Links de imagem e áudio com problema (quebrados, grandes demais, lentos ou de tipo inesperado)."""
+
+    flagged = list_flagged_media(client, family_id)
+    label = "Saúde dos links de mídia"
+    if flagged:
+        label += f" ({len(flagged)} com problema)"
+
+    with st.expander(label, expanded=bool(flagged)):
+        st.caption(
+            "Confere todos os links de imagem e áudio das histórias sem baixar os arquivos,"
+            " vários ao mesmo tempo. Também dá para rodar fora do app com"
+            " python -m tools.check_media_links."
+        )
+        if st.button("Verificar links agora", key="media_health_scan"):
+            with st.spinner("Conferindo os links..."):
+                summary = run_media_health_scan(client, family_id)
+            st.session_state["media_health_summary"] = summary
+            st.rerun()
+
+        summary = st.session_state.get("media_health_summary")
+        if summary:
+            if summary["saved"]:
+                st.caption(
+                    f"Última verificação: {summary['links']} link(s) em {summary['seconds']} s,"
+                    f" {summary['flagged']} com problema."
+                )
+            else:
+                st.error(f"A verificação falhou: {summary.get('error') or 'erro desconhecido'}; tente novamente.")
+
+        if not flagged:
+            st.info("Nenhum link com problema na última verificação.")
+            return
+
+        st.dataframe(
+            [
+                {
+                    "história": row.get("title"),
+                    "campo": MEDIA_FIELD_LABELS.get(row.get("field"), row.get("field")),
+                    "problema": row.get("problem"),
+                    "tamanho (MB)": round(row["size_bytes"] / (1024 * 1024), 1) if row.get("size_bytes") else None,
+                    "latência (ms)": row.get("latency_ms"),
+                    "link": row.get("url"),
+                    "verificado em": row.get("checked_at"),
+                }
+                for row in flagged
+            ],
+            use_container_width=True,
+            hide_index=True,
+        )
+
+
+@rerun_profiler.profiled("admin: histórias")
+def render_stories_admin(client, collections, family_id) -> None:
     """Interface de criação e edição de histórias."""
 
     st.subheader("Histórias")
@@ -450,21 +1058,14 @@ def render_stories_admin(client, collections) -> None:
     selected_collection = collections[collection_index]
     collection_id = selected_collection.get("id")
 
-    stories = list_stories_for_collection_admin(client, collection_id)
+    stories = list_stories_for_collection_admin(client, collection_id, family_id)
 
     if stories:
-        st.table(
-            [
-                {
-                    "título": s.get("title"),
-                    "publicada": s.get("is_published"),
-                    "ordem": s.get("sort_order"),
-                }
-                for s in stories
-            ]
-        )
+        render_stories_bulk_editor(client, collections, stories, family_id)
     else:
         st.info("Nenhuma história cadastrada nesta coleção ainda.")
+    # Também sem histórias: a capa da coleção tem seus próprios jobs
+    render_media_jobs_status(client, stories, selected_collection)
 
     st.markdown("---")
 
@@ -511,29 +1112,36 @@ def render_stories_admin(client, collections) -> None:
                     story_id = created.get("id")
 
                     if image_file and story_id:
-                        image_ext = Path(image_file.name).suffix or ".png"
-                        image_path = f"stories/{story_id}/cover{image_ext}"
+                        image_path = media_source_path(f"stories/{story_id}", "cover", image_file, ".png")
                         image_public_url = upload_media_file(
                             client, "story-images", image_path, image_file
                         )
                         if image_public_url:
                             update_story_media(client, story_id, image_url=image_public_url)
+                            enqueue_media_processing(
+                                client, "image", story_id, "story-images",
+                                image_path, image_file, image_public_url,
+                            )
                         else:
                             upload_errors = True
                             st.error("Não foi possível enviar a imagem. Tente novamente.")
 
                     if audio_file and story_id:
-                        audio_ext = Path(audio_file.name).suffix or ".mp3"
-                        audio_path = f"stories/{story_id}/audio{audio_ext}"
+                        audio_path = media_source_path(f"stories/{story_id}", "audio", audio_file, ".mp3")
                         audio_public_url = upload_media_file(
                             client, "story-audio", audio_path, audio_file
                         )
                         if audio_public_url:
                             update_story_media(client, story_id, audio_url=audio_public_url)
+                            enqueue_media_processing(
+                                client, "audio", story_id, "story-audio",
+                                audio_path, audio_file, audio_public_url,
+                            )
                         else:
                             upload_errors = True
                             st.error("Não foi possível enviar o áudio. Tente novamente.")
 
+                    invalidate_catalog(family_id)
                     if not upload_errors:
                         st.success("História criada com sucesso!")
                         st.rerun()
@@ -554,11 +1162,9 @@ def render_stories_admin(client, collections) -> None:
         )
         selected_story = stories[story_index]
 
-        collection_options = {c.get("name", "Coleção"): c.get("id") for c in collections}
+        collection_names = {c.get("id"): c.get("name", "Coleção") for c in collections}
+        collection_options = list(collection_names)
         current_collection_id = selected_story.get("collection_id") or collection_id
-        edit_collection_name = next(
-            (name for name, cid in collection_options.items() if cid == current_collection_id), None
-        )
 
         edit_title = st.text_input(
             "Título",
@@ -572,10 +1178,11 @@ def render_stories_admin(client, collections) -> None:
         )
         edit_collection = st.selectbox(
             "Coleção desta história",
-            list(collection_options.keys()),
-            index=list(collection_options.keys()).index(edit_collection_name)
-            if edit_collection_name in collection_options
+            collection_options,
+            index=collection_options.index(current_collection_id)
+            if current_collection_id in collection_options
             else 0,
+            format_func=lambda cid: collection_names.get(cid, "Coleção"),
             key="edit_story_collection",
         )
         edit_image_url = st.text_input(
@@ -632,37 +1239,45 @@ def render_stories_admin(client, collections) -> None:
                         "audio_url": edit_audio_url.strip() if edit_audio_url else None,
                         "sort_order": int(edit_sort_order),
                         "is_published": edit_is_published,
-                        "collection_id": collection_options.get(edit_collection),
+                        "collection_id": edit_collection,
                     },
+                    family_id,
                 )
                 if updated:
                     upload_errors = False
                     story_id = selected_story.get("id")
 
                     if new_image_file and story_id:
-                        image_ext = Path(new_image_file.name).suffix or ".png"
-                        image_path = f"stories/{story_id}/cover{image_ext}"
+                        image_path = media_source_path(f"stories/{story_id}", "cover", new_image_file, ".png")
                         image_public_url = upload_media_file(
                             client, "story-images", image_path, new_image_file
                         )
                         if image_public_url:
                             update_story_media(client, story_id, image_url=image_public_url)
+                            enqueue_media_processing(
+                                client, "image", story_id, "story-images",
+                                image_path, new_image_file, image_public_url,
+                            )
                         else:
                             upload_errors = True
                             st.error("Não foi possível enviar a nova imagem. Tente novamente.")
 
                     if new_audio_file and story_id:
-                        audio_ext = Path(new_audio_file.name).suffix or ".mp3"
-                        audio_path = f"stories/{story_id}/audio{audio_ext}"
+                        audio_path = media_source_path(f"stories/{story_id}", "audio", new_audio_file, ".mp3")
                         audio_public_url = upload_media_file(
                             client, "story-audio", audio_path, new_audio_file
                         )
                         if audio_public_url:
                             update_story_media(client, story_id, audio_url=audio_public_url)
+                            enqueue_media_processing(
+                                client, "audio", story_id, "story-audio",
+                                audio_path, new_audio_file, audio_public_url,
+                            )
                         else:
                             upload_errors = True
                             st.error("Não foi possível enviar o novo áudio. Tente novamente.")
 
+                    invalidate_catalog(family_id)
                     if not upload_errors:
                         st.success("História atualizada com sucesso!")
                         st.rerun()
@@ -673,13 +1288,346 @@ def render_stories_admin(client, collections) -> None:
             if not delete_confirm:
                 st.warning("Marque a caixa de confirmação antes de excluir.")
             else:
-                if delete_story(client, selected_story.get("id")):
+                if delete_story(client, selected_story.get("id"), family_id):
+                    invalidate_catalog(family_id)
                     st.success("História excluída com sucesso.")
                     st.rerun()
                 else:
                     st.error("Não foi possível excluir a história agora. Tente novamente.")
 
 
+DEFAULT_READING_LOG_RETENTION_MONTHS = 12
+
+
+def get_reading_log_retention_months() -> int:
+    """Lê READING_LOG_RETENTION_MONTHS dos secrets, com 12 meses como padrão."""
+
+    try:
+        value = st.secrets.get("READING_LOG_RETENTION_MONTHS")
+    except Exception:
+        value = None
+
+    try:
+        return max(1, int(value)) if value else DEFAULT_READING_LOG_RETENTION_MONTHS
+    except (TypeError, ValueError):
+        return DEFAULT_READING_LOG_RETENTION_MONTHS
+
+
+@rerun_profiler.profiled("admin: retenção")
+def render_reading_log_retention_admin(client, family_id) -> None:
+    """Mostra os meses do histórico da família, exportação e aplicação da retenção."""
+
+    st.markdown("### Retenção do histórico")
+    keep_months = get_reading_log_retention_months()
+    st.caption(
+        f"Leituras detalhadas desta família são mantidas pelos últimos {keep_months} meses"
+        " (READING_LOG_RETENTION_MONTHS). Meses mais antigos viram apenas contagens"
+        " no ranking. As outras famílias não são afetadas."
+    )
+
+    partitions = list_reading_log_partitions(client, family_id)
+    if not partitions:
+        st.info("Nenhuma partição mensal encontrada no histórico.")
+        return
+
+    today = date.today()
+    month_index = today.year * 12 + today.month - 1 - (keep_months - 1)
+    cutoff = date(month_index // 12, month_index % 12 + 1, 1)
+
+    expiring = []
+    rows = []
+    for part in partitions:
+        month = date.fromisoformat(str(part.get("month"))[:10])
+        # Meses sem leituras desta família não têm o que resumir
+        will_roll = month < cutoff and bool(part.get("row_count"))
+        if will_roll:
+            expiring.append(month)
+        rows.append(
+            {
+                "Mês": month.strftime("%m/%Y"),
+                "Leituras": part.get("row_count"),
+                "Situação": "Será resumido" if will_roll else "Mantido",
+            }
+        )
+    st.table(rows)
+
+    if not expiring:
+        st.info("Nenhum mês fora do período de retenção.")
+        return
+
+    archive_month = st.selectbox(
+        "Exportar leituras detalhadas do mês",
+        expiring,
+        format_func=lambda m: m.strftime("%m/%Y"),
+        key="reading_log_archive_month",
+    )
+    if st.button("Gerar arquivo do mês"):
+        buffer = io.BytesIO()
+        try:
+            total = write_month_archive(client, archive_month, buffer, family_id)
+        except Exception as exc:  # pragma: no cover - feedback simples
+            print(f"[Supabase] Erro ao exportar histórico: {exc}")
+            st.error("Não foi possível exportar o histórico agora. Tente novamente.")
+        else:
+            st.session_state["reading_log_archive"] = (
+                f"leituras-{archive_month.strftime('%Y-%m')}.csv.gz",
+                buffer.getvalue(),
+                total,
+            )
+
+    archive = st.session_state.get("reading_log_archive")
+    if archive:
+        file_name, data, total = archive
+        st.download_button(
+            f"Baixar {file_name} ({total} leituras)",
+            data=data,
+            file_name=file_name,
+            mime="application/gzip",
+        )
+
+    if st.button(f"Resumir {len(expiring)} mês(es) antigo(s) desta família agora"):
+        rolled = apply_reading_log_retention(client, keep_months, family_id)
+        if rolled is None:
+            st.error("Não foi possível aplicar a retenção agora. Tente novamente.")
+        else:
+            st.session_state.pop("reading_log_archive", None)
+            st.success(f"{rolled} mês(es) resumido(s).")
+            st.rerun()
+
+
+READING_HISTORY_PAGE_SIZE = 20
+READING_SOURCE_LABELS = {"random": "História da noite", "manual": "Escolha manual"}
+
+
+@rerun_profiler.profiled("admin: histórico de leitura")
+def render_reading_history_admin(client, collections, family_id) -> None:
+    """Histórico de leitura da família com filtros e paginação por "Carregar mais"."""
+
+    st.subheader("Histórico de leitura")
+
+    filter_cols = st.columns(3)
+    with filter_cols[0]:
+        period = st.date_input("Período", value=(), key="history_period")
+    with filter_cols[1]:
+        collection_options = [None] + [c.get("id") for c in collections]
+        collection_names = {c.get("id"): c.get("name", "Coleção") for c in collections}
+        collection_id = st.selectbox(
+            "Coleção",
+            collection_options,
+            format_func=lambda cid: "Todas" if cid is None else collection_names.get(cid, "Coleção"),
+            key="history_collection",
+        )
+    with filter_cols[2]:
+        source = st.selectbox(
+            "Origem",
+            [None, *READING_SOURCE_LABELS],
+            format_func=lambda value: "Todas" if value is None else READING_SOURCE_LABELS[value],
+            key="history_source",
+        )
+
+    # O fim do período é inclusivo na tela e exclusivo na consulta
+    period = tuple(period) if isinstance(period, (list, tuple)) else (period,)
+    date_from = period[0].isoformat() if len(period) >= 1 else None
+    date_to = (period[1] + timedelta(days=1)).isoformat() if len(period) >= 2 else None
+    filters = (family_id, date_from, date_to, collection_id, source)
+
+    # A primeira página é buscada a cada rerun, para leituras novas aparecerem; só as
+    # páginas de "Carregar mais" ficam na sessão. Se a primeira página mudou (entraram
+    # leituras novas), elas são descartadas para não deixar um buraco entre as páginas.
+    first_page = get_recent_reads(
+        client,
+        limit=READING_HISTORY_PAGE_SIZE,
+        date_from=date_from,
+        date_to=date_to,
+        collection_id=collection_id,
+        source=source,
+        family_id=family_id,
+    )
+    anchor = (first_page[-1].get("created_at"), first_page[-1].get("id")) if first_page else None
+    history = st.session_state.get("reading_history")
+    if not history or history["filters"] != filters or history["anchor"] != anchor:
+        history = {"filters": filters, "anchor": anchor, "more": [], "done": len(first_page) < READING_HISTORY_PAGE_SIZE}
+        st.session_state["reading_history"] = history
+    rows = first_page + history["more"]
+
+    if not rows:
+        st.info("Nenhuma leitura com estes filtros." if any(filters[1:]) else "Nenhuma leitura registrada ainda.")
+        return
+
+    with rerun_profiler.phase("tabela"):
+        st.table(
+            [
+                {
+                    "Quando": str(item.get("created_at")),
+                    "Coleção": item.get("collection_name") or "—",
+                    "História": item.get("title") or "—",
+                    "Origem": READING_SOURCE_LABELS.get(item.get("source"), "Escolha manual"),
+                }
+                for item in rows
+            ]
+        )
+
+    if not history["done"] and st.button("Carregar mais", key="history_load_more"):
+        page = get_recent_reads(
+            client,
+            limit=READING_HISTORY_PAGE_SIZE,
+            before=rows[-1],
+            date_from=date_from,
+            date_to=date_to,
+            collection_id=collection_id,
+            source=source,
+            family_id=family_id,
+        )
+        history["more"].extend(page)
+        history["done"] = len(page) < READING_HISTORY_PAGE_SIZE
+        st.rerun()
+
+    render_reading_log_export(client, filters)
+
+
+# Exportações ficam numa pasta própria e são apagadas depois de um tempo: sessões
+# abandonadas (aba fechada antes de baixar) não deixam arquivos para trás
+READING_LOG_EXPORT_DIR = Path(tempfile.gettempdir()) / "contador-exportacoes"
+READING_LOG_EXPORT_TTL_SECONDS = 3600
+
+
+def _export_expired(path: Path, now: float) -> bool:
+    try:
+        return now - path.stat().st_mtime > READING_LOG_EXPORT_TTL_SECONDS
+    except FileNotFoundError:
+        return True
+
+
+def cleanup_reading_log_exports() -> None:
+    """Apaga as exportações mais antigas que ``READING_LOG_EXPORT_TTL_SECONDS``."""
+
+    now = time.time()
+    for path in READING_LOG_EXPORT_DIR.glob("leituras-*"):
+        if _export_expired(path, now):
+            path.unlink(missing_ok=True)
+
+
+def render_reading_log_export(client, filters) -> None:
+    """Exporta todas as leituras com os filtros do histórico, em CSV compactado ou Parquet.
+
+    As leituras são buscadas em páginas e gravadas num arquivo temporário no disco
+    do servidor à medida que chegam; só uma página fica na memória do app. O
+    arquivo fica disponível por ``READING_LOG_EXPORT_TTL_SECONDS``.
+    """
+
+    family_id, date_from, date_to, collection_id, source = filters
+    with st.expander("Exportar histórico para análise"):
+        st.caption(
+            "Exporta todas as leituras com os filtros acima (período, coleção e origem),"
+            " já com título e coleção. Para históricos muito grandes, prefira"
+            " python -m tools.export_reading_log."
+        )
+        formats = ["csv", "parquet"] if parquet_available() else ["csv"]
+        fmt = st.radio(
+            "Formato",
+            formats,
+            format_func=lambda value: EXPORT_FORMATS[value][0],
+            horizontal=True,
+            key="history_export_format",
+        )
+        if "parquet" not in formats:
+            st.caption("Para exportar em Parquet, instale o pacote pyarrow.")
+
+        # Arquivo gerado com outros filtros, ou já expirado, não vale mais
+        export = st.session_state.get("reading_log_export")
+        if export and (export["filters"] != filters or _export_expired(Path(export["path"]), time.time())):
+            Path(export["path"]).unlink(missing_ok=True)
+            st.session_state.pop("reading_log_export", None)
+            export = None
+
+        if st.button("Gerar exportação", key="history_export"):
+            if export:
+                Path(export["path"]).unlink(missing_ok=True)
+                st.session_state.pop("reading_log_export", None)
+                export = None
+            READING_LOG_EXPORT_DIR.mkdir(parents=True, exist_ok=True)
+            cleanup_reading_log_exports()
+            _, suffix, mime = EXPORT_FORMATS[fmt]
+            handle = tempfile.NamedTemporaryFile(
+                prefix="leituras-", suffix=suffix, dir=READING_LOG_EXPORT_DIR, delete=False
+            )
+            try:
+                with handle:
+                    total = export_reading_log(
+                        client, handle, fmt, date_from, date_to, collection_id, source, family_id
+                    )
+            except Exception as exc:  # pragma: no cover - feedback simples
+                Path(handle.name).unlink(missing_ok=True)
+                print(f"[Supabase] Erro ao exportar histórico: {exc}")
+                st.error("Não foi possível exportar o histórico agora. Tente novamente.")
+            else:
+                export = {
+                    "path": handle.name,
+                    "file_name": f"leituras-{date.today().isoformat()}{suffix}",
+                    "mime": mime,
+                    "total": total,
+                    "filters": filters,
+                }
+                st.session_state["reading_log_export"] = export
+
+        if export:
+            st.caption("O arquivo fica disponível por até uma hora.")
+            with open(export["path"], "rb") as data:
+                st.download_button(
+                    f"Baixar {export['file_name']} ({export['total']} leituras)",
+                    data=data,
+                    file_name=export["file_name"],
+                    mime=export["mime"],
+                    key="history_export_download",
+                )
+
+
+def render_rerun_profiler_admin() -> None:
+    """Resumo por fase dos reruns medidos neste processo, com exportação para o speedscope."""
+
+    with st.expander("Perfil dos reruns"):
+        st.caption(
+            "Ative com ?profile=1 na URL (só a sessão que abrir o link) ou"
+            " RERUN_PROFILER = true nos secrets (todas as sessões)."
+        )
+        recorded = rerun_profiler.sessions()
+        if not recorded:
+            st.info("Nenhum rerun medido ainda.")
+            return
+
+        selected = st.selectbox(
+            "Sessão",
+            [None, *recorded],
+            format_func=lambda session_id: "Todas" if session_id is None else (
+                f"{session_id} – {recorded[session_id][-1].root.name}, {len(recorded[session_id])} rerun(s)"
+            ),
+            key="profiler_session",
+        )
+        reruns = (
+            [rerun for session_reruns in recorded.values() for rerun in session_reruns]
+            if selected is None
+            else recorded[selected]
+        )
+        st.caption(
+            f"{len(reruns)} rerun(s). \"Próprio\" é o tempo da fase sem contar as fases dentro dela."
+        )
+        st.dataframe(rerun_profiler.summarize(reruns), use_container_width=True, hide_index=True)
+
+        download_col, clear_col = st.columns(2)
+        with download_col:
+            st.download_button(
+                "Baixar para o speedscope (.json)",
+                data=json.dumps(rerun_profiler.to_speedscope(reruns), ensure_ascii=False),
+                file_name="reruns.speedscope.json",
+                mime="application/json",
+                key="profiler_download",
+            )
+        with clear_col:
+            if st.button("Limpar medições", key="profiler_clear"):
+                rerun_profiler.clear()
+                st.rerun()
+
+
 def render_admin_mode() -> None:
     """Renderiza a interface de administração."""
     st.title("Painel admin – Contador de Histórias")
@@ -710,51 +1658,85 @@ def render_admin_mode() -> None:
         )
         return
 
-    st.success("Conexão com Supabase OK")
+    family = get_current_family(supabase_client)
+    if family is None:
+        st.error(f"Família \"{get_family_slug()}\" não encontrada. Cadastre-a na tabela families.")
+        return
+    family_id = family["id"]
 
-    render_collections_admin(supabase_client)
-    st.markdown("---")
-    render_stories_admin(supabase_client, list_collections_for_admin(supabase_client))
+    st.success(f"Conexão com Supabase OK – família: {family.get('name')} ({family.get('slug')})")
+
+    with st.expander("Inicialização do servidor"):
+        st.caption(
+            "Tempos medidos desde a importação do app neste processo (imports,"
+            " criação do cliente e aquecimento do catálogo em segundo plano)."
+        )
+        st.table(boot_metrics.snapshot())
+        st.caption(f"Cache compartilhado do catálogo: {catalog_cache_backend()}")
 
+    render_rerun_profiler_admin()
+
+    render_collections_admin(supabase_client, family_id)
     st.markdown("---")
-    st.subheader("Histórico de leitura")
+    admin_collections = list_collections_for_admin(supabase_client, family_id)
+    render_stories_admin(supabase_client, admin_collections, family_id)
+    render_media_health_admin(supabase_client, family_id)
 
-    recent = get_recent_reads(supabase_client, limit=20)
-    if recent:
-        friendly_source = {"random": "História da noite", "manual": "Escolha manual"}
-        st.table(
-            [
-                {
-                    "Quando": str(item.get("created_at")),
-                    "Coleção": item.get("collection_name") or "—",
-                    "História": item.get("title") or "—",
-                    "Origem": friendly_source.get(item.get("source"), "Escolha manual"),
-                }
-                for item in recent
-            ]
-        )
-    else:
-        st.info("Nenhuma leitura registrada ainda.")
+    if st.button("Recalcular tempo de leitura das histórias antigas"):
+        refreshed = refresh_missing_story_artifacts(supabase_client, family_id)
+        invalidate_catalog(family_id)
+        st.success(f"{refreshed} história(s) atualizada(s).")
 
-    ranking = get_read_count_by_story(supabase_client)
+    st.markdown("---")
+    render_reading_history_admin(supabase_client, admin_collections, family_id)
+
+    with rerun_profiler.phase("admin: ranking"):
+        ranking = get_read_count_by_story(supabase_client, family_id)
     if ranking:
         st.markdown("### Histórias mais lidas")
         for item in ranking:
-            st.write(f"{item.get('title')} – {item.get('read_count')} leitura(s)")
+            st.write(f"{item.get('title') or 'História removida'} – {item.get('read_count')} leitura(s)")
     else:
         st.info("O ranking aparecerá após as primeiras leituras.")
 
+    render_reading_log_retention_admin(supabase_client, family_id)
+
+
+def is_rerun_profiler_enabled() -> bool:
+    """Profiler dos reruns: ``?profile=1`` na URL ou ``RERUN_PROFILER = true`` nos secrets."""
+
+    params = st.experimental_get_query_params()
+    if params.get("profile", ["0"])[0].lower() in {"1", "true", "sim", "yes"}:
+        return True
+    try:
+        return str(st.secrets.get("RERUN_PROFILER", False)).lower() in {"1", "true", "sim", "yes"}
+    except Exception:
+        return False
+
 
 def main() -> None:
     """Função principal que organiza os modos do app."""
     st.set_page_config(page_title="Contador de Histórias", page_icon=None, layout="wide")
 
+    # Cliente e catálogo começam a carregar em segundo plano já no primeiro rerun
+    start_background_warmup(get_family_slug())
+
     mode = get_mode_from_query_params()
 
-    if mode == "admin":
-        render_admin_mode()
-    else:
-        render_reader_mode()
+    profiling = is_rerun_profiler_enabled()
+    if profiling:
+        session_id = st.session_state.setdefault("profiler_session_id", uuid.uuid4().hex[:8])
+        rerun_profiler.start_rerun(session_id, mode)
+
+    try:
+        if mode == "admin":
+            render_admin_mode()
+        else:
+            render_reader_mode()
+    finally:
+        # Também fecha reruns interrompidos por st.rerun()/st.stop()
+        if profiling:
+            rerun_profiler.finish_rerun()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,46 @@
+"""Medições simples do tempo de inicialização do processo (imports, cliente, cache)."""
+
+from contextlib import contextmanager
+from typing import Dict, List
+import threading
+import time
+
+
+PROCESS_STARTED_AT = time.perf_counter()
+
+_metrics: Dict[str, float] = {}
+_lock = threading.Lock()
+
+
+def record(name: str, seconds: float) -> None:
+    """Guarda a duração de uma etapa; a primeira medição de cada etapa é preservada."""
+
+    with _lock:
+        _metrics.setdefault(name, seconds)
+
+
+@contextmanager
+def measure(name: str):
+    """Mede o bloco e registra a duração com ``record``."""
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - started)
+
+
+def mark(name: str) -> None:
+    """Registra quanto tempo se passou desde a importação deste módulo."""
+
+    record(name, time.perf_counter() - PROCESS_STARTED_AT)
+
+
+def snapshot() -> List[Dict[str, object]]:
+    """Lista as etapas medidas, em ordem de registro, para exibir no painel admin."""
+
+    with _lock:
+        return [
+            {"Etapa": name, "Tempo (ms)": round(seconds * 1000, 1)}
+            for name, seconds in _metrics.items()
+        ]
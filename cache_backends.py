@@ -0,0 +1,276 @@
+"""Backends de cache compartilhado do catálogo entre processos do app.
+
+Quando várias réplicas do Streamlit rodam atrás de um balanceador, cada uma tem
+seu cache em memória (catalog_cache.py). O backend compartilhado é a segunda
+camada: uma réplica que busca o catálogo no banco grava o resultado ali, e as
+demais leem dele em vez de consultar o Supabase.
+
+Invalidação: cada backend guarda um número de geração geral e um por família.
+``bump_generation`` (chamado pelo admin após gravações) incrementa a geração geral,
+ou só a da família editada, e avisa as outras réplicas; como as gerações fazem
+parte das chaves, os valores antigos deixam de ser lidos.
+
+Configuração por variáveis de ambiente:
+
+- ``CACHE_BACKEND``: ``memory`` (padrão, sem compartilhamento), ``file`` ou ``redis``;
+- ``CACHE_DIR``: pasta do backend ``file`` (padrão ``.cache/shared``);
+- ``CACHE_REDIS_URL``: URL do Redis (ou servidor compatível) para o backend ``redis``;
+- ``CACHE_KEY_PREFIX``: prefixo das chaves no Redis (padrão ``contador``).
+"""
+
+from typing import Any, Dict, Optional, Tuple
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+GENERATION_CHECK_SECONDS = 1.0
+
+
+class MemoryBackend:
+    """Sem compartilhamento: a geração vive só neste processo e nada é guardado fora dele."""
+
+    name = "memory"
+
+    def __init__(self) -> None:
+        # Geração geral em "" e a de cada família pelo id
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        return None
+
+    def set(self, key: str, value: Any, ttl_seconds: float) -> None:
+        return None
+
+    def current_generation(self, family_id: Optional[str] = None) -> int:
+        return self._generations.get(family_id or "", 0)
+
+    def bump_generation(self, family_id: Optional[str] = None) -> int:
+        with self._lock:
+            generation = self._generations.get(family_id or "", 0) + 1
+            self._generations[family_id or ""] = generation
+            return generation
+
+
+class FileBackend:
+    """Cache em arquivos numa pasta compartilhada (volume comum às réplicas)."""
+
+    name = "file"
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._generation_path = os.path.join(directory, "generation")
+        # Escopo ("" para a geração geral, ou o id da família) -> (geração, lida em)
+        self._generations: Dict[str, Tuple[int, float]] = {}
+        self._lock = threading.Lock()
+
+    def _generation_file(self, family_id: Optional[str]) -> str:
+        if not family_id:
+            return self._generation_path
+        digest = hashlib.sha1(family_id.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.directory, f"generation-{digest}")
+
+    def _write_atomic(self, path: str, content: str) -> None:
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as handle:
+            handle.write(content)
+        os.replace(temp_path, path)
+
+    def _path(self, key: str) -> str:
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{self.current_generation()}-{digest}.json")
+
+    def get(self, key: str) -> Optional[Any]:
+        try:
+            with open(self._path(key), encoding="utf-8") as handle:
+                payload = json.load(handle)
+        except (OSError, ValueError):
+            return None
+        if payload.get("expires_at", 0) < time.time():
+            return None
+        return payload.get("value")
+
+    def set(self, key: str, value: Any, ttl_seconds: float) -> None:
+        payload = {"expires_at": time.time() + ttl_seconds, "value": value}
+        path = self._path(key)
+        try:
+            self._write_atomic(path, json.dumps(payload, separators=(",", ":")))
+            # A data de modificação marca a expiração, para a limpeza não abrir cada arquivo
+            os.utime(path, (payload["expires_at"], payload["expires_at"]))
+        except OSError as exc:  # pragma: no cover - disco cheio ou sem permissão
+            print(f"[Cache] Erro ao gravar cache em arquivo: {exc}")
+
+    def current_generation(self, family_id: Optional[str] = None) -> int:
+        # Ler cada arquivo de geração no máximo uma vez por segundo por processo
+        now = time.monotonic()
+        generation, checked_at = self._generations.get(family_id or "", (0, 0.0))
+        if checked_at and now - checked_at < GENERATION_CHECK_SECONDS:
+            return generation
+        try:
+            with open(self._generation_file(family_id), encoding="utf-8") as handle:
+                generation = int(handle.read().strip() or 0)
+        except (OSError, ValueError):
+            generation = 0
+        self._generations[family_id or ""] = (generation, now)
+        return generation
+
+    def bump_generation(self, family_id: Optional[str] = None) -> int:
+        with self._lock:
+            self._generations.pop(family_id or "", None)
+            generation = self.current_generation(family_id) + 1
+            self._write_atomic(self._generation_file(family_id), str(generation))
+            self._generations[family_id or ""] = (generation, time.monotonic())
+
+        # Remove arquivos expirados ou de gerações anteriores (melhor esforço); os da
+        # geração anterior de uma família saem quando expiram
+        now = time.time()
+        prefix = f"{self.current_generation()}-"
+        for file_name in os.listdir(self.directory):
+            if not file_name.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, file_name)
+            try:
+                expired = os.path.getmtime(path) < now
+            except OSError:
+                continue
+            if expired or not file_name.startswith(prefix):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        return generation
+
+
+class RedisBackend:
+    """Cache num servidor Redis (ou compatível), com aviso de invalidação via pub/sub.
+
+    ``connection`` pode ser qualquer objeto com a interface do cliente ``redis``
+    (get/set/incr/publish/pubsub), o que permite usar um servidor local ou um
+    substituto em memória.
+    """
+
+    name = "redis"
+
+    def __init__(self, connection, prefix: str = "contador") -> None:
+        self._redis = connection
+        self._prefix = f"{prefix}:catalog"
+        self._channel = f"{self._prefix}:invalidate"
+        self._generation_key = f"{self._prefix}:generation"
+        # Escopo ("" para a geração geral, ou o id da família) -> geração, e quando foi lida
+        self._generations: Dict[str, int] = {"": self._read_generation()}
+        self._checked_at: Dict[str, float] = {"": time.monotonic()}
+        self._subscribed = False
+        self._start_listener()
+
+    def _scope_key(self, family_id: Optional[str]) -> str:
+        return f"{self._generation_key}:{family_id}" if family_id else self._generation_key
+
+    def _read_generation(self, family_id: Optional[str] = None) -> int:
+        try:
+            return int(self._redis.get(self._scope_key(family_id)) or 0)
+        except Exception as exc:  # pragma: no cover
+            print(f"[Cache] Erro ao ler geração no Redis: {exc}")
+            return 0
+
+    def _start_listener(self) -> None:
+        try:
+            pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(self._channel)
+        except Exception as exc:  # pragma: no cover - sem pub/sub, cai na consulta periódica
+            print(f"[Cache] Pub/sub indisponível, usando consulta periódica: {exc}")
+            return
+
+        def listen() -> None:
+            try:
+                for message in pubsub.listen():
+                    # Mensagem "<geração>" (geral) ou "<família>:<geração>"
+                    scope, _, value = str(message.get("data")).rpartition(":")
+                    try:
+                        self._generations[scope] = max(self._generations.get(scope, 0), int(value))
+                    except ValueError:
+                        continue
+            except Exception as exc:  # pragma: no cover
+                print(f"[Cache] Escuta de invalidação encerrada: {exc}")
+            self._subscribed = False
+
+        self._subscribed = True
+        threading.Thread(target=listen, name="cache-invalidation", daemon=True).start()
+
+    def _key(self, key: str) -> str:
+        return f"{self._prefix}:{self.current_generation()}:{key}"
+
+    def get(self, key: str) -> Optional[Any]:
+        try:
+            raw = self._redis.get(self._key(key))
+        except Exception as exc:  # pragma: no cover
+            print(f"[Cache] Erro ao ler do Redis: {exc}")
+            return None
+        if raw is None:
+            return None
+        try:
+            return json.loads(raw)
+        except ValueError:
+            return None
+
+    def set(self, key: str, value: Any, ttl_seconds: float) -> None:
+        try:
+            self._redis.set(
+                self._key(key),
+                json.dumps(value, separators=(",", ":")),
+                ex=max(1, int(ttl_seconds)),
+            )
+        except Exception as exc:  # pragma: no cover
+            print(f"[Cache] Erro ao gravar no Redis: {exc}")
+
+    def current_generation(self, family_id: Optional[str] = None) -> int:
+        # Com pub/sub ativo a geração chega por mensagem (cada família é lida uma vez, na
+        # primeira consulta); sem ele, consulta a cada segundo
+        scope = family_id or ""
+        now = time.monotonic()
+        if scope not in self._generations or (
+            not self._subscribed and now - self._checked_at.get(scope, 0.0) >= GENERATION_CHECK_SECONDS
+        ):
+            self._generations[scope] = max(self._generations.get(scope, 0), self._read_generation(family_id))
+            self._checked_at[scope] = now
+        return self._generations[scope]
+
+    def bump_generation(self, family_id: Optional[str] = None) -> int:
+        scope = family_id or ""
+        try:
+            generation = int(self._redis.incr(self._scope_key(family_id)))
+            self._generations[scope] = max(self._generations.get(scope, 0), generation)
+            self._redis.publish(self._channel, f"{family_id}:{generation}" if family_id else str(generation))
+            return generation
+        except Exception as exc:  # pragma: no cover
+            print(f"[Cache] Erro ao invalidar cache no Redis: {exc}")
+            return self._generations.get(scope, 0)
+
+
+def create_cache_backend():
+    """Cria o backend configurado em ``CACHE_BACKEND``; falhas caem no backend em memória."""
+
+    kind = os.environ.get("CACHE_BACKEND", "memory").strip().lower()
+
+    if kind == "redis":
+        url = os.environ.get("CACHE_REDIS_URL")
+        try:
+            import redis  # import opcional: só necessário com CACHE_BACKEND=redis
+
+            connection = redis.Redis.from_url(url, decode_responses=True)
+            connection.ping()
+            return RedisBackend(connection, os.environ.get("CACHE_KEY_PREFIX", "contador"))
+        except Exception as exc:
+            print(f"[Cache] Redis indisponível ({exc}); usando cache em arquivo.")
+            kind = "file"
+
+    if kind == "file":
+        try:
+            return FileBackend(os.environ.get("CACHE_DIR", os.path.join(".cache", "shared")))
+        except OSError as exc:
+            print(f"[Cache] Pasta de cache indisponível ({exc}); usando só a memória.")
+
+    return MemoryBackend()
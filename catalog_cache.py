@@ -0,0 +1,398 @@
+"""Cache do catálogo publicado (coleções e histórias) compartilhado pelo processo.
+
+Todas as sessões do leitor leem daqui em vez de consultar o Supabase a cada
+rerun. A primeira camada fica em memória; a segunda é o backend compartilhado
+entre réplicas (cache_backends.py), consultado antes do banco. As entradas
+expiram após ``CATALOG_CACHE_TTL_SECONDS``. Buscas simultâneas da mesma chave
+esperam uma única consulta ao banco.
+
+Famílias: a memória é dividida por família (chaves começam pelo id da família).
+Cada família guarda no máximo ``CATALOG_CACHE_MAX_ENTRIES_PER_FAMILY`` listas e o
+processo no máximo ``CATALOG_CACHE_MAX_FAMILIES`` famílias, descartando as usadas
+há mais tempo; assim uma família com catálogo grande ou muitas coleções não
+expulsa do cache as listas das outras. ``invalidate_catalog(family_id)`` descarta
+só a família editada e incrementa a geração dela no backend compartilhado: as
+demais réplicas descartam a família ao ver a geração nova (na hora com Redis, em
+até um segundo com arquivos), e os valores compartilhados antigos deixam de ser lidos.
+
+Revalidação: ``revalidate_catalog`` lê as linhas da família na tabela
+``catalog_versions`` (uma consulta pequena, no máximo a cada
+``CATALOG_VERSION_CHECK_SECONDS`` por família) e descarta só as listas cujo escopo
+mudou; as demais têm a validade renovada. Assim uma edição numa coleção não faz o
+processo buscar as outras de novo.
+
+As linhas vindas do banco (ou do backend compartilhado e da cópia local) são
+convertidas uma vez em tuplas de modelos imutáveis (models.py), compartilhadas
+por todas as sessões.
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+import json
+import os
+import threading
+import time
+
+import rerun_profiler
+from cache_backends import create_cache_backend
+from models import Collection, StorySummary
+from stories_repository import (
+    get_active_collections,
+    get_all_published_stories,
+    get_catalog_versions,
+    get_published_stories_by_collection,
+)
+
+
+CATALOG_CACHE_TTL_SECONDS = float(os.environ.get("CATALOG_CACHE_TTL_SECONDS", "300"))
+CATALOG_VERSION_CHECK_SECONDS = float(os.environ.get("CATALOG_VERSION_CHECK_SECONDS", "2"))
+CATALOG_CACHE_MAX_FAMILIES = int(os.environ.get("CATALOG_CACHE_MAX_FAMILIES", "32"))
+CATALOG_CACHE_MAX_ENTRIES_PER_FAMILY = int(os.environ.get("CATALOG_CACHE_MAX_ENTRIES_PER_FAMILY", "256"))
+
+# Chaves: (família, "collections") ou (família, "stories", coleção ou None)
+Entry = Tuple[float, tuple, Optional[int]]  # (expira_em, valor, versão do escopo quando foi buscado)
+
+
+@dataclass
+class _FamilyCache:
+    """Parte do cache de uma família: listas (da menos para a mais usada), índice e versões."""
+
+    entries: "OrderedDict[Hashable, Entry]" = field(default_factory=OrderedDict)
+    # História -> (chave da lista em que está, resumo); vale enquanto a lista não expira
+    stories_by_id: Dict[str, Tuple[Hashable, StorySummary]] = field(default_factory=dict)
+    key_locks: Dict[Hashable, threading.Lock] = field(default_factory=dict)
+    # Última versão conhecida de cada escopo da família (tabela catalog_versions)
+    versions: Dict[str, int] = field(default_factory=dict)
+    versions_checked_at: float = 0.0
+    versions_lock: threading.Lock = field(default_factory=threading.Lock)
+    generation: int = 0
+    # Geração da família no backend compartilhado quando as listas foram guardadas
+    shared_generation: Optional[int] = None
+
+
+# Famílias da menos para a mais usada
+_families: "OrderedDict[str, _FamilyCache]" = OrderedDict()
+_lock = threading.Lock()
+_generation = 0
+
+_backend = create_cache_backend()
+_shared_generation = _backend.current_generation()
+
+
+def _family(family_id: str) -> _FamilyCache:
+    # Chamado com _lock adquirido; a família passa a ser a mais recente
+    cache = _families.get(family_id)
+    if cache is None:
+        cache = _families[family_id] = _FamilyCache()
+        while len(_families) > CATALOG_CACHE_MAX_FAMILIES:
+            _families.popitem(last=False)
+    else:
+        _families.move_to_end(family_id)
+    return cache
+
+
+def _scope(key: Hashable) -> str:
+    # Escopo dentro da família: "collections", "stories" ou o id da coleção
+    if key[1] == "collections":
+        return "collections"
+    return key[2] if key[2] is not None else "stories"
+
+
+def _shared_key(key: Hashable, family_generation: int, version: Optional[int]) -> str:
+    # Geração da família e versão entram na chave: réplicas só compartilham valores
+    # buscados depois da mesma invalidação e na mesma versão
+    return json.dumps([*key, family_generation, version])
+
+
+def _decode(key: Hashable, rows: List[Dict[str, Any]]) -> tuple:
+    model = Collection if key[1] == "collections" else StorySummary
+    return tuple(model.from_row(row) for row in rows)
+
+
+def _encode(value: tuple) -> List[Dict[str, Any]]:
+    return [item.to_row() for item in value]
+
+
+def _index(cache: _FamilyCache, key: Hashable, value: tuple) -> None:
+    # Chamado com _lock adquirido
+    for item in value:
+        if isinstance(item, StorySummary):
+            cache.stories_by_id[item.id] = (key, item)
+
+
+def _reindex(cache: _FamilyCache) -> None:
+    # Chamado com _lock adquirido, depois de remover ou substituir entradas
+    cache.stories_by_id.clear()
+    for key, (_, value, _) in cache.entries.items():
+        _index(cache, key, value)
+
+
+def _store(key: Hashable, value: tuple, expires_at: float, version: Optional[int]) -> None:
+    # Chamado com _lock adquirido
+    cache = _family(key[0])
+    replaced = key in cache.entries
+    cache.entries[key] = (expires_at, value, version)
+    cache.entries.move_to_end(key)
+    while len(cache.entries) > CATALOG_CACHE_MAX_ENTRIES_PER_FAMILY:
+        evicted, _ = cache.entries.popitem(last=False)
+        cache.key_locks.pop(evicted, None)
+        replaced = True
+    # Lista substituída (expirou e foi buscada de novo) ou descartada: histórias
+    # despublicadas ou removidas não podem continuar no índice
+    if replaced:
+        _reindex(cache)
+    else:
+        _index(cache, key, value)
+
+
+def _clear() -> None:
+    # Chamado com _lock adquirido
+    _families.clear()
+
+
+def _discard(cache: _FamilyCache) -> None:
+    # Chamado com _lock adquirido; buscas em andamento não guardam o valor antigo
+    cache.entries.clear()
+    cache.stories_by_id.clear()
+    cache.generation += 1
+    # A próxima revalidação da família consulta o banco sem esperar o intervalo
+    cache.versions_checked_at = 0.0
+
+
+def _sync_with_backend() -> None:
+    """Descarta a camada em memória quando outra réplica invalidou o catálogo."""
+
+    global _generation, _shared_generation
+
+    generation = _backend.current_generation()
+    if generation == _shared_generation:
+        return
+    with _lock:
+        _clear()
+        _generation += 1
+        _shared_generation = generation
+
+
+def backend_name() -> str:
+    """Nome do backend compartilhado em uso (memory, file ou redis)."""
+
+    return _backend.name
+
+
+def revalidate_catalog(client, family_id: Optional[str], force: bool = False) -> Optional[int]:
+    """Compara as versões do catálogo da família no banco com as do cache e descarta só o que mudou.
+
+    Faz no máximo uma consulta a cada ``CATALOG_VERSION_CHECK_SECONDS`` por família
+    (``force`` ignora esse intervalo). Retorna quantas listas foram descartadas, ou
+    None quando a verificação não rodou ou falhou; nesse caso vale só o TTL.
+    """
+
+    if not family_id:
+        return None
+    with _lock:
+        cache = _family(family_id)
+    if not force and time.monotonic() - cache.versions_checked_at < CATALOG_VERSION_CHECK_SECONDS:
+        return None
+    # Outra sessão já está consultando: segue com o cache atual
+    if not cache.versions_lock.acquire(blocking=False):
+        return None
+    try:
+        cache.versions_checked_at = time.monotonic()
+        versions = get_catalog_versions(client, family_id)
+        if versions is None:
+            return None
+
+        expires_at = time.monotonic() + CATALOG_CACHE_TTL_SECONDS
+        with _lock:
+            cache.versions.clear()
+            cache.versions.update(versions)
+            stale = [
+                key for key, (_, _, version) in cache.entries.items()
+                if versions.get(_scope(key)) != version
+            ]
+            for key in stale:
+                del cache.entries[key]
+            # O que não mudou continua válido por mais um TTL
+            for key, (_, value, version) in cache.entries.items():
+                cache.entries[key] = (expires_at, value, version)
+            if stale:
+                _reindex(cache)
+        return len(stale)
+    finally:
+        cache.versions_lock.release()
+
+
+def _get_or_fetch(key: Hashable, fetch: Callable[[], List[Dict[str, Any]]]) -> tuple:
+    _sync_with_backend()
+    family_generation = _backend.current_generation(key[0])
+    now = time.monotonic()
+    with _lock:
+        cache = _family(key[0])
+        if cache.shared_generation != family_generation:
+            # A família foi invalidada (nesta ou noutra réplica) depois de guardada
+            # aqui; listas carregadas da cópia local ainda não têm geração
+            if cache.shared_generation is not None:
+                _discard(cache)
+            cache.shared_generation = family_generation
+        entry = cache.entries.get(key)
+        if entry and entry[0] > now:
+            cache.entries.move_to_end(key)
+            return entry[1]
+        key_lock = cache.key_locks.setdefault(key, threading.Lock())
+        generation = (_generation, cache.generation)
+        # Versão observada antes da busca: se mudar durante a busca, a próxima
+        # revalidação percebe e descarta o valor
+        version = cache.versions.get(_scope(key))
+
+    with key_lock:
+        # Outra thread pode ter preenchido a chave enquanto esperávamos
+        with _lock:
+            entry = _family(key[0]).entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                return entry[1]
+
+        # Segunda camada: outra réplica pode já ter buscado este valor
+        shared_key = _shared_key(key, family_generation, version)
+        rows = _backend.get(shared_key)
+        from_backend = rows is not None
+        if not from_backend:
+            with rerun_profiler.phase(f"banco: {key[1]}"):
+                rows = fetch()
+        value = _decode(key, rows or [])
+
+        with _lock:
+            # Resultados vazios (erro ou catálogo vazio) não ficam em cache, e uma
+            # invalidação ocorrida durante a busca descarta o valor antigo (a família
+            # também pode ter saído do cache: então a busca vale só para esta chamada)
+            current = _families.get(key[0])
+            if not value or current is not cache or generation != (_generation, cache.generation):
+                return value
+            _store(key, value, time.monotonic() + CATALOG_CACHE_TTL_SECONDS, version)
+
+        if not from_backend:
+            _backend.set(shared_key, rows, CATALOG_CACHE_TTL_SECONDS)
+        return value
+
+
+def get_cached_active_collections(client, family_id: str) -> Tuple[Collection, ...]:
+    """Coleções ativas da família, servidas do cache do processo."""
+
+    return _get_or_fetch((family_id, "collections"), lambda: get_active_collections(client, family_id))
+
+
+def get_cached_published_stories(client, family_id: str, collection_id: str) -> Tuple[StorySummary, ...]:
+    """Resumo das histórias publicadas de uma coleção, servido do cache do processo."""
+
+    return _get_or_fetch(
+        (family_id, "stories", collection_id),
+        lambda: get_published_stories_by_collection(client, collection_id, family_id),
+    )
+
+
+def get_cached_all_published_stories(client, family_id: str) -> Tuple[StorySummary, ...]:
+    """Resumo de todas as histórias publicadas da família, servido do cache do processo."""
+
+    return _get_or_fetch(
+        (family_id, "stories", None), lambda: get_all_published_stories(client, family_id)
+    )
+
+
+def find_cached_published_story(story_id: str, family_id: str) -> Optional[StorySummary]:
+    """Procura uma história da família numa lista ainda válida do cache, sem consultar o banco."""
+
+    now = time.monotonic()
+    with _lock:
+        cache = _families.get(family_id)
+        indexed = cache.stories_by_id.get(story_id) if cache else None
+        if indexed is None:
+            return None
+        key, story = indexed
+        entry = cache.entries.get(key)
+        # Lista expirada: a história pode ter sido despublicada desde então
+        return story if entry and entry[0] > now else None
+
+
+def warm_catalog(client, family_id: str) -> int:
+    """Garante em cache as coleções da família e as listas de histórias de cada uma.
+
+    Usado no aquecimento, depois de ``revalidate_catalog``: só as listas ausentes
+    (ou descartadas por terem mudado) são buscadas. Retorna quantas foram buscadas.
+    """
+
+    def valid_keys():
+        now = time.monotonic()
+        with _lock:
+            entries = _family(family_id).entries
+            return {key for key, (expires_at, _, _) in entries.items() if expires_at > now}
+
+    before = valid_keys()
+    collections = get_cached_active_collections(client, family_id)
+    get_cached_all_published_stories(client, family_id)
+    for collection in collections:
+        get_cached_published_stories(client, family_id, collection.id)
+    return len(valid_keys() - before)
+
+
+def export_entries() -> Tuple[Dict[Hashable, List[Dict[str, Any]]], Dict[str, Optional[int]]]:
+    """Copia as entradas válidas como linhas, com a versão de cada escopo (para a cópia local em disco).
+
+    Os escopos vêm no formato do banco, com a família na frente (``<família>:collections``).
+    """
+
+    now = time.monotonic()
+    with _lock:
+        valid = {
+            key: entry
+            for cache in _families.values()
+            for key, entry in cache.entries.items()
+            if entry[0] > now
+        }
+    entries = {key: _encode(value) for key, (_, value, _) in valid.items()}
+    versions = {f"{key[0]}:{_scope(key)}": version for key, (_, _, version) in valid.items()}
+    return entries, versions
+
+
+def seed_entries(
+    entries: Dict[Hashable, List[Dict[str, Any]]],
+    versions: Optional[Dict[str, Optional[int]]] = None,
+) -> None:
+    """Preenche o cache com linhas já conhecidas (ex.: cópia local carregada no boot).
+
+    ``versions`` são as versões dos escopos quando as linhas foram buscadas; a
+    próxima revalidação descarta as que estiverem desatualizadas.
+    """
+
+    versions = versions or {}
+    expires_at = time.monotonic() + CATALOG_CACHE_TTL_SECONDS
+    decoded = {key: _decode(key, rows) for key, rows in entries.items() if rows}
+    with _lock:
+        for key, value in decoded.items():
+            _store(key, value, expires_at, versions.get(f"{key[0]}:{_scope(key)}"))
+
+
+def invalidate_catalog(family_id: Optional[str] = None) -> None:
+    """Descarta o catálogo em cache de uma família; chamado após gravações no admin.
+
+    A geração da família no backend compartilhado é incrementada: as demais
+    réplicas descartam a família ao perceber a mudança, e as outras famílias
+    continuam em cache. Sem ``family_id``, descarta o catálogo de todas as
+    famílias, nesta e nas demais réplicas.
+    """
+
+    global _generation, _shared_generation
+    if family_id:
+        family_generation = _backend.bump_generation(family_id)
+        with _lock:
+            cache = _families.get(family_id)
+            if cache is None:
+                return
+            _discard(cache)
+            cache.shared_generation = family_generation
+        return
+
+    shared_generation = _backend.bump_generation()
+    with _lock:
+        _clear()
+        _generation += 1
+        _shared_generation = shared_generation
@@ -0,0 +1,91 @@
+"""Cópia local (SQLite) do catálogo publicado, para reinícios sem espera.
+
+A cada aquecimento o catálogo em cache é gravado em disco junto com a versão de
+cada escopo (tabela ``catalog_versions``). No próximo boot o arquivo é carregado
+antes de qualquer consulta ao Supabase e revalidado em segundo plano: só as
+listas cujo escopo mudou no banco são buscadas de novo.
+"""
+
+from contextlib import closing
+from typing import Any, Dict, Hashable, Optional, Tuple
+import json
+import os
+import sqlite3
+import time
+
+
+SNAPSHOT_FORMAT_VERSION = 3
+CATALOG_SNAPSHOT_PATH = os.environ.get(
+    "CATALOG_SNAPSHOT_PATH", os.path.join(".cache", "catalog_snapshot.sqlite3")
+)
+
+Versions = Dict[str, Optional[int]]
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    connection = sqlite3.connect(path, timeout=5)
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS entries (cache_key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+    )
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)"
+    )
+    return connection
+
+
+def load_snapshot(
+    path: str = CATALOG_SNAPSHOT_PATH,
+) -> Optional[Tuple[Dict[Hashable, Any], Versions]]:
+    """Lê o catálogo salvo e as versões dos escopos; devolve None se não existir ou for de outro formato."""
+
+    if not os.path.exists(path):
+        return None
+
+    try:
+        with closing(_connect(path)) as connection:
+            meta = dict(connection.execute("SELECT name, value FROM meta").fetchall())
+            if meta.get("format_version") != str(SNAPSHOT_FORMAT_VERSION):
+                return None
+            entries = {
+                tuple(json.loads(cache_key)): json.loads(value)
+                for cache_key, value in connection.execute("SELECT cache_key, value FROM entries")
+            }
+        return entries, json.loads(meta.get("catalog_versions", "{}"))
+    except Exception as exc:  # pragma: no cover - arquivo corrompido vira cache vazio
+        print(f"[Snapshot] Erro ao ler cópia local do catálogo: {exc}")
+        return None
+
+
+def save_snapshot(
+    entries: Dict[Hashable, Any], versions: Versions, path: str = CATALOG_SNAPSHOT_PATH
+) -> bool:
+    """Grava o catálogo de forma atômica (arquivo temporário + rename). Retorna True em sucesso."""
+
+    directory = os.path.dirname(path)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        with closing(_connect(temp_path)) as connection, connection:
+            connection.executemany(
+                "INSERT INTO entries (cache_key, value) VALUES (?, ?)",
+                [
+                    (json.dumps(list(key)), json.dumps(value, separators=(",", ":")))
+                    for key, value in entries.items()
+                ],
+            )
+            connection.executemany(
+                "INSERT INTO meta (name, value) VALUES (?, ?)",
+                [
+                    ("format_version", str(SNAPSHOT_FORMAT_VERSION)),
+                    ("catalog_versions", json.dumps(versions, sort_keys=True)),
+                    ("saved_at", str(time.time())),
+                ],
+            )
+        os.replace(temp_path, path)
+        return True
+    except Exception as exc:  # pragma: no cover - sem disco, seguimos só com a memória
+        print(f"[Snapshot] Erro ao gravar cópia local do catálogo: {exc}")
+        return False
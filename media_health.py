@@ -0,0 +1,211 @@
+"""Verificação dos links de mídia das histórias (imagem, áudio e playlist HLS).
+
+``image_url`` e ``audio_url`` são texto livre no admin: um link quebrado, uma
+página de erro servida com status 200 ou um arquivo enorme só apareceriam na
+hora de dormir. A varredura confere cada link sem baixar o arquivo:
+
+- ``HEAD``, que traz status, tipo e tamanho (Content-Length);
+- se o servidor não aceita HEAD ou não informa o tamanho, ``GET`` do primeiro
+  byte (``Range: bytes=0-0``), com o tamanho total em Content-Range.
+
+Os links são conferidos em paralelo por um pool limitado de threads (a espera é
+de rede, não de CPU), e cada URL repetida é conferida uma única vez; assim uma
+biblioteca inteira leva segundos em vez de somar a latência de cada link.
+O resultado de cada campo de cada história vai para a tabela ``media_health``.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
+from urllib.parse import urlsplit
+import re
+import time
+import urllib.error
+import urllib.request
+
+from stories_repository import iter_story_media, prune_media_health, save_media_health
+
+
+MEDIA_FIELDS = ("image_url", "audio_url", "audio_playlist_url")
+MEDIA_FIELD_LABELS = {"image_url": "Imagem", "audio_url": "Áudio", "audio_playlist_url": "Playlist HLS"}
+MEDIA_HEALTH_WORKERS = 16
+MEDIA_HEALTH_TIMEOUT_SECONDS = 10.0
+# Acima disso o download pesa no celular (4G, Wi-Fi fraco do quarto) na hora de dormir
+MAX_SIZE_BYTES = {
+    "image_url": 2 * 1024 * 1024,
+    "audio_url": 40 * 1024 * 1024,
+    "audio_playlist_url": 256 * 1024,
+}
+# Tipos aceitos por campo; vazio ou application/octet-stream não são marcados (nem
+# todo armazenamento informa o tipo). Página HTML no lugar da mídia é o caso típico.
+EXPECTED_TYPES = {
+    "image_url": ("image/",),
+    "audio_url": ("audio/", "video/mp4"),
+    "audio_playlist_url": ("application/vnd.apple.mpegurl", "application/x-mpegurl", "audio/mpegurl", "audio/x-mpegurl"),
+}
+SLOW_LATENCY_MS = 3000
+USER_AGENT = "contador-de-historias/media-health"
+
+_CONTENT_RANGE_TOTAL = re.compile(r"/\s*(\d+)\s*$")
+
+
+def _int_header(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _open(url: str, method: str, timeout: float, headers: Optional[Dict[str, str]] = None):
+    request = urllib.request.Request(url, method=method, headers={"User-Agent": USER_AGENT, **(headers or {})})
+    return urllib.request.urlopen(request, timeout=timeout)
+
+
+def check_url(url: str, timeout: float = MEDIA_HEALTH_TIMEOUT_SECONDS) -> Dict[str, Any]:
+    """Confere um link sem baixar o arquivo: status, tipo, tamanho (bytes) e latência (ms)."""
+
+    result: Dict[str, Any] = {"status": None, "content_type": None, "size_bytes": None, "latency_ms": None, "error": None}
+    if urlsplit(url).scheme not in ("http", "https"):
+        result["error"] = "endereço inválido (esperado http:// ou https://)"
+        return result
+
+    started = time.perf_counter()
+    try:
+        try:
+            with _open(url, "HEAD", timeout) as response:
+                result["status"] = response.status
+                result["content_type"] = response.headers.get("Content-Type")
+                result["size_bytes"] = _int_header(response.headers.get("Content-Length"))
+        except urllib.error.HTTPError as exc:
+            # Alguns servidores (e URLs assinadas) não aceitam HEAD; o GET abaixo decide
+            if exc.code not in (403, 405, 501):
+                raise
+            result["status"] = exc.code
+
+        if result["status"] in (403, 405, 501) or result["size_bytes"] is None:
+            with _open(url, "GET", timeout, {"Range": "bytes=0-0"}) as response:
+                result["status"] = response.status
+                result["content_type"] = response.headers.get("Content-Type")
+                if response.status == 206:
+                    match = _CONTENT_RANGE_TOTAL.search(response.headers.get("Content-Range") or "")
+                    result["size_bytes"] = int(match.group(1)) if match else None
+                else:
+                    # Servidor ignorou o Range: o tamanho é o do arquivo inteiro, que não é lido
+                    result["size_bytes"] = _int_header(response.headers.get("Content-Length"))
+                response.read(1)
+    except urllib.error.HTTPError as exc:
+        result["status"] = exc.code
+        result["content_type"] = exc.headers.get("Content-Type") if exc.headers else None
+    except Exception as exc:  # conexão recusada, DNS, timeout, certificado...
+        reason = getattr(exc, "reason", None) or exc
+        result["error"] = str(reason) or exc.__class__.__name__
+    result["latency_ms"] = round((time.perf_counter() - started) * 1000)
+    return result
+
+
+def classify(field: str, result: Dict[str, Any]) -> Optional[str]:
+    """Motivo para marcar o link no admin, ou None se estiver tudo bem."""
+
+    if result.get("error") or result.get("status") is None:
+        return f"inacessível: {result.get('error') or 'sem resposta'}"
+    if result["status"] >= 400:
+        return f"quebrado: HTTP {result['status']}"
+
+    size = result.get("size_bytes")
+    limit = MAX_SIZE_BYTES.get(field)
+    if size is not None and limit is not None and size > limit:
+        return f"grande demais: {size / (1024 * 1024):.1f} MB (limite {limit / (1024 * 1024):.1f} MB)"
+
+    content_type = (result.get("content_type") or "").split(";")[0].strip().lower()
+    expected = EXPECTED_TYPES.get(field, ())
+    if content_type and content_type != "application/octet-stream" and not content_type.startswith(expected):
+        return f"tipo inesperado: {content_type}"
+
+    if (result.get("latency_ms") or 0) > SLOW_LATENCY_MS:
+        return f"lento: {result['latency_ms']} ms"
+    return None
+
+
+def scan_media(
+    stories: Iterable[Dict[str, Any]],
+    workers: int = MEDIA_HEALTH_WORKERS,
+    timeout: float = MEDIA_HEALTH_TIMEOUT_SECONDS,
+) -> List[Dict[str, Any]]:
+    """Confere em paralelo todos os links das histórias. Devolve as linhas para ``media_health``."""
+
+    targets = []
+    for story in stories:
+        for field in MEDIA_FIELDS:
+            url = (story.get(field) or "").strip()
+            if url:
+                targets.append((story, field, url))
+    if not targets:
+        return []
+
+    urls = sorted({url for _, _, url in targets})
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(urls))), thread_name_prefix="media-health") as pool:
+        results = dict(zip(urls, pool.map(lambda url: check_url(url, timeout), urls)))
+
+    checked_at = datetime.now(timezone.utc).isoformat()
+    rows = []
+    for story, field, url in targets:
+        result = results[url]
+        problem = classify(field, result)
+        rows.append(
+            {
+                "story_id": story["id"],
+                "field": field,
+                "family_id": story.get("family_id"),
+                "url": url,
+                **result,
+                "flagged": problem is not None,
+                "problem": problem,
+                "checked_at": checked_at,
+            }
+        )
+    return rows
+
+
+def run_media_health_scan(
+    client,
+    family_id: Optional[str] = None,
+    workers: int = MEDIA_HEALTH_WORKERS,
+    timeout: float = MEDIA_HEALTH_TIMEOUT_SECONDS,
+) -> Dict[str, Any]:
+    """Varre os links de todas as histórias (da família, se informada) e grava o resultado.
+
+    Resultados de links que não existem mais são removidos ao final. Retorna um
+    resumo: links conferidos, marcados, se a gravação deu certo (``saved``, com o
+    motivo em ``error``) e a duração. Se nem a lista de histórias puder ser lida,
+    nada é gravado nem removido.
+    """
+
+    started = time.perf_counter()
+    started_at = datetime.now(timezone.utc).isoformat()
+    try:
+        stories = list(iter_story_media(client, family_id))
+    except Exception as exc:
+        # Sem a lista completa não dá para gravar nem limpar: os resultados antigos ficam
+        print(f"[Supabase] Erro ao listar histórias para verificar links: {exc}")
+        return {
+            "links": 0,
+            "urls": 0,
+            "flagged": 0,
+            "saved": False,
+            "error": "não foi possível listar as histórias",
+            "seconds": round(time.perf_counter() - started, 2),
+        }
+
+    rows = scan_media(stories, workers=workers, timeout=timeout)
+    saved = save_media_health(client, rows)
+    # Só limpa se tudo foi gravado: senão apagaria resultados que ainda valem
+    if saved:
+        prune_media_health(client, started_at, family_id)
+    return {
+        "links": len(rows),
+        "urls": len({row["url"] for row in rows}),
+        "flagged": sum(1 for row in rows if row["flagged"]),
+        "saved": saved,
+        "error": None if saved else "não foi possível gravar o resultado",
+        "seconds": round(time.perf_counter() - started, 2),
+    }
@@ -0,0 +1,256 @@
+"""Processamento de mídia fora da requisição do admin (fila ``media_jobs``).
+
+Ao salvar uma história, o admin só envia o arquivo e enfileira um job; o
+trabalho pesado roda em tools/media_worker.py, em processos separados:
+
+- ``image``: calcula o sha256 e, com Pillow instalado, gera uma versão reduzida
+  em JPEG, que passa a ser a imagem da história;
+- ``audio``: calcula o sha256 e, com ffmpeg instalado, converte para AAC mono,
+  grava a duração em ``duration_seconds`` e corta o áudio em segmentos HLS de
+  poucos segundos (``audio_playlist_url``), para o leitor começar a tocar sem
+  baixar a narração inteira;
+- ``cover``: gera a miniatura da capa de uma coleção e um placeholder minúsculo
+  (JPEG de poucos bytes em data URI), exibido enquanto a miniatura carrega.
+
+Os arquivos processados têm o hash no nome, então podem ficar em cache na CDN
+para sempre. Sem Pillow/ffmpeg os jobs apenas registram o hash.
+"""
+
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+import base64
+import hashlib
+import io
+import os
+import shutil
+import subprocess
+import tempfile
+
+from stories_repository import swap_collection_cover, swap_story_media
+
+
+MEDIA_JOB_BACKOFF_SECONDS = 30
+MEDIA_JOB_MAX_BACKOFF_SECONDS = 3600
+IMAGE_MAX_WIDTH = 1280
+IMAGE_QUALITY = 82
+AUDIO_BITRATE = "64k"
+FFMPEG_TIMEOUT_SECONDS = 600
+# O primeiro segmento é curto para o som começar logo; os demais, maiores, poupam requisições
+HLS_FIRST_SEGMENT_SECONDS = 2
+HLS_SEGMENT_SECONDS = 6
+COVER_THUMB_WIDTH = 480
+COVER_THUMB_QUALITY = 75
+COVER_PLACEHOLDER_WIDTH = 16
+
+
+def media_job_key(kind: str, owner_id: str, path: str, fingerprint: str) -> str:
+    """Chave idempotente: o mesmo envio (mesmo arquivo, mesmo destino) gera o mesmo job."""
+
+    return f"{kind}:{owner_id}:{path}:{fingerprint}"
+
+
+def next_retry_at(attempts: int, max_attempts: int) -> Optional[str]:
+    """Horário da próxima tentativa (espera dobrando a cada falha) ou None se acabaram as tentativas."""
+
+    if attempts >= max_attempts:
+        return None
+    delay = min(MEDIA_JOB_BACKOFF_SECONDS * 2 ** max(0, attempts - 1), MEDIA_JOB_MAX_BACKOFF_SECONDS)
+    return (datetime.now(timezone.utc) + timedelta(seconds=delay)).isoformat()
+
+
+def _download(client, payload: Dict[str, Any]) -> bytes:
+    data = client.storage.from_(payload["bucket"]).download(payload["path"])
+    if not data:
+        raise RuntimeError(f"Arquivo vazio ou inexistente: {payload['bucket']}/{payload['path']}")
+    return data
+
+
+def _upload(client, bucket: str, path: str, data: bytes, content_type: str) -> str:
+    storage = client.storage.from_(bucket)
+    storage.upload(path, data, {"content-type": content_type, "upsert": True})
+    public_url = storage.get_public_url(path)
+    if isinstance(public_url, dict):
+        return public_url.get("publicUrl") or public_url.get("public_url")
+    return public_url
+
+
+def process_image_job(client, job: Dict[str, Any]) -> Dict[str, Any]:
+    payload = job.get("payload") or {}
+    data = _download(client, payload)
+    digest = hashlib.sha256(data).hexdigest()
+    result: Dict[str, Any] = {"sha256": digest, "bytes": len(data)}
+
+    try:
+        from PIL import Image  # import opcional: sem Pillow só registramos o hash
+    except ImportError:
+        result["resized"] = False
+        return result
+
+    with Image.open(io.BytesIO(data)) as image:
+        image = image.convert("RGB")
+        image.thumbnail((IMAGE_MAX_WIDTH, IMAGE_MAX_WIDTH * 4))
+        output = io.BytesIO()
+        image.save(output, format="JPEG", quality=IMAGE_QUALITY, optimize=True, progressive=True)
+        result.update(width=image.width, height=image.height)
+
+    resized = output.getvalue()
+    path = f"stories/{job['story_id']}/cover-{digest[:16]}.jpg"
+    url = _upload(client, payload["bucket"], path, resized, "image/jpeg")
+    result.update(resized=True, url=url, resized_bytes=len(resized))
+    result["applied"] = swap_story_media(
+        client, job["story_id"], "image_url", payload.get("source_url"), url
+    )
+    return result
+
+
+def _probe_duration(path: str) -> Optional[int]:
+    ffprobe = shutil.which("ffprobe")
+    if not ffprobe:
+        return None
+    completed = subprocess.run(
+        [ffprobe, "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", path],
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+    try:
+        return int(round(float(completed.stdout.strip())))
+    except ValueError:
+        return None
+
+
+def _segment_hls(ffmpeg: str, source: str, output_dir: str) -> List[str]:
+    """Corta o áudio já em AAC em segmentos MPEG-TS com playlist ``index.m3u8``, sem recodificar."""
+
+    os.makedirs(output_dir)
+    completed = subprocess.run(
+        [ffmpeg, "-y", "-v", "error", "-i", source, "-c", "copy", "-f", "hls",
+         "-hls_init_time", str(HLS_FIRST_SEGMENT_SECONDS), "-hls_time", str(HLS_SEGMENT_SECONDS),
+         "-hls_playlist_type", "vod", "-hls_list_size", "0",
+         "-hls_segment_filename", os.path.join(output_dir, "seg-%05d.ts"),
+         os.path.join(output_dir, "index.m3u8")],
+        capture_output=True,
+        text=True,
+        timeout=FFMPEG_TIMEOUT_SECONDS,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"ffmpeg (HLS) falhou: {completed.stderr.strip()[-500:]}")
+    return sorted(name for name in os.listdir(output_dir) if name.endswith(".ts"))
+
+
+def process_audio_job(client, job: Dict[str, Any]) -> Dict[str, Any]:
+    payload = job.get("payload") or {}
+    data = _download(client, payload)
+    digest = hashlib.sha256(data).hexdigest()
+    result: Dict[str, Any] = {"sha256": digest, "bytes": len(data)}
+
+    ffmpeg = shutil.which("ffmpeg")
+    if not ffmpeg:
+        result["transcoded"] = False
+        return result
+
+    with tempfile.TemporaryDirectory() as workdir:
+        source = os.path.join(workdir, "source" + os.path.splitext(payload["path"])[1])
+        target = os.path.join(workdir, "audio.m4a")
+        with open(source, "wb") as handle:
+            handle.write(data)
+        completed = subprocess.run(
+            [ffmpeg, "-y", "-v", "error", "-i", source, "-vn", "-ac", "1",
+             "-c:a", "aac", "-b:a", AUDIO_BITRATE, "-movflags", "+faststart", target],
+            capture_output=True,
+            text=True,
+            timeout=FFMPEG_TIMEOUT_SECONDS,
+        )
+        if completed.returncode != 0:
+            raise RuntimeError(f"ffmpeg falhou: {completed.stderr.strip()[-500:]}")
+        duration = _probe_duration(target)
+        with open(target, "rb") as handle:
+            transcoded = handle.read()
+
+        path = f"stories/{job['story_id']}/audio-{digest[:16]}.m4a"
+        url = _upload(client, payload["bucket"], path, transcoded, "audio/mp4")
+
+        # Segmentos primeiro, playlist por último: quem lê a playlist já encontra todos.
+        # A playlist cita os segmentos por nome, relativos à pasta dela.
+        hls_dir = os.path.join(workdir, "hls")
+        segments = _segment_hls(ffmpeg, target, hls_dir)
+        hls_prefix = f"stories/{job['story_id']}/hls-{digest[:16]}"
+        for name in segments:
+            with open(os.path.join(hls_dir, name), "rb") as handle:
+                _upload(client, payload["bucket"], f"{hls_prefix}/{name}", handle.read(), "video/mp2t")
+        with open(os.path.join(hls_dir, "index.m3u8"), "rb") as handle:
+            playlist_url = _upload(
+                client, payload["bucket"], f"{hls_prefix}/index.m3u8", handle.read(), "application/vnd.apple.mpegurl"
+            )
+
+    result.update(
+        transcoded=True,
+        url=url,
+        transcoded_bytes=len(transcoded),
+        duration_seconds=duration,
+        playlist_url=playlist_url,
+        segments=len(segments),
+    )
+    result["applied"] = swap_story_media(
+        client,
+        job["story_id"],
+        "audio_url",
+        payload.get("source_url"),
+        url,
+        duration_seconds=duration,
+        playlist_url=playlist_url,
+    )
+    return result
+
+
+def _jpeg(image, width: int, quality: int) -> bytes:
+    copy = image.copy()
+    copy.thumbnail((width, width * 4))
+    output = io.BytesIO()
+    copy.save(output, format="JPEG", quality=quality, optimize=True)
+    return output.getvalue()
+
+
+def process_cover_job(client, job: Dict[str, Any]) -> Dict[str, Any]:
+    payload = job.get("payload") or {}
+    data = _download(client, payload)
+    digest = hashlib.sha256(data).hexdigest()
+    result: Dict[str, Any] = {"sha256": digest, "bytes": len(data)}
+
+    try:
+        from PIL import Image  # import opcional: sem Pillow o leitor usa a capa original
+    except ImportError:
+        result["thumbnail"] = False
+        return result
+
+    with Image.open(io.BytesIO(data)) as image:
+        image = image.convert("RGB")
+        thumb = _jpeg(image, COVER_THUMB_WIDTH, COVER_THUMB_QUALITY)
+        tiny = _jpeg(image, COVER_PLACEHOLDER_WIDTH, 40)
+
+    collection_id = job["collection_id"]
+    thumb_url = _upload(
+        client, payload["bucket"], f"collections/{collection_id}/thumb-{digest[:16]}.jpg", thumb, "image/jpeg"
+    )
+    placeholder = "data:image/jpeg;base64," + base64.b64encode(tiny).decode("ascii")
+    result.update(thumbnail=True, url=thumb_url, thumb_bytes=len(thumb), placeholder_bytes=len(placeholder))
+    result["applied"] = swap_collection_cover(
+        client, collection_id, payload.get("source_url"), thumb_url, placeholder
+    )
+    return result
+
+
+MEDIA_JOB_HANDLERS: Dict[str, Callable[[Any, Dict[str, Any]], Dict[str, Any]]] = {
+    "image": process_image_job,
+    "audio": process_audio_job,
+    "cover": process_cover_job,
+}
+
+
+def process_media_job(client, job: Dict[str, Any]) -> Dict[str, Any]:
+    """Executa o job conforme o tipo; exceções indicam falha (o worker decide se tenta de novo)."""
+
+    handler = MEDIA_JOB_HANDLERS.get(job.get("kind"))
+    if handler is None:
+        raise ValueError(f"Tipo de job desconhecido: {job.get('kind')}")
+    return handler(client, job)
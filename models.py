@@ -0,0 +1,107 @@
+"""Modelos imutáveis do catálogo publicado, usados pelo modo leitor.
+
+As linhas do Supabase (dicts) são convertidas uma única vez, quando entram no
+cache do catálogo, e os mesmos objetos são compartilhados por todas as sessões.
+As classes usam ``__slots__`` (sem ``__dict__`` por instância) e os ids são
+internados, então várias listas que citam a mesma história ou coleção apontam
+para a mesma string.
+"""
+
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+import sys
+
+
+def _intern(value: Any) -> Optional[str]:
+    return sys.intern(str(value)) if value is not None else None
+
+
+def _int_or_none(value: Any) -> Optional[int]:
+    return int(value) if value is not None else None
+
+
+@dataclass(frozen=True, slots=True)
+class Collection:
+    """Coleção ativa exibida no leitor."""
+
+    id: str
+    name: str
+    description: Optional[str] = None
+    sort_order: int = 0
+    cover_url: Optional[str] = None
+    cover_thumb_url: Optional[str] = None
+    cover_placeholder: Optional[str] = None  # JPEG minúsculo em data URI
+
+    @classmethod
+    def from_row(cls, row: Dict[str, Any]) -> "Collection":
+        return cls(
+            id=_intern(row.get("id")),
+            name=row.get("name") or "Coleção",
+            description=row.get("description"),
+            sort_order=int(row.get("sort_order") or 0),
+            cover_url=row.get("cover_url") or None,
+            cover_thumb_url=row.get("cover_thumb_url") or None,
+            cover_placeholder=row.get("cover_placeholder") or None,
+        )
+
+    def to_row(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "description": self.description,
+            "sort_order": self.sort_order,
+            "cover_url": self.cover_url,
+            "cover_thumb_url": self.cover_thumb_url,
+            "cover_placeholder": self.cover_placeholder,
+        }
+
+
+@dataclass(frozen=True, slots=True)
+class StorySummary:
+    """História publicada sem o texto: o suficiente para listas, sorteio e cabeçalho da leitura."""
+
+    id: str
+    title: str
+    collection_id: Optional[str] = None
+    sort_order: int = 0
+    image_url: Optional[str] = None
+    audio_url: Optional[str] = None
+    audio_playlist_url: Optional[str] = None  # playlist HLS (áudio em segmentos)
+    duration_seconds: Optional[int] = None
+    word_count: Optional[int] = None
+    reading_time_seconds: Optional[int] = None
+    paragraph_count: Optional[int] = None
+    content_hash: Optional[str] = None
+
+    @classmethod
+    def from_row(cls, row: Dict[str, Any]) -> "StorySummary":
+        return cls(
+            id=_intern(row.get("id")),
+            title=row.get("title") or "História",
+            collection_id=_intern(row.get("collection_id")),
+            sort_order=int(row.get("sort_order") or 0),
+            image_url=row.get("image_url") or None,
+            audio_url=row.get("audio_url") or None,
+            audio_playlist_url=row.get("audio_playlist_url") or None,
+            duration_seconds=_int_or_none(row.get("duration_seconds")),
+            word_count=_int_or_none(row.get("word_count")),
+            reading_time_seconds=_int_or_none(row.get("reading_time_seconds")),
+            paragraph_count=_int_or_none(row.get("paragraph_count")),
+            content_hash=row.get("content_hash"),
+        )
+
+    def to_row(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "title": self.title,
+            "collection_id": self.collection_id,
+            "sort_order": self.sort_order,
+            "image_url": self.image_url,
+            "audio_url": self.audio_url,
+            "audio_playlist_url": self.audio_playlist_url,
+            "duration_seconds": self.duration_seconds,
+            "word_count": self.word_count,
+            "reading_time_seconds": self.reading_time_seconds,
+            "paragraph_count": self.paragraph_count,
+            "content_hash": self.content_hash,
+        }
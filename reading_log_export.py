@@ -0,0 +1,149 @@
+"""Exportação do histórico de leitura para arquivamento e análise fora do banco.
+
+As leituras chegam em páginas (``iter_reading_log_rows``) e são gravadas direto
+no arquivo de destino, página a página: a memória usada não depende do tamanho
+do histórico. Formatos: CSV compactado (gzip) e, com pyarrow instalado, Parquet.
+"""
+
+from datetime import date, datetime
+from itertools import islice
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional
+import csv
+import gzip
+import io
+
+from stories_repository import iter_reading_log_rows
+
+
+EXPORT_COLUMNS = ["id", "story_id", "collection_id", "source", "created_at"]
+# Exportação para análise: também título e coleção, já vindos da view reading_history
+ANALYSIS_COLUMNS = ["id", "created_at", "source", "story_id", "title", "collection_id", "collection_name"]
+EXPORT_BATCH_ROWS = 1000
+
+EXPORT_FORMATS = {
+    "csv": ("CSV compactado (.csv.gz)", ".csv.gz", "application/gzip"),
+    "parquet": ("Parquet (.parquet)", ".parquet", "application/vnd.apache.parquet"),
+}
+
+
+def parquet_available() -> bool:
+    """Indica se o pyarrow está instalado (necessário só para Parquet)."""
+
+    try:
+        import pyarrow  # noqa: F401  import opcional: só a exportação em Parquet precisa
+    except ImportError:
+        return False
+    return True
+
+
+def month_bounds(month: date):
+    """Devolve o primeiro dia do mês e o primeiro dia do mês seguinte, em ISO."""
+
+    start = month.replace(day=1)
+    if start.month == 12:
+        end = start.replace(year=start.year + 1, month=1)
+    else:
+        end = start.replace(month=start.month + 1)
+    return start.isoformat(), end.isoformat()
+
+
+def write_csv_gz(rows: Iterable[Dict[str, Any]], target: BinaryIO, columns: List[str]) -> int:
+    """Grava as linhas como CSV compactado (gzip), uma por vez. Retorna o total de linhas."""
+
+    total = 0
+    with gzip.GzipFile(fileobj=target, mode="wb") as compressed:
+        text = io.TextIOWrapper(compressed, encoding="utf-8", newline="")
+        writer = csv.DictWriter(text, fieldnames=columns, extrasaction="ignore")
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            total += 1
+        text.flush()
+        text.detach()
+    return total
+
+
+def _timestamp(value: Any) -> Optional[datetime]:
+    if not value:
+        return None
+    return datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+
+
+def _batches(rows: Iterable[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    iterator = iter(rows)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def write_parquet(rows: Iterable[Dict[str, Any]], target: BinaryIO, batch_rows: int = EXPORT_BATCH_ROWS) -> int:
+    """Grava as linhas de análise em Parquet, um grupo de linhas por lote. Retorna o total de linhas."""
+
+    import pyarrow as pa  # import opcional: ver parquet_available
+    import pyarrow.parquet as pq
+
+    schema = pa.schema(
+        [
+            ("id", pa.string()),
+            ("created_at", pa.timestamp("us", tz="UTC")),
+            ("source", pa.string()),
+            ("story_id", pa.string()),
+            ("title", pa.string()),
+            ("collection_id", pa.string()),
+            ("collection_name", pa.string()),
+        ]
+    )
+
+    total = 0
+    with pq.ParquetWriter(target, schema, compression="zstd") as writer:
+        for batch in _batches(rows, batch_rows):
+            columns = {
+                name: [row.get(name) for row in batch] for name in ANALYSIS_COLUMNS if name != "created_at"
+            }
+            columns["created_at"] = [_timestamp(row.get("created_at")) for row in batch]
+            writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+            total += len(batch)
+    return total
+
+
+def export_reading_log(
+    client,
+    target: BinaryIO,
+    fmt: str = "csv",
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    collection_id: Optional[str] = None,
+    source: Optional[str] = None,
+    family_id: Optional[str] = None,
+) -> int:
+    """Exporta o histórico (filtros opcionais) para ``target`` em ``fmt`` ("csv" ou "parquet").
+
+    ``date_from`` é inclusivo e ``date_to`` exclusivo. Retorna o total de linhas.
+    """
+
+    rows = iter_reading_log_rows(
+        client,
+        date_from,
+        date_to,
+        page_size=EXPORT_BATCH_ROWS,
+        collection_id=collection_id,
+        source=source,
+        family_id=family_id,
+    )
+    if fmt == "parquet":
+        return write_parquet(rows, target)
+    if fmt == "csv":
+        return write_csv_gz(rows, target, ANALYSIS_COLUMNS)
+    raise ValueError(f"Formato de exportação desconhecido: {fmt}")
+
+
+def write_month_archive(client, month: date, target: BinaryIO, family_id: Optional[str] = None) -> int:
+    """Grava as leituras detalhadas de um mês (da família, se informada) como CSV compactado (gzip).
+
+    Retorna o total de linhas.
+    """
+
+    start, end = month_bounds(month)
+    return write_csv_gz(iter_reading_log_rows(client, start, end, family_id=family_id), target, EXPORT_COLUMNS)
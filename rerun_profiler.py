@@ -0,0 +1,224 @@
+"""Profiler opcional dos reruns do Streamlit, medindo fases nomeadas do script.
+
+Ativado por sessão (``?profile=1`` na URL ou ``RERUN_PROFILER = true`` nos
+secrets). Cada rerun vira uma árvore de fases (``with phase("catálogo"):``),
+medidas com ``time.perf_counter``. As fases podem ser aninhadas e também ficam
+dentro de funções chamadas pelo script (ex.: consultas ao banco no cache do
+catálogo), porque o rerun atual é guardado por thread: o Streamlit roda cada
+sessão na sua própria thread. Sem profiler ativo, ``phase`` não faz nada.
+
+Os reruns ficam em memória no processo, por sessão (as últimas
+``MAX_RERUNS_PER_SESSION`` de até ``MAX_SESSIONS`` sessões), para o painel admin
+mostrar o resumo por fase e exportar no formato do speedscope
+(https://www.speedscope.app), que desenha o flamegraph de cada rerun.
+"""
+
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional
+import functools
+import statistics
+import threading
+import time
+
+
+MAX_SESSIONS = 50
+MAX_RERUNS_PER_SESSION = 100
+
+
+@dataclass
+class Phase:
+    """Fase medida dentro de um rerun; ``start``/``end`` em segundos desde o início do rerun."""
+
+    name: str
+    start: float
+    end: float = 0.0
+    children: List["Phase"] = field(default_factory=list)
+
+    @property
+    def seconds(self) -> float:
+        return self.end - self.start
+
+
+@dataclass
+class RerunProfile:
+    """Um rerun completo: a raiz engloba o script inteiro."""
+
+    session_id: str
+    root: Phase
+    started_at: float  # time.time(), para exibir quando o rerun aconteceu
+    _clock: float = 0.0
+    _stack: List[Phase] = field(default_factory=list)
+
+    @property
+    def seconds(self) -> float:
+        return self.root.seconds
+
+    def _now(self) -> float:
+        return time.perf_counter() - self._clock
+
+
+_local = threading.local()
+_sessions: "OrderedDict[str, Deque[RerunProfile]]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def start_rerun(session_id: str, name: str) -> RerunProfile:
+    """Começa a medir um rerun nesta thread; a fase raiz recebe ``name`` (ex.: o modo do app)."""
+
+    root = Phase(name, 0.0)
+    profile = RerunProfile(session_id, root, time.time(), time.perf_counter())
+    profile._stack.append(root)
+    _local.profile = profile
+    return profile
+
+
+def finish_rerun() -> Optional[RerunProfile]:
+    """Encerra o rerun desta thread e o guarda entre os da sessão."""
+
+    profile = getattr(_local, "profile", None)
+    if profile is None:
+        return None
+    _local.profile = None
+    now = profile._now()
+    # Fases interrompidas (st.rerun, st.stop, exceções) terminam junto com o rerun
+    for open_phase in profile._stack:
+        open_phase.end = open_phase.end or now
+    profile._stack.clear()
+
+    with _lock:
+        reruns = _sessions.pop(profile.session_id, None) or deque(maxlen=MAX_RERUNS_PER_SESSION)
+        reruns.append(profile)
+        _sessions[profile.session_id] = reruns
+        while len(_sessions) > MAX_SESSIONS:
+            _sessions.popitem(last=False)
+    return profile
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Mede o bloco como uma fase do rerun atual (não faz nada sem profiler ativo)."""
+
+    profile = getattr(_local, "profile", None)
+    if profile is None:
+        yield
+        return
+
+    current = Phase(name, profile._now())
+    profile._stack[-1].children.append(current)
+    profile._stack.append(current)
+    try:
+        yield
+    finally:
+        current.end = profile._now()
+        if profile._stack and profile._stack[-1] is current:
+            profile._stack.pop()
+
+
+def profiled(name: str) -> Callable:
+    """Decorador: mede cada chamada da função como a fase ``name``."""
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with phase(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def sessions() -> Dict[str, List[RerunProfile]]:
+    """Reruns guardados por sessão, da sessão mais recente para a mais antiga."""
+
+    with _lock:
+        return {session_id: list(reruns) for session_id, reruns in reversed(_sessions.items())}
+
+
+def clear() -> None:
+    """Descarta todos os reruns guardados."""
+
+    with _lock:
+        _sessions.clear()
+
+
+def _walk(node: Phase, path: str) -> Iterator[tuple]:
+    path = f"{path} › {node.name}" if path else node.name
+    child_seconds = sum(child.seconds for child in node.children)
+    yield path, node.seconds, max(0.0, node.seconds - child_seconds)
+    for child in node.children:
+        yield from _walk(child, path)
+
+
+def summarize(reruns: List[RerunProfile]) -> List[Dict[str, Any]]:
+    """Resumo por fase (caminho completo na árvore), da fase mais cara para a mais barata.
+
+    "Próprio" desconta o tempo das fases filhas: é o que a fase gastou sozinha.
+    """
+
+    totals: Dict[str, List[float]] = {}
+    own: Dict[str, float] = {}
+    for rerun in reruns:
+        for path, seconds, own_seconds in _walk(rerun.root, ""):
+            totals.setdefault(path, []).append(seconds)
+            own[path] = own.get(path, 0.0) + own_seconds
+
+    rows = []
+    for path, samples in totals.items():
+        ordered = sorted(samples)
+        rows.append(
+            {
+                "Fase": path,
+                "Chamadas": len(samples),
+                "Total (ms)": round(sum(samples) * 1000, 1),
+                "Próprio (ms)": round(own[path] * 1000, 1),
+                "Média (ms)": round(statistics.fmean(samples) * 1000, 1),
+                "p95 (ms)": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 1),
+            }
+        )
+    return sorted(rows, key=lambda row: row["Total (ms)"], reverse=True)
+
+
+def to_speedscope(reruns: List[RerunProfile], name: str = "Contador de Histórias") -> Dict[str, Any]:
+    """Exporta os reruns no formato de arquivo do speedscope (um perfil "evented" por rerun)."""
+
+    frames: List[Dict[str, str]] = []
+    frame_index: Dict[str, int] = {}
+
+    def frame(phase_name: str) -> int:
+        if phase_name not in frame_index:
+            frame_index[phase_name] = len(frames)
+            frames.append({"name": phase_name})
+        return frame_index[phase_name]
+
+    def events(node: Phase) -> Iterator[Dict[str, Any]]:
+        index = frame(node.name)
+        yield {"type": "O", "frame": index, "at": round(node.start * 1000, 3)}
+        for child in node.children:
+            yield from events(child)
+        yield {"type": "C", "frame": index, "at": round(node.end * 1000, 3)}
+
+    profiles = []
+    for position, rerun in enumerate(reruns, start=1):
+        started = time.strftime("%H:%M:%S", time.localtime(rerun.started_at))
+        profiles.append(
+            {
+                "type": "evented",
+                "name": f"{rerun.session_id} #{position} {rerun.root.name} {started}",
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": round(rerun.root.end * 1000, 3),
+                "events": list(events(rerun.root)),
+            }
+        )
+
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": name,
+        "exporter": "rerun_profiler",
+        "activeProfileIndex": 0,
+        "shared": {"frames": frames},
+        "profiles": profiles,
+    }
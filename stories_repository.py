@@ -1,44 +1,91 @@
 """Consultas e operações de histórias armazenadas no Supabase."""
 
-from typing import List, Optional, Dict, Any
+from datetime import datetime, timezone
+from typing import Iterator, List, Optional, Dict, Any
 import random
+import uuid
+
+from story_artifacts import build_story_artifacts
 
 
 Story = Dict[str, Any]
 Collection = Dict[str, Any]
 
 
-def get_active_collections(client) -> List[Collection]:
-    """Retorna coleções ativas ordenadas por sort_order e nome.
+def _for_family(query, family_id: Optional[str]):
+    """Restringe a consulta à família (sem família: todas, como antes das famílias)."""
+
+    return query.eq("family_id", family_id) if family_id else query
+
+
+def get_family_by_slug(client, slug: str) -> Optional[Dict[str, Any]]:
+    """Busca a família pelo slug usado na URL (``?family=slug``)."""
+
+    try:
+        response = (
+            client.table("families")
+            .select("id,slug,name,reader_pin")
+            .eq("slug", slug)
+            .limit(1)
+            .execute()
+        )
+        rows = response.data or []
+        return rows[0] if rows else None
+    except Exception as exc:  # pragma: no cover
+        print(f"[Supabase] Erro ao buscar família: {exc}")
+        return None
+
+
+def list_families(client) -> List[Dict[str, Any]]:
+    """Lista as famílias (id, slug e nome) ordenadas pelo slug."""
+
+    try:
+        response = client.table("families").select("id,slug,name").order("slug").execute()
+        return response.data or []
+    except Exception as exc:  # pragma: no cover
+        print(f"[Supabase] Erro ao listar famílias: {exc}")
+        return []
+
+
+def get_active_collections(client, family_id: Optional[str] = None) -> List[Collection]:
+    """Retorna coleções ativas (da família, se informada) ordenadas por sort_order e nome.
 
     Em caso de erro, registra no log e devolve lista vazia para não quebrar a UI.
     """
 
     try:
-        response = (
+        query = (
             client.table("collections")
-            .select("id,name,description,sort_order")
+            .select("id,name,description,sort_order,cover_url,cover_thumb_url,cover_placeholder")
             .eq("is_active", True)
-            .order("sort_order")
-            .order("name")
-            .execute()
         )
+        response = _for_family(query, family_id).order("sort_order").order("name").execute()
         return response.data or []
     except Exception as exc:  # pragma: no cover - log simples para debug
         print(f"[Supabase] Erro ao buscar coleções ativas: {exc}")
         return []
 
 
-def get_published_stories_by_collection(client, collection_id: str) -> List[Story]:
-    """Retorna histórias publicadas de uma coleção específica, ordenadas por sort_order e título."""
+def get_published_stories_by_collection(
+    client, collection_id: str, family_id: Optional[str] = None
+) -> List[Story]:
+    """Retorna histórias publicadas de uma coleção específica, ordenadas por sort_order e título.
+
+    Traz apenas o resumo (sem o texto), suficiente para listas e sorteio; o
+    ``updated_at`` permite à exportação estática reconstruir só o que mudou.
+    """
 
     try:
-        response = (
+        query = (
             client.table("stories")
             .select(
-                "id,title,body,image_url,audio_url,duration_seconds,sort_order,collection_id"
+                "id,title,image_url,audio_url,audio_playlist_url,duration_seconds,sort_order,"
+                "collection_id,word_count,reading_time_seconds,paragraph_count,content_hash,updated_at"
             )
             .eq("is_published", True)
+        )
+        response = (
+            _for_family(query, family_id)
             .eq("collection_id", collection_id)
             .order("sort_order")
             .order("title")
@@ -50,17 +97,21 @@ def get_published_stories_by_collection(client, collection_id: str) -> List[Stor
         return []
 
 
-def get_random_published_story(client, collection_id: Optional[str] = None) -> Optional[Story]:
+def get_random_published_story(
+    client, collection_id: Optional[str] = None, family_id: Optional[str] = None
+) -> Optional[Story]:
     """Escolhe aleatoriamente uma história publicada, opcionalmente filtrada por coleção."""
 
     try:
         query = (
             client.table("stories")
             .select(
-                "id,title,body,image_url,audio_url,duration_seconds,sort_order,collection_id"
+                "id,title,body,paragraphs,image_url,audio_url,audio_playlist_url,duration_seconds,"
+                "sort_order,collection_id,word_count,reading_time_seconds"
             )
             .eq("is_published", True)
         )
+        query = _for_family(query, family_id)
 
         if collection_id:
             query = query.eq("collection_id", collection_id)
@@ -76,39 +127,121 @@ def get_random_published_story(client, collection_id: Optional[str] = None) -> O
         return None
 
 
-def get_all_published_stories(client) -> List[Story]:
-    """Retorna todas as histórias publicadas, usadas para o sorteio geral no modo leitor."""
+def get_all_published_stories(client, family_id: Optional[str] = None) -> List[Story]:
+    """Retorna o resumo (sem texto) de todas as histórias publicadas, usado no sorteio geral."""
 
     try:
-        response = (
+        query = (
             client.table("stories")
             .select(
-                "id,title,body,image_url,audio_url,duration_seconds,sort_order,collection_id"
+                "id,title,image_url,audio_url,audio_playlist_url,duration_seconds,sort_order,"
+                "collection_id,word_count,reading_time_seconds,paragraph_count,content_hash"
             )
             .eq("is_published", True)
-            .order("sort_order")
-            .order("title")
-            .execute()
         )
+        response = _for_family(query, family_id).order("sort_order").order("title").execute()
         return response.data or []
     except Exception as exc:  # pragma: no cover
         print(f"[Supabase] Erro ao listar histórias publicadas: {exc}")
         return []
 
 
-# Funções administrativas (CRUD básico)
+def get_published_story(client, story_id: str, family_id: Optional[str] = None) -> Optional[Story]:
+    """Busca os dados de uma história publicada, sem o texto, para o modo de leitura paginada.
 
-def list_collections_for_admin(client) -> List[Collection]:
-    """Lista todas as coleções para administração, sem filtrar por is_active."""
+    Com ``family_id``, histórias de outra família não são encontradas.
+    """
+
+    try:
+        query = (
+            client.table("stories")
+            .select(
+                "id,title,image_url,audio_url,audio_playlist_url,duration_seconds,sort_order,"
+                "collection_id,word_count,reading_time_seconds,paragraph_count,content_hash"
+            )
+            .eq("id", story_id)
+            .eq("is_published", True)
+        )
+        response = _for_family(query, family_id).limit(1).execute()
+        rows = response.data or []
+        return rows[0] if rows else None
+    except Exception as exc:  # pragma: no cover
+        print(f"[Supabase] Erro ao buscar história publicada: {exc}")
+        return None
+
+
+def get_story_paragraphs(
+    client, story_id: str, offset: int, limit: int, family_id: Optional[str] = None
+) -> List[str]:
+    """Retorna um intervalo de parágrafos pré-calculados de uma história publicada (da família, se informada)."""
+
+    try:
+        response = client.rpc(
+            "get_story_paragraphs",
+            {"p_story_id": story_id, "p_offset": offset, "p_limit": limit, "p_family_id": family_id},
+        ).execute()
+        rows = response.data or []
+        return [row.get("paragraph") or "" for row in rows]
+    except Exception as exc:  # pragma: no cover
+        print(f"[Supabase] Erro ao buscar parágrafos da história: {exc}")
+        return []
+
+
+def get_story_body(client, story_id: str, family_id: Optional[str] = None) -> Optional[str]:
+    """Busca apenas o texto completo de uma história publicada (histórias sem parágrafos gravados)."""
 
     try:
         response = (
-            client.table("collections")
-            .select("id,name,description,sort_order,is_active,created_at,updated_at")
-            .order("sort_order")
-            .order("name")
+            _for_family(client.table("stories").select("body"), family_id)
+            .eq("id", story_id)
+            .eq("is_published", True)
+            .limit(1)
+            .execute()
+        )
+        rows = response.data or []
+        return rows[0].get("body") if rows else None
+    except Exception as exc:  # pragma: no cover
+        print(f"[Supabase] Erro ao buscar texto da história: {exc}")
+        return None
+
+
+def get_catalog_versions(client, family_id: str) -> Optional[Dict[str, int]]:
+    """Versão atual de cada escopo do catálogo da família (tabela ``catalog_versions``, mantida por gatilhos).
+
+    No banco os escopos começam pelo id da família (``<família>:collections``);
+    aqui voltam sem o prefixo: ``collections``, ``stories`` e o id de cada coleção.
+    É uma consulta pequena, feita a cada rerun para saber quais listas em cache mudaram.
+    Devolve None em caso de erro (por exemplo, tabela ainda não criada).
+    """
+
+    prefix = f"{family_id}:"
+    try:
+        response = (
+            client.table("catalog_versions")
+            .select("scope,version")
+            .like("scope", f"{prefix}%")
             .execute()
         )
+        return {
+            row["scope"][len(prefix):]: int(row["version"])
+            for row in response.data or []
+            if row["scope"].startswith(prefix)
+        }
+    except Exception as exc:  # pragma: no cover
+        print(f"[Supabase] Erro ao consultar versões do catálogo: {exc}")
+        return None
+
+
+# Funções administrativas (CRUD básico)
+
+def list_collections_for_admin(client, family_id: Optional[str] = None) -> List[Collection]:
+    """Lista todas as coleções (da família, se informada) para administração, sem filtrar por is_active."""
+
+    try:
+        query = client.table("collections").select(
+            "id,name,description,sort_order,is_active,cover_url,created_at,updated_at"
+        )
+        response = _for_family(query, family_id).order("sort_order").order("name").execute()
         return response.data or []
     except Exception as exc:  # pragma: no cover
         print(f"[Supabase] Erro ao listar coleções (admin): {exc}")
@@ -116,7 +249,7 @@ def list_collections_for_admin(client) -> List[Collection]:
 
 
 def create_collection(client, data: Dict[str, Any]) -> Optional[Collection]:
-    """Cria uma nova coleção com valores fornecidos."""
+    """Cria uma nova coleção com valores fornecidos (``family_id`` opcional: família padrão)."""
 
     payload = {
         "name": data.get("name"),
@@ -124,6 +257,8 @@ def create_collection(client, data: Dict[str, Any]) -> Optional[Collection]:
         "sort_order": data.get("sort_order", 0),
         "is_active": data.get("is_active", True),
     }
+    if data.get("family_id"):
+        payload["family_id"] = data["family_id"]
 
     try:
         response = client.table("collections").insert(payload).execute()
@@ -155,15 +290,17 @@ def update_collection(client, collection_id: str, data: Dict[str, Any]) -> Optio
         return None
 
 
-def list_stories_for_collection_admin(client, collection_id: str) -> List[Story]:
-    """Lista histórias de uma coleção para administração, sem filtrar por publicação."""
+def list_stories_for_collection_admin(client, collection_id: str, family_id: Optional[str] = None) -> List[Story]:
+    """Lista histórias de uma coleção (da família) para administração, sem filtrar por publicação."""
 
     try:
         response = (
-            client.table("stories")
-            .select(
-                "id,title,body,image_url,audio_url,is_published,sort_order,"
-                "duration_seconds,created_at,updated_at,collection_id"
+            _for_family(
+                client.table("stories").select(
+                    "id,title,body,image_url,audio_url,is_published,sort_order,"
+                    "duration_seconds,created_at,updated_at,collection_id"
+                ),
+                family_id,
             )
             .eq("collection_id", collection_id)
             .order("sort_order")
@@ -189,6 +326,7 @@ def create_story(client, data: Dict[str, Any]) -> Optional[Story]:
         "sort_order": data.get("sort_order", 0),
         "duration_seconds": data.get("duration_seconds"),
     }
+    payload.update(build_story_artifacts(payload["body"] or ""))
 
     try:
         response = client.table("stories").insert(payload).execute()
@@ -200,15 +338,19 @@ def create_story(client, data: Dict[str, Any]) -> Optional[Story]:
         return None
 
 
-def update_story(client, story_id: str, data: Dict[str, Any]) -> Optional[Story]:
-    """Atualiza campos de uma história específica."""
+def update_story(client, story_id: str, data: Dict[str, Any], family_id: Optional[str] = None) -> Optional[Story]:
+    """Atualiza campos de uma história específica (da família, se informada).
+
+    Quando o texto muda, os artefatos derivados são recalculados no mesmo update.
+    """
 
     payload = {key: value for key, value in data.items()}
+    if "body" in payload:
+        payload.update(build_story_artifacts(payload["body"] or ""))
 
     try:
         response = (
-            client.table("stories")
-            .update(payload)
+            _for_family(client.table("stories").update(payload), family_id)
             .eq("id", story_id)
             .execute()
         )
@@ -220,6 +362,32 @@ def update_story(client, story_id: str, data: Dict[str, Any]) -> Optional[Story]
         return None
 
 
+def bulk_update_stories(client, updates: List[Dict[str, Any]], family_id: Optional[str] = None) -> bool:
+    """Aplica ordem, publicação e coleção de várias histórias em uma única chamada.
+
+    Cada item precisa ter ``id``; os demais campos aceitos são ``sort_order``,
+    ``is_published`` e ``collection_id``. Com ``family_id``, o banco recusa o lote
+    se alguma história ou coleção for de outra família. Retorna True em sucesso.
+    """
+
+    allowed_fields = {"id", "sort_order", "is_published", "collection_id"}
+    payload = [
+        {key: value for key, value in item.items() if key in allowed_fields}
+        for item in updates
+        if item.get("id")
+    ]
+
+    if not payload:
+        return True
+
+    try:
+        client.rpc("bulk_update_stories", {"updates": payload, "p_family_id": family_id}).execute()
+        return True
+    except Exception as exc:  # pragma: no cover
+        print(f"[Supabase] Erro ao atualizar histórias em lote: {exc}")
+        return False
+
+
 def update_story_media(
     client, story_id: str, image_url: Optional[str] = None, audio_url: Optional[str] = None
 ) -> Optional[Story]:
@@ -250,142 +418,491 @@ def update_story_media(
         return None
 
 
-def delete_story(client, story_id: str) -> bool:
-    """Exclui uma história pelo id. Retorna True em sucesso."""
+def refresh_missing_story_artifacts(client, family_id: Optional[str] = None) -> int:
+    """Calcula artefatos de histórias antigas (da família) que ainda não os têm.
+
+    Retorna quantas foram atualizadas.
+    """
 
     try:
-        client.table("stories").delete().eq("id", story_id).execute()
+        response = (
+            _for_family(client.table("stories").select("id,body"), family_id)
+            .is_("content_hash", "null")
+            .execute()
+        )
+        updated = 0
+        for story in response.data or []:
+            artifacts = build_story_artifacts(story.get("body") or "")
+            _for_family(client.table("stories").update(artifacts), family_id).eq("id", story.get("id")).execute()
+            updated += 1
+        return updated
+    except Exception as exc:  # pragma: no cover
+        print(f"[Supabase] Erro ao recalcular artefatos das histórias: {exc}")
+        return 0
+
+
+def delete_story(client, story_id: str, family_id: Optional[str] = None) -> bool:
+    """Exclui uma história (da família, se informada) pelo id. Retorna True em sucesso."""
+
+    try:
+        _for_family(client.table("stories").delete(), family_id).eq("id", story_id).execute()
         return True
     except Exception as exc:  # pragma: no cover
         print(f"[Supabase] Erro ao excluir história: {exc}")
         return False
 
 
-def log_story_read(client, story_id: str, collection_id: Optional[str], source: str) -> bool:
-    """Registra uma leitura no histórico, sem interromper a UI em caso de falha."""
+def log_story_read(
+    client,
+    story_id: str,
+    collection_id: Optional[str],
+    source: str,
+    event_id: Optional[str] = None,
+    created_at: Optional[str] = None,
+    family_id: Optional[str] = None,
+) -> bool:
+    """Registra uma leitura no histórico, sem interromper a UI em caso de falha.
+
+    ``event_id`` e ``created_at`` identificam a abertura da história (chave primária
+    da ``reading_log``): repetir a chamada com os mesmos valores não grava de novo.
+    Sem eles, cada chamada gera um evento novo. Sem ``family_id``, a leitura fica
+    na família padrão.
+    """
 
     normalized_source = source if source in {"random", "manual"} else "manual"
     payload = {
+        "id": event_id or str(uuid.uuid4()),
+        "created_at": created_at or datetime.now(timezone.utc).isoformat(),
         "story_id": story_id,
         "collection_id": collection_id,
         "source": normalized_source,
     }
+    if family_id:
+        payload["family_id"] = family_id
 
     try:
-        client.table("reading_log").insert(payload).execute()
+        client.table("reading_log").upsert(
+            payload,
+            on_conflict="id,created_at",
+            ignore_duplicates=True,
+        ).execute()
         return True
     except Exception as exc:  # pragma: no cover
         print(f"[Supabase] Erro ao registrar leitura: {exc}")
         return False
 
 
-def get_recent_reads(client, limit: int = 20) -> List[Dict[str, Any]]:
-    """Busca leituras recentes, tentando trazer título e coleção quando disponíveis."""
+def get_recent_reads(
+    client,
+    limit: int = 20,
+    before: Optional[Dict[str, Any]] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    collection_id: Optional[str] = None,
+    source: Optional[str] = None,
+    family_id: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """Busca leituras recentes já com título e coleção, numa única consulta (RPC get_reading_history).
+
+    Filtros opcionais: família, período (``date_from`` inclusivo, ``date_to`` exclusivo),
+    coleção e origem. Para a próxima página, passe em ``before`` a última linha recebida: a
+    busca continua a partir dela (``created_at``, ``id``), sem OFFSET.
+    """
+
+    params: Dict[str, Any] = {
+        "p_limit": limit,
+        "p_from": date_from,
+        "p_to": date_to,
+        "p_collection_id": collection_id,
+        "p_source": source,
+        "p_family_id": family_id,
+    }
+    if before:
+        params["p_before_created_at"] = before.get("created_at")
+        params["p_before_id"] = before.get("id")
 
     try:
-        response = (
-            client.table("reading_log")
-            .select("story_id,collection_id,source,created_at,stories(title),collections(name)")
-            .order("created_at", desc=True)
-            .limit(limit)
-            .execute()
-        )
+        response = client.rpc("get_reading_history", params).execute()
+        return [
+            {
+                "id": row.get("id"),
+                "title": row.get("title") or "—",
+                "collection_name": row.get("collection_name") or "—",
+                "source": row.get("source"),
+                "created_at": row.get("created_at"),
+            }
+            for row in response.data or []
+        ]
+    except Exception as exc:  # pragma: no cover
+        print(f"[Supabase] Erro ao buscar histórico de leituras: {exc}")
+        return []
+
+
+def get_read_count_by_story(client, family_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Retorna um ranking das histórias mais lidas (da família, se informada), somando leituras recentes e resumos mensais."""
+
+    try:
+        response = client.rpc("get_read_counts_by_story", {"p_family_id": family_id}).execute()
+        return [
+            {
+                "story_id": row.get("story_id"),
+                "title": row.get("title") or "História",
+                "read_count": int(row.get("read_count") or 0),
+            }
+            for row in response.data or []
+        ]
+    except Exception as exc:  # pragma: no cover
+        print(f"[Supabase] Erro ao montar ranking de leituras: {exc}")
+        return []
+
+
+# Retenção e arquivamento do histórico de leitura (partições mensais)
+
+def list_reading_log_partitions(client, family_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Lista as partições mensais do histórico com a quantidade de linhas (da família, se informada)."""
+
+    try:
+        response = client.rpc("reading_log_partitions", {"p_family_id": family_id}).execute()
+        return response.data or []
+    except Exception as exc:  # pragma: no cover
+        print(f"[Supabase] Erro ao listar partições do histórico: {exc}")
+        return []
+
+
+def ensure_reading_log_partitions(client, months_ahead: int = 2) -> bool:
+    """Garante partições para o mês atual e os próximos. Retorna True em sucesso."""
+
+    try:
+        client.rpc("ensure_reading_log_partitions", {"p_months_ahead": months_ahead}).execute()
+        return True
+    except Exception as exc:  # pragma: no cover
+        print(f"[Supabase] Erro ao criar partições do histórico: {exc}")
+        return False
+
+
+def apply_reading_log_retention(client, keep_months: int, family_id: Optional[str] = None) -> Optional[int]:
+    """Resume os meses fora da retenção (só da família, se informada) e remove seus detalhes.
+
+    Retorna quantos meses foram resumidos.
+    """
+
+    try:
+        response = client.rpc(
+            "apply_reading_log_retention", {"p_keep_months": keep_months, "p_family_id": family_id}
+        ).execute()
+        return int(response.data or 0)
+    except Exception as exc:  # pragma: no cover
+        print(f"[Supabase] Erro ao aplicar retenção do histórico: {exc}")
+        return None
+
+
+def iter_reading_log_rows(
+    client,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    page_size: int = 1000,
+    collection_id: Optional[str] = None,
+    source: Optional[str] = None,
+    family_id: Optional[str] = None,
+) -> Iterator[Dict[str, Any]]:
+    """Percorre as leituras entre ``start`` (inclusivo) e ``end`` (exclusivo) em páginas.
+
+    Apenas uma página fica em memória por vez, permitindo exportar o histórico inteiro.
+    Cada página continua depois da última linha recebida (``created_at``, ``id``, RPC
+    export_reading_history), então o custo por página não cresce com o tamanho do log.
+    As linhas já trazem título e coleção. Filtros opcionais: família, coleção e origem.
+    Erros interrompem a iteração (e são propagados) para não gerar arquivos incompletos.
+    """
+
+    params: Dict[str, Any] = {
+        "p_limit": page_size,
+        "p_from": start,
+        "p_to": end,
+        "p_collection_id": collection_id,
+        "p_source": source,
+        "p_family_id": family_id,
+    }
+    while True:
+        response = client.rpc("export_reading_history", params).execute()
         rows = response.data or []
+        yield from rows
+        if len(rows) < page_size:
+            return
+        params["p_after_created_at"] = rows[-1].get("created_at")
+        params["p_after_id"] = rows[-1].get("id")
 
-        story_titles: Dict[str, str] = {}
-        collection_names: Dict[str, str] = {}
 
-        # Preenche mapas com dados aninhados (quando suportado)
-        for row in rows:
-            story_data = row.get("stories") or {}
-            collection_data = row.get("collections") or {}
-            if row.get("story_id") and story_data.get("title"):
-                story_titles[row["story_id"]] = story_data.get("title")
-            if row.get("collection_id") and collection_data.get("name"):
-                collection_names[row["collection_id"]] = collection_data.get("name")
-
-        # Busca títulos faltantes, caso a seleção aninhada não esteja habilitada
-        missing_story_ids = {
-            row.get("story_id")
-            for row in rows
-            if row.get("story_id") and row.get("story_id") not in story_titles
-        }
-        if missing_story_ids:
-            stories_response = (
-                client.table("stories")
-                .select("id,title")
-                .in_("id", list(missing_story_ids))
+# Fila de processamento de mídia (ver media_jobs.py e tools/media_worker.py)
+
+def enqueue_media_job(
+    client,
+    job_key: str,
+    kind: str,
+    story_id: Optional[str],
+    payload: Dict[str, Any],
+    collection_id: Optional[str] = None,
+) -> bool:
+    """Enfileira um job de mídia; uma job_key já existente é ignorada (idempotente)."""
+
+    row: Dict[str, Any] = {"job_key": job_key, "kind": kind, "story_id": story_id, "payload": payload}
+    if collection_id is not None:
+        row["collection_id"] = collection_id
+
+    try:
+        client.table("media_jobs").upsert(
+            row,
+            on_conflict="job_key",
+            ignore_duplicates=True,
+        ).execute()
+        return True
+    except Exception as exc:  # pragma: no cover
+        print(f"[Supabase] Erro ao enfileirar processamento de mídia: {exc}")
+        return False
+
+
+def claim_media_jobs(client, worker: str, limit: int = 1) -> List[Dict[str, Any]]:
+    """Reserva até ``limit`` jobs prontos para este worker (sem disputa entre workers)."""
+
+    try:
+        response = client.rpc(
+            "claim_media_jobs", {"p_worker": worker, "p_limit": limit}
+        ).execute()
+        return response.data or []
+    except Exception as exc:  # pragma: no cover
+        print(f"[Supabase] Erro ao reservar jobs de mídia: {exc}")
+        return []
+
+
+def complete_media_job(client, job_id: str, result: Dict[str, Any]) -> bool:
+    """Marca o job como concluído e guarda o resultado."""
+
+    try:
+        client.table("media_jobs").update(
+            {"status": "done", "result": result, "last_error": None, "locked_by": None, "locked_at": None}
+        ).eq("id", job_id).execute()
+        return True
+    except Exception as exc:  # pragma: no cover
+        print(f"[Supabase] Erro ao concluir job de mídia: {exc}")
+        return False
+
+
+def fail_media_job(client, job: Dict[str, Any], error: str, retry_at: Optional[str]) -> bool:
+    """Registra a falha; com ``retry_at`` o job volta para a fila, sem ele fica como falho."""
+
+    payload: Dict[str, Any] = {
+        "status": "pending" if retry_at else "failed",
+        "last_error": error[:2000],
+        "locked_by": None,
+        "locked_at": None,
+    }
+    if retry_at:
+        payload["run_after"] = retry_at
+
+    try:
+        client.table("media_jobs").update(payload).eq("id", job.get("id")).execute()
+        return True
+    except Exception as exc:  # pragma: no cover
+        print(f"[Supabase] Erro ao registrar falha de job de mídia: {exc}")
+        return False
+
+
+def list_media_jobs(
+    client, story_ids: List[str], collection_id: Optional[str] = None, limit: int = 50
+) -> List[Dict[str, Any]]:
+    """Jobs de mídia mais recentes das histórias informadas e da capa da coleção, para o painel admin."""
+
+    columns = "id,kind,story_id,collection_id,status,attempts,max_attempts,last_error,created_at,updated_at"
+    try:
+        jobs: List[Dict[str, Any]] = []
+        if story_ids:
+            response = (
+                client.table("media_jobs")
+                .select(columns)
+                .in_("story_id", story_ids)
+                .order("created_at", desc=True)
+                .limit(limit)
                 .execute()
             )
-            for story in stories_response.data or []:
-                story_titles[story.get("id")] = story.get("title")
-
-        missing_collection_ids = {
-            row.get("collection_id")
-            for row in rows
-            if row.get("collection_id") and row.get("collection_id") not in collection_names
-        }
-        if missing_collection_ids:
-            collections_response = (
-                client.table("collections")
-                .select("id,name")
-                .in_("id", list(missing_collection_ids))
+            jobs.extend(response.data or [])
+        # Jobs de capa têm collection_id e nenhuma história
+        if collection_id:
+            response = (
+                client.table("media_jobs")
+                .select(columns)
+                .eq("collection_id", collection_id)
+                .is_("story_id", "null")
+                .order("created_at", desc=True)
+                .limit(limit)
                 .execute()
             )
-            for col in collections_response.data or []:
-                collection_names[col.get("id")] = col.get("name")
+            jobs.extend(response.data or [])
+        jobs.sort(key=lambda job: str(job.get("created_at") or ""), reverse=True)
+        return jobs[:limit]
+    except Exception as exc:  # pragma: no cover
+        print(f"[Supabase] Erro ao listar jobs de mídia: {exc}")
+        return []
 
-        formatted_rows: List[Dict[str, Any]] = []
-        for row in rows:
-            formatted_rows.append(
-                {
-                    "title": story_titles.get(row.get("story_id"), "—"),
-                    "collection_name": collection_names.get(row.get("collection_id"), "—"),
-                    "source": row.get("source"),
-                    "created_at": row.get("created_at"),
-                }
+
+def retry_failed_media_jobs(client, story_ids: List[str], collection_id: Optional[str] = None) -> int:
+    """Devolve para a fila os jobs falhos das histórias e da capa da coleção. Retorna quantos voltaram."""
+
+    payload = {
+        "status": "pending",
+        "attempts": 0,
+        "run_after": datetime.now(timezone.utc).isoformat(),
+    }
+    try:
+        retried = 0
+        if story_ids:
+            response = (
+                client.table("media_jobs")
+                .update(payload)
+                .in_("story_id", story_ids)
+                .eq("status", "failed")
+                .execute()
             )
+            retried += len(response.data or [])
+        if collection_id:
+            response = (
+                client.table("media_jobs")
+                .update(payload)
+                .eq("collection_id", collection_id)
+                .is_("story_id", "null")
+                .eq("status", "failed")
+                .execute()
+            )
+            retried += len(response.data or [])
+        return retried
+    except Exception as exc:  # pragma: no cover
+        print(f"[Supabase] Erro ao reprocessar jobs de mídia: {exc}")
+        return 0
+
+
+def swap_story_media(
+    client,
+    story_id: str,
+    field: str,
+    expected_url: Optional[str],
+    new_url: str,
+    duration_seconds: Optional[int] = None,
+    playlist_url: Optional[str] = None,
+) -> bool:
+    """Troca a URL de mídia pela versão processada, só se ela ainda for a URL enviada.
+
+    Evita que um job atrasado sobrescreva uma imagem ou áudio trocado depois pelo admin:
+    o original vai para um caminho único por conteúdo (``media_source_path`` no
+    app.py), então cada envio tem sua própria URL.
+    Para áudio, ``playlist_url`` grava junto a playlist HLS dos segmentos.
+    """
 
-        return formatted_rows
+    payload: Dict[str, Any] = {field: new_url}
+    if duration_seconds is not None:
+        payload["duration_seconds"] = duration_seconds
+    if playlist_url is not None:
+        payload["audio_playlist_url"] = playlist_url
+
+    try:
+        query = client.table("stories").update(payload).eq("id", story_id)
+        if expected_url is not None:
+            query = query.eq(field, expected_url)
+        response = query.execute()
+        return bool(response.data)
     except Exception as exc:  # pragma: no cover
-        print(f"[Supabase] Erro ao buscar histórico de leituras: {exc}")
-        return []
+        print(f"[Supabase] Erro ao trocar mídia processada da história: {exc}")
+        return False
 
 
-def get_read_count_by_story(client) -> List[Dict[str, Any]]:
-    """Retorna um ranking simples das histórias mais lidas."""
+def swap_collection_cover(
+    client, collection_id: str, expected_cover_url: Optional[str], thumb_url: str, placeholder: str
+) -> bool:
+    """Grava miniatura e placeholder da capa, só se a capa ainda for a que foi processada.
+
+    Como em ``swap_story_media``, cada capa enviada tem URL própria.
+    """
 
     try:
-        response = client.table("reading_log").select("story_id").execute()
-        rows = response.data or []
-        counts: Dict[str, int] = {}
-        for row in rows:
-            story_id = row.get("story_id")
-            if story_id:
-                counts[story_id] = counts.get(story_id, 0) + 1
+        query = (
+            client.table("collections")
+            .update({"cover_thumb_url": thumb_url, "cover_placeholder": placeholder})
+            .eq("id", collection_id)
+        )
+        if expected_cover_url is not None:
+            query = query.eq("cover_url", expected_cover_url)
+        response = query.execute()
+        return bool(response.data)
+    except Exception as exc:  # pragma: no cover
+        print(f"[Supabase] Erro ao gravar miniatura da capa: {exc}")
+        return False
+
+
+# Saúde dos links de mídia (ver media_health.py)
+
+def iter_story_media(client, family_id: Optional[str] = None, page_size: int = 1000) -> Iterator[Story]:
+    """Percorre todas as histórias (publicadas ou não) com os campos de mídia, em páginas por id.
 
-        if not counts:
-            return []
+    Erros interrompem a iteração (e são propagados): uma listagem incompleta não
+    pode servir de base para limpar os resultados das histórias que faltaram.
+    """
 
-        story_ids = list(counts.keys())
-        titles: Dict[str, str] = {}
-        stories_response = (
-            client.table("stories").select("id,title").in_("id", story_ids).execute()
+    last_id = None
+    while True:
+        query = _for_family(
+            client.table("stories").select("id,title,family_id,image_url,audio_url,audio_playlist_url"),
+            family_id,
         )
-        for story in stories_response.data or []:
-            titles[story.get("id")] = story.get("title")
+        if last_id:
+            query = query.gt("id", last_id)
+        rows = query.order("id").limit(page_size).execute().data or []
+        yield from rows
+        if len(rows) < page_size:
+            return
+        last_id = rows[-1]["id"]
 
-        ranking = [
-            {
-                "story_id": story_id,
-                "title": titles.get(story_id, "História"),
-                "read_count": count,
-            }
-            for story_id, count in counts.items()
-        ]
 
-        ranking.sort(key=lambda item: item.get("read_count", 0), reverse=True)
-        return ranking
+def save_media_health(client, rows: List[Dict[str, Any]], batch_size: int = 500) -> bool:
+    """Grava o resultado mais recente de cada link (uma linha por história e campo)."""
+
+    try:
+        for start in range(0, len(rows), batch_size):
+            client.table("media_health").upsert(
+                rows[start:start + batch_size], on_conflict="story_id,field"
+            ).execute()
+        return True
     except Exception as exc:  # pragma: no cover
-        print(f"[Supabase] Erro ao montar ranking de leituras: {exc}")
+        print(f"[Supabase] Erro ao gravar saúde dos links de mídia: {exc}")
+        return False
+
+
+def prune_media_health(client, checked_before: str, family_id: Optional[str] = None) -> bool:
+    """Remove resultados não conferidos na última varredura (links apagados ou trocados)."""
+
+    try:
+        query = client.table("media_health").delete().lt("checked_at", checked_before)
+        _for_family(query, family_id).execute()
+        return True
+    except Exception as exc:  # pragma: no cover
+        print(f"[Supabase] Erro ao limpar saúde dos links de mídia: {exc}")
+        return False
+
+
+def list_flagged_media(client, family_id: Optional[str] = None, limit: int = 200) -> List[Dict[str, Any]]:
+    """Links marcados como quebrados, grandes demais, lentos ou de tipo inesperado, com o título da história."""
+
+    try:
+        query = (
+            client.table("media_health")
+            .select("story_id,field,url,status,content_type,size_bytes,latency_ms,error,problem,checked_at")
+            .eq("flagged", True)
+        )
+        rows = _for_family(query, family_id).order("checked_at", desc=True).limit(limit).execute().data or []
+        story_ids = sorted({row["story_id"] for row in rows})
+        titles = {}
+        if story_ids:
+            response = client.table("stories").select("id,title").in_("id", story_ids).execute()
+            titles = {story["id"]: story.get("title") for story in response.data or []}
+        for row in rows:
+            row["title"] = titles.get(row["story_id"]) or "—"
+        return rows
+    except Exception as exc:  # pragma: no cover
+        print(f"[Supabase] Erro ao listar links de mídia com problema: {exc}")
         return []
@@ -0,0 +1,79 @@
+"""Artefatos derivados do texto das histórias, calculados ao salvar.
+
+O leitor usa estes campos prontos (parágrafos, contagem de palavras, tempo de
+leitura) em vez de reprocessar o texto a cada rerun do Streamlit.
+"""
+
+from typing import Any, Dict, List
+import hashlib
+import math
+import re
+
+
+# Ritmo médio de leitura em voz alta para crianças (palavras por minuto)
+WORDS_PER_MINUTE = 130
+
+_CONTROL_CHARS = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]")
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def normalize_body(body: str) -> str:
+    """Padroniza quebras de linha e remove caracteres de controle do texto."""
+
+    text = (body or "").replace("\r\n", "\n").replace("\r", "\n")
+    return _CONTROL_CHARS.sub("", text).strip()
+
+
+def split_paragraphs(body: str) -> List[str]:
+    """Divide o texto em parágrafos separados por linha em branco."""
+
+    text = normalize_body(body)
+    paragraphs = [
+        "\n".join(line.rstrip() for line in block.strip().split("\n"))
+        for block in text.split("\n\n")
+        if block.strip()
+    ]
+    return paragraphs or [text]
+
+
+def count_words(text: str) -> int:
+    """Conta palavras de forma simples, considerando acentos."""
+
+    return len(_WORD.findall(text or ""))
+
+
+def estimate_reading_seconds(word_count: int) -> int:
+    """Estima o tempo de leitura em segundos a partir do número de palavras."""
+
+    if word_count <= 0:
+        return 0
+    return int(math.ceil(word_count * 60 / WORDS_PER_MINUTE))
+
+
+def content_hash(body: str) -> str:
+    """Hash estável do texto normalizado, usado para detectar mudanças."""
+
+    return hashlib.sha256(normalize_body(body).encode("utf-8")).hexdigest()
+
+
+def build_story_artifacts(body: str) -> Dict[str, Any]:
+    """Calcula os campos derivados gravados junto com a história."""
+
+    paragraphs = split_paragraphs(body)
+    word_count = sum(count_words(p) for p in paragraphs)
+    return {
+        "paragraphs": paragraphs,
+        "paragraph_count": len(paragraphs),
+        "word_count": word_count,
+        "reading_time_seconds": estimate_reading_seconds(word_count),
+        "content_hash": content_hash(body),
+    }
+
+
+def format_reading_time(seconds) -> str:
+    """Texto amigável para o tempo de leitura (ex.: "Leitura de ~3 min")."""
+
+    if not seconds:
+        return ""
+    minutes = max(1, int(round(int(seconds) / 60)))
+    return f"Leitura de ~{minutes} min"
@@ -0,0 +1,107 @@
+"""Leitura paginada de histórias longas, com cache de páginas e pré-carregamento.
+
+Cada página é um intervalo de parágrafos buscado sob demanda. A próxima página
+é buscada em segundo plano enquanto a criança lê a atual, então o clique em
+"Próxima página" costuma ser atendido direto da memória.
+"""
+
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+import math
+import threading
+
+from models import StorySummary
+from stories_repository import get_story_body, get_story_paragraphs
+from story_artifacts import split_paragraphs
+
+
+PARAGRAPHS_PER_PAGE = 6
+MAX_CACHED_PAGES = 256
+
+_PageKey = Tuple[str, str, int]
+
+_pages: "OrderedDict[_PageKey, List[str]]" = OrderedDict()
+_pending: Dict[_PageKey, Future] = {}
+_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="story-prefetch")
+
+
+def page_count(story: StorySummary) -> int:
+    """Número de páginas da história; histórias sem contagem gravada usam uma página."""
+
+    total = story.paragraph_count or 0
+    return max(1, int(math.ceil(total / PARAGRAPHS_PER_PAGE)))
+
+
+def _page_key(story: StorySummary, page: int) -> _PageKey:
+    # O hash do conteúdo entra na chave para que uma edição gere páginas novas
+    return (story.id, story.content_hash or "", page)
+
+
+def _fetch_page(client, story: StorySummary, page: int, family_id: Optional[str]) -> List[str]:
+    story_id = story.id
+    if not story.paragraph_count:
+        # História sem artefatos gravados: divide o texto localmente e exibe tudo
+        return split_paragraphs(get_story_body(client, story_id, family_id) or "")
+
+    offset = page * PARAGRAPHS_PER_PAGE
+    return get_story_paragraphs(client, story_id, offset, PARAGRAPHS_PER_PAGE, family_id)
+
+
+def _remember(key: _PageKey, paragraphs: List[str]) -> None:
+    with _lock:
+        _pages[key] = paragraphs
+        _pages.move_to_end(key)
+        while len(_pages) > MAX_CACHED_PAGES:
+            _pages.popitem(last=False)
+
+
+def load_page(client, story: StorySummary, page: int, family_id: Optional[str] = None) -> List[str]:
+    """Retorna os parágrafos da página pedida, usando o cache ou o pré-carregamento.
+
+    Com ``family_id``, o banco só devolve o texto se a história for daquela família.
+    """
+
+    key = _page_key(story, page)
+    with _lock:
+        cached = _pages.get(key)
+        if cached is not None:
+            _pages.move_to_end(key)
+            return cached
+        pending: Optional[Future] = _pending.get(key)
+
+    if pending is not None:
+        try:
+            return pending.result()
+        except Exception as exc:  # pragma: no cover - segue para a busca direta
+            print(f"[Leitura] Falha no pré-carregamento da página: {exc}")
+
+    paragraphs = _fetch_page(client, story, page, family_id)
+    if paragraphs:
+        _remember(key, paragraphs)
+    return paragraphs
+
+
+def prefetch_page(client, story: StorySummary, page: int, family_id: Optional[str] = None) -> None:
+    """Agenda a busca de uma página em segundo plano, se ela ainda não estiver em memória."""
+
+    if page < 0 or page >= page_count(story):
+        return
+
+    key = _page_key(story, page)
+    with _lock:
+        if key in _pages or key in _pending:
+            return
+
+        def task() -> List[str]:
+            try:
+                paragraphs = _fetch_page(client, story, page, family_id)
+                if paragraphs:
+                    _remember(key, paragraphs)
+                return paragraphs
+            finally:
+                with _lock:
+                    _pending.pop(key, None)
+
+        _pending[key] = _executor.submit(task)
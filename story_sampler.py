@@ -0,0 +1,149 @@
+"""Sorteio da "História da noite" sem repetições recentes.
+
+O sorteador é montado uma vez por catálogo (O(n)) e cada sorteio custa O(1):
+
+- sem pesos, usa um baralho embaralhado: cada história sai uma vez antes de
+  o baralho ser refeito;
+- com pesos (ex.: histórias menos lidas aparecem mais), usa o método de alias
+  de Vose e descarta sorteios que caiam nas últimas noites.
+
+Nos dois casos nenhuma história se repete dentro das últimas ``no_repeat``
+noites (limitado a n - 1 quando o catálogo é pequeno).
+"""
+
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Sequence, Tuple
+import random
+
+
+DEFAULT_NO_REPEAT = 7
+MAX_REJECTIONS = 32
+
+
+def rarity_weights(story_ids: Sequence[str], read_counts: Dict[str, int]) -> List[float]:
+    """Peso maior para histórias menos lidas: 1 / (1 + leituras)."""
+
+    return [1.0 / (1 + max(0, int(read_counts.get(story_id, 0)))) for story_id in story_ids]
+
+
+def build_alias_table(weights: Sequence[float]) -> Tuple[List[float], List[int]]:
+    """Monta as tabelas de probabilidade e alias (método de Vose)."""
+
+    n = len(weights)
+    total = float(sum(weights))
+    if n == 0 or total <= 0:
+        return [1.0] * n, list(range(n))
+
+    scaled = [w * n / total for w in weights]
+    prob = [0.0] * n
+    alias = list(range(n))
+    small = [i for i, value in enumerate(scaled) if value < 1.0]
+    large = [i for i, value in enumerate(scaled) if value >= 1.0]
+
+    while small and large:
+        low = small.pop()
+        high = large.pop()
+        prob[low] = scaled[low]
+        alias[low] = high
+        scaled[high] = scaled[high] + scaled[low] - 1.0
+        if scaled[high] < 1.0:
+            small.append(high)
+        else:
+            large.append(high)
+
+    for index in large + small:
+        prob[index] = 1.0
+
+    return prob, alias
+
+
+class StorySampler:
+    """Sorteador de histórias guardado na sessão, com memória das últimas noites."""
+
+    __slots__ = ("story_ids", "signature", "window", "recent", "_rng", "_deck", "_prob", "_alias")
+
+    def __init__(
+        self,
+        story_ids: Sequence[str],
+        weights: Optional[Sequence[float]] = None,
+        no_repeat: int = DEFAULT_NO_REPEAT,
+        recent: Iterable[str] = (),
+        rng: Optional[random.Random] = None,
+    ) -> None:
+        self.story_ids: Tuple[str, ...] = tuple(story_ids)
+        self.signature = catalog_signature(self.story_ids)
+        self.window = max(0, min(int(no_repeat), len(self.story_ids) - 1))
+        self.recent: Deque[str] = deque(recent, maxlen=max(self.window, 1))
+        self._rng = rng or random.Random()
+        self._deck: List[str] = []
+        self._prob: Optional[List[float]] = None
+        self._alias: Optional[List[int]] = None
+
+        if weights is not None and len(weights) == len(self.story_ids):
+            self._prob, self._alias = build_alias_table(weights)
+
+    def _blocked(self) -> set:
+        if self.window == 0:
+            return set()
+        return set(list(self.recent)[-self.window:])
+
+    def _refill_deck(self) -> None:
+        deck = list(self.story_ids)
+        self._rng.shuffle(deck)
+        # O baralho é consumido do fim. Nas primeiras `window` cartas, cada uma não pode
+        # estar entre as histórias que ainda estarão na janela de noites recentes.
+        history = list(self.recent)[-self.window:] if self.window else []
+        for step in range(min(self.window, len(deck))):
+            blocked = set(history[step:])
+            position = len(deck) - 1 - step
+            if deck[position] not in blocked:
+                continue
+            candidates = [i for i in range(position) if deck[i] not in blocked]
+            if candidates:
+                swap = self._rng.choice(candidates)
+                deck[position], deck[swap] = deck[swap], deck[position]
+        self._deck = deck
+
+    def _draw_weighted(self, blocked: set) -> str:
+        n = len(self.story_ids)
+        for _ in range(MAX_REJECTIONS):
+            index = self._rng.randrange(n)
+            if self._rng.random() >= self._prob[index]:
+                index = self._alias[index]
+            if self.story_ids[index] not in blocked:
+                return self.story_ids[index]
+        # Pesos muito concentrados nas histórias recentes: sorteio uniforme entre as demais
+        allowed = [story_id for story_id in self.story_ids if story_id not in blocked]
+        return self._rng.choice(allowed or list(self.story_ids))
+
+    def draw(self) -> Optional[str]:
+        """Sorteia o id da próxima história e registra na memória de noites recentes."""
+
+        if not self.story_ids:
+            return None
+
+        blocked = self._blocked()
+        if self._prob is not None:
+            chosen = self._draw_weighted(blocked)
+        else:
+            while self._deck and self._deck[-1] in blocked:
+                # Pode acontecer após um sorteio manual registrado via remember()
+                self._deck.pop()
+            if not self._deck:
+                self._refill_deck()
+            chosen = self._deck.pop()
+
+        self.remember(chosen)
+        return chosen
+
+    def remember(self, story_id: str) -> None:
+        """Marca uma história como lida nesta noite (também usada para escolhas manuais)."""
+
+        if self.window:
+            self.recent.append(story_id)
+
+
+def catalog_signature(story_ids: Iterable[str]) -> int:
+    """Identidade do conjunto de histórias; muda quando o catálogo muda."""
+
+    return hash(frozenset(story_ids))
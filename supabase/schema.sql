@@ -27,9 +27,75 @@ CREATE TABLE IF NOT EXISTS stories (
     updated_at timestamptz DEFAULT now()
 );
 
--- Índices para consultas frequentes
-CREATE INDEX IF NOT EXISTS stories_collection_sort_idx ON stories (collection_id, sort_order);
-CREATE INDEX IF NOT EXISTS stories_published_idx ON stories (is_published);
+-- Famílias: cada família tem o próprio catálogo, histórico e (opcionalmente) PIN do leitor,
+-- todos na mesma base. O leitor escolhe a família pela URL (?family=slug); sem isso, vale a
+-- família padrão ('principal'), que recebe os dados de instalações anteriores.
+CREATE TABLE IF NOT EXISTS public.families (
+    id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+    slug text NOT NULL UNIQUE CHECK (slug ~ '^[a-z0-9][a-z0-9-]*$'),
+    name text NOT NULL,
+    reader_pin text, -- vazio: usa READER_PIN dos secrets
+    created_at timestamptz DEFAULT now()
+);
+
+INSERT INTO public.families (slug, name)
+VALUES ('principal', 'Família')
+ON CONFLICT (slug) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION public.default_family_id()
+RETURNS uuid AS $$
+    SELECT id FROM public.families WHERE slug = 'principal';
+$$ LANGUAGE sql STABLE;
+
+-- Linhas existentes recebem a família padrão ao criar a coluna
+ALTER TABLE collections ADD COLUMN IF NOT EXISTS family_id uuid NOT NULL
+    DEFAULT public.default_family_id() REFERENCES public.families(id) ON DELETE CASCADE;
+ALTER TABLE stories ADD COLUMN IF NOT EXISTS family_id uuid NOT NULL
+    DEFAULT public.default_family_id() REFERENCES public.families(id) ON DELETE CASCADE;
+
+-- A história é sempre da família da sua coleção
+CREATE OR REPLACE FUNCTION public.stories_inherit_family()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.collection_id IS NOT NULL THEN
+        SELECT family_id INTO NEW.family_id FROM public.collections WHERE id = NEW.collection_id;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_stories_inherit_family ON stories;
+CREATE TRIGGER trg_stories_inherit_family
+BEFORE INSERT OR UPDATE OF collection_id ON stories
+FOR EACH ROW
+EXECUTE FUNCTION public.stories_inherit_family();
+
+-- Índices no formato das consultas de stories_repository.py (filtro + ordenação), com a
+-- família na frente: cada família percorre só o próprio trecho do índice, e uma biblioteca
+-- grande não deixa as consultas das outras mais lentas. Os parciais guardam só as linhas que
+-- o leitor enxerga; tools/check_query_plans.py confere com EXPLAIN que cada consulta
+-- continua usando o índice esperado.
+-- Histórias publicadas de uma coleção, ordenadas (também atende o sorteio por coleção)
+CREATE INDEX IF NOT EXISTS stories_family_published_collection_sort_idx
+    ON stories (family_id, collection_id, sort_order, title) WHERE is_published;
+-- Todas as histórias publicadas da família, ordenadas (sorteio geral)
+CREATE INDEX IF NOT EXISTS stories_family_published_sort_idx
+    ON stories (family_id, sort_order, title) WHERE is_published;
+-- Lista do admin (publicadas ou não) e a chave estrangeira ao excluir uma coleção
+CREATE INDEX IF NOT EXISTS stories_collection_sort_title_idx
+    ON stories (collection_id, sort_order, title);
+-- Coleções ativas da família, ordenadas
+CREATE INDEX IF NOT EXISTS collections_family_active_sort_idx
+    ON collections (family_id, sort_order, name) WHERE is_active;
+-- Todas as coleções da família (admin)
+CREATE INDEX IF NOT EXISTS collections_family_sort_idx
+    ON collections (family_id, sort_order, name);
+-- Substituídos pelos índices acima (sem a família, ou um booleano sozinho, que não é seletivo)
+DROP INDEX IF EXISTS stories_collection_sort_idx;
+DROP INDEX IF EXISTS stories_published_idx;
+DROP INDEX IF EXISTS stories_published_collection_sort_idx;
+DROP INDEX IF EXISTS stories_published_sort_idx;
+DROP INDEX IF EXISTS collections_active_sort_idx;
 
 -- Função para atualizar automaticamente o campo updated_at em cada atualização
 CREATE OR REPLACE FUNCTION set_updated_at()
@@ -53,15 +119,684 @@ BEFORE UPDATE ON stories
 FOR EACH ROW
 EXECUTE FUNCTION set_updated_at();
 
--- Histórico de leitura: registra qual história foi aberta, de qual coleção e a origem
+-- Histórico de leitura: registra qual história foi aberta, de qual coleção e a origem.
+-- A tabela é particionada por mês (created_at) para que as consultas recentes leiam só
+-- partições novas; meses antigos são resumidos em reading_log_monthly pela retenção abaixo.
+
+-- Migração: se já existir uma reading_log comum (versão antiga, não particionada), ela é
+-- renomeada para reading_log_legacy e seus dados são copiados para a tabela nova mais abaixo.
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = 'public' AND c.relname = 'reading_log' AND c.relkind = 'r'
+    ) THEN
+        ALTER TABLE public.reading_log RENAME TO reading_log_legacy;
+        ALTER INDEX IF EXISTS public.idx_reading_log_created_at RENAME TO idx_reading_log_legacy_created_at;
+        ALTER INDEX IF EXISTS public.idx_reading_log_story_id RENAME TO idx_reading_log_legacy_story_id;
+    END IF;
+END;
+$$;
+
 CREATE TABLE IF NOT EXISTS public.reading_log (
-    id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+    id uuid NOT NULL DEFAULT gen_random_uuid(),
     story_id uuid REFERENCES public.stories(id) ON DELETE SET NULL,
     collection_id uuid REFERENCES public.collections(id) ON DELETE SET NULL,
     source text NOT NULL, -- 'random' (História da noite) ou 'manual' (escolha direta)
-    created_at timestamptz NOT NULL DEFAULT now()
-);
+    created_at timestamptz NOT NULL DEFAULT now(),
+    family_id uuid NOT NULL DEFAULT public.default_family_id() REFERENCES public.families(id) ON DELETE CASCADE,
+    PRIMARY KEY (id, created_at) -- a chave de partição precisa fazer parte da chave primária
+) PARTITION BY RANGE (created_at);
+
+ALTER TABLE public.reading_log ADD COLUMN IF NOT EXISTS family_id uuid NOT NULL
+    DEFAULT public.default_family_id() REFERENCES public.families(id) ON DELETE CASCADE;
+
+-- Partição padrão: recebe leituras de meses que ainda não têm partição própria
+CREATE TABLE IF NOT EXISTS public.reading_log_default PARTITION OF public.reading_log DEFAULT;
 
--- Índices para consultas recentes e ranking
-CREATE INDEX IF NOT EXISTS idx_reading_log_created_at ON public.reading_log (created_at DESC);
+-- Índice para o ranking (criado em todas as partições); os índices das consultas recentes,
+-- por família, ficam junto da view reading_history mais abaixo
 CREATE INDEX IF NOT EXISTS idx_reading_log_story_id ON public.reading_log (story_id);
+
+-- Resumo mensal das leituras de partições já arquivadas, por família: a história pode ter
+-- sido apagada depois, e a contagem continua sendo da família que a leu
+CREATE TABLE IF NOT EXISTS public.reading_log_monthly (
+    family_id uuid NOT NULL DEFAULT public.default_family_id() REFERENCES public.families(id) ON DELETE CASCADE,
+    month date NOT NULL, -- primeiro dia do mês
+    story_id uuid,
+    collection_id uuid,
+    source text NOT NULL,
+    read_count int NOT NULL,
+    CONSTRAINT reading_log_monthly_key UNIQUE NULLS NOT DISTINCT (family_id, month, story_id, collection_id, source)
+);
+
+-- Migração: resumos anteriores às famílias ficam com a família da história (ou a padrão)
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = 'public' AND table_name = 'reading_log_monthly' AND column_name = 'family_id'
+    ) THEN
+        ALTER TABLE public.reading_log_monthly ADD COLUMN family_id uuid NOT NULL
+            DEFAULT public.default_family_id() REFERENCES public.families(id) ON DELETE CASCADE;
+        UPDATE public.reading_log_monthly AS m
+        SET family_id = s.family_id
+        FROM public.stories AS s
+        WHERE s.id = m.story_id;
+        ALTER TABLE public.reading_log_monthly DROP CONSTRAINT IF EXISTS reading_log_monthly_key;
+        ALTER TABLE public.reading_log_monthly ADD CONSTRAINT reading_log_monthly_key
+            UNIQUE NULLS NOT DISTINCT (family_id, month, story_id, collection_id, source);
+    END IF;
+END;
+$$;
+
+CREATE INDEX IF NOT EXISTS idx_reading_log_monthly_story_id ON public.reading_log_monthly (story_id);
+
+-- Cria a partição de um mês (reading_log_AAAAMM), movendo para ela as linhas que
+-- tenham caído na partição padrão. Pode ser executada várias vezes sem efeito colateral.
+-- As funções de manutenção usam SECURITY DEFINER porque o app chama via chave anon e
+-- criar/remover partições exige ser dono da tabela.
+CREATE OR REPLACE FUNCTION public.ensure_reading_log_partition(p_month date)
+RETURNS void AS $$
+DECLARE
+    month_start date := date_trunc('month', p_month)::date;
+    month_end date := (date_trunc('month', p_month) + interval '1 month')::date;
+    partition_name text := 'reading_log_' || to_char(month_start, 'YYYYMM');
+BEGIN
+    IF to_regclass('public.' || partition_name) IS NOT NULL THEN
+        RETURN;
+    END IF;
+
+    CREATE TEMP TABLE IF NOT EXISTS reading_log_moving (LIKE public.reading_log) ON COMMIT DROP;
+    TRUNCATE reading_log_moving;
+
+    WITH moved AS (
+        DELETE FROM public.reading_log_default
+        WHERE created_at >= month_start AND created_at < month_end
+        RETURNING *
+    )
+    INSERT INTO reading_log_moving SELECT * FROM moved;
+
+    EXECUTE format(
+        'CREATE TABLE public.%I PARTITION OF public.reading_log FOR VALUES FROM (%L) TO (%L)',
+        partition_name, month_start, month_end
+    );
+
+    INSERT INTO public.reading_log SELECT * FROM reading_log_moving;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Garante partições do mês atual e dos próximos meses
+CREATE OR REPLACE FUNCTION public.ensure_reading_log_partitions(p_months_ahead int DEFAULT 2)
+RETURNS void AS $$
+BEGIN
+    FOR i IN 0..GREATEST(p_months_ahead, 0) LOOP
+        PERFORM public.ensure_reading_log_partition((date_trunc('month', now()) + make_interval(months => i))::date);
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Lista as partições mensais com a contagem de linhas (só da família, com p_family_id),
+-- para o painel de retenção
+DROP FUNCTION IF EXISTS public.reading_log_partitions();
+CREATE OR REPLACE FUNCTION public.reading_log_partitions(p_family_id uuid DEFAULT NULL)
+RETURNS TABLE (partition_name text, month date, row_count bigint) AS $$
+DECLARE
+    part record;
+BEGIN
+    FOR part IN
+        SELECT c.relname::text AS relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'public.reading_log'::regclass
+          AND c.relname ~ '^reading_log_[0-9]{6}$'
+        ORDER BY c.relname
+    LOOP
+        partition_name := part.relname;
+        month := to_date(right(part.relname, 6), 'YYYYMM');
+        EXECUTE format('SELECT count(*) FROM public.%I WHERE $1 IS NULL OR family_id = $1', part.relname)
+            INTO row_count USING p_family_id;
+        RETURN NEXT;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+-- Retenção: meses anteriores aos últimos p_keep_months viram linhas em reading_log_monthly
+-- e suas leituras detalhadas são removidas. Exporte os detalhes antes, se quiser guardá-los.
+-- Com p_family_id, só as leituras daquela família são resumidas; a partição do mês (que é
+-- de todas as famílias) só é removida quando fica vazia. Retorna quantos meses foram resumidos.
+DROP FUNCTION IF EXISTS public.apply_reading_log_retention(int);
+CREATE OR REPLACE FUNCTION public.apply_reading_log_retention(p_keep_months int, p_family_id uuid DEFAULT NULL)
+RETURNS int AS $$
+DECLARE
+    cutoff date := (date_trunc('month', now()) - make_interval(months => GREATEST(p_keep_months, 1) - 1))::date;
+    part record;
+    rolled int := 0;
+    remaining boolean;
+BEGIN
+    FOR part IN SELECT * FROM public.reading_log_partitions(p_family_id) WHERE month < cutoff LOOP
+        EXECUTE format(
+            'INSERT INTO public.reading_log_monthly (family_id, month, story_id, collection_id, source, read_count)
+             SELECT family_id, %L::date, story_id, collection_id, source, count(*)
+             FROM public.%I
+             WHERE $1 IS NULL OR family_id = $1
+             GROUP BY family_id, story_id, collection_id, source
+             ON CONFLICT ON CONSTRAINT reading_log_monthly_key
+             DO UPDATE SET read_count = reading_log_monthly.read_count + EXCLUDED.read_count',
+            part.month, part.partition_name
+        ) USING p_family_id;
+
+        IF p_family_id IS NOT NULL THEN
+            EXECUTE format('DELETE FROM public.%I WHERE family_id = $1', part.partition_name) USING p_family_id;
+            EXECUTE format('SELECT EXISTS (SELECT 1 FROM public.%I)', part.partition_name) INTO remaining;
+        ELSE
+            remaining := false;
+        END IF;
+        IF NOT remaining THEN
+            EXECUTE format('ALTER TABLE public.reading_log DETACH PARTITION public.%I', part.partition_name);
+            EXECUTE format('DROP TABLE public.%I', part.partition_name);
+        END IF;
+        IF part.row_count > 0 OR NOT remaining THEN
+            rolled := rolled + 1;
+        END IF;
+    END LOOP;
+
+    -- Linhas antigas que ficaram na partição padrão também são resumidas
+    INSERT INTO public.reading_log_monthly (family_id, month, story_id, collection_id, source, read_count)
+    SELECT family_id, date_trunc('month', created_at)::date, story_id, collection_id, source, count(*)
+    FROM public.reading_log_default
+    WHERE created_at < cutoff
+      AND (p_family_id IS NULL OR family_id = p_family_id)
+    GROUP BY family_id, 2, story_id, collection_id, source
+    ON CONFLICT ON CONSTRAINT reading_log_monthly_key
+    DO UPDATE SET read_count = reading_log_monthly.read_count + EXCLUDED.read_count;
+
+    DELETE FROM public.reading_log_default
+    WHERE created_at < cutoff
+      AND (p_family_id IS NULL OR family_id = p_family_id);
+
+    PERFORM public.ensure_reading_log_partitions();
+    RETURN rolled;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Ranking de leituras somando as partições recentes e os resumos mensais.
+-- Com p_family_id, só as leituras daquela família (também as de histórias já apagadas).
+DROP FUNCTION IF EXISTS public.get_read_counts_by_story();
+CREATE OR REPLACE FUNCTION public.get_read_counts_by_story(p_family_id uuid DEFAULT NULL)
+RETURNS TABLE (story_id uuid, title text, read_count bigint) AS $$
+    SELECT counts.story_id, s.title, sum(counts.read_count)::bigint AS read_count
+    FROM (
+        SELECT story_id, count(*) AS read_count
+        FROM public.reading_log
+        WHERE story_id IS NOT NULL
+          AND (p_family_id IS NULL OR family_id = p_family_id)
+        GROUP BY story_id
+        UNION ALL
+        SELECT story_id, sum(read_count) AS read_count
+        FROM public.reading_log_monthly
+        WHERE story_id IS NOT NULL
+          AND (p_family_id IS NULL OR family_id = p_family_id)
+        GROUP BY story_id
+    ) AS counts
+    -- LEFT JOIN: leituras de histórias removidas continuam no ranking (sem título)
+    LEFT JOIN public.stories AS s ON s.id = counts.story_id
+    GROUP BY counts.story_id, s.title
+    ORDER BY read_count DESC;
+$$ LANGUAGE sql STABLE;
+
+-- Partições iniciais e cópia dos dados da versão não particionada, quando existir
+SELECT public.ensure_reading_log_partitions();
+
+-- Os meses seguintes são criados pelo app (warmup.py, a cada poucas horas enquanto há
+-- visitas). Para não depender de visitas, agende também no banco com pg_cron (no Supabase:
+-- Database > Extensions > pg_cron) e rode uma vez:
+--
+--   SELECT cron.schedule(
+--       'reading-log-partitions', '0 3 * * *',
+--       'SELECT public.ensure_reading_log_partitions()'
+--   );
+
+DO $$
+BEGIN
+    IF to_regclass('public.reading_log_legacy') IS NOT NULL THEN
+        PERFORM public.ensure_reading_log_partition(m::date)
+        FROM generate_series(
+            (SELECT date_trunc('month', min(created_at)) FROM public.reading_log_legacy),
+            date_trunc('month', now()),
+            interval '1 month'
+        ) AS m;
+
+        INSERT INTO public.reading_log (id, story_id, collection_id, source, created_at)
+        SELECT id, story_id, collection_id, source, created_at
+        FROM public.reading_log_legacy;
+
+        DROP TABLE public.reading_log_legacy;
+    END IF;
+END;
+$$;
+
+-- Atualização em lote de histórias (ordem, publicação e coleção) em uma única chamada.
+-- Recebe um array JSON no formato [{"id": "...", "sort_order": 1, "is_published": true, "collection_id": "..."}];
+-- campos ausentes em cada item mantêm o valor atual. Com p_family_id, o lote inteiro é
+-- recusado se alguma história (ou coleção de destino) for de outra família.
+DROP FUNCTION IF EXISTS public.bulk_update_stories(jsonb);
+CREATE OR REPLACE FUNCTION public.bulk_update_stories(updates jsonb, p_family_id uuid DEFAULT NULL)
+RETURNS int AS $$
+DECLARE
+    affected int;
+BEGIN
+    IF p_family_id IS NOT NULL AND EXISTS (
+        SELECT 1
+        FROM jsonb_array_elements(updates) AS item
+        LEFT JOIN public.stories AS s ON s.id = (item->>'id')::uuid
+        LEFT JOIN public.collections AS c ON c.id = (item->>'collection_id')::uuid
+        WHERE s.family_id IS DISTINCT FROM p_family_id
+           OR (item->>'collection_id' IS NOT NULL AND c.family_id IS DISTINCT FROM p_family_id)
+    ) THEN
+        RAISE EXCEPTION 'bulk_update_stories: história ou coleção de outra família';
+    END IF;
+
+    UPDATE public.stories AS s
+    SET
+        sort_order = COALESCE((item->>'sort_order')::int, s.sort_order),
+        is_published = COALESCE((item->>'is_published')::boolean, s.is_published),
+        collection_id = CASE
+            WHEN item ? 'collection_id' THEN (item->>'collection_id')::uuid
+            ELSE s.collection_id
+        END
+    FROM jsonb_array_elements(updates) AS item
+    WHERE s.id = (item->>'id')::uuid;
+
+    GET DIAGNOSTICS affected = ROW_COUNT;
+    RETURN affected;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Artefatos pré-calculados ao salvar a história (ver story_artifacts.py).
+-- O leitor usa os parágrafos prontos e as listas mostram o tempo de leitura sem carregar o texto.
+ALTER TABLE public.stories ADD COLUMN IF NOT EXISTS paragraphs jsonb; -- array de parágrafos normalizados
+ALTER TABLE public.stories ADD COLUMN IF NOT EXISTS paragraph_count int;
+ALTER TABLE public.stories ADD COLUMN IF NOT EXISTS word_count int;
+ALTER TABLE public.stories ADD COLUMN IF NOT EXISTS reading_time_seconds int; -- estimativa de leitura em voz alta
+ALTER TABLE public.stories ADD COLUMN IF NOT EXISTS content_hash text; -- sha256 do texto normalizado
+-- Histórias antigas ainda sem artefatos (refresh_missing_story_artifacts)
+CREATE INDEX IF NOT EXISTS stories_missing_artifacts_idx ON public.stories (id) WHERE content_hash IS NULL;
+
+-- Leitura paginada: devolve apenas um intervalo de parágrafos de uma história publicada
+-- (com p_family_id, só se a história for daquela família)
+DROP FUNCTION IF EXISTS public.get_story_paragraphs(uuid, int, int);
+CREATE OR REPLACE FUNCTION public.get_story_paragraphs(
+    p_story_id uuid, p_offset int, p_limit int, p_family_id uuid DEFAULT NULL
+)
+RETURNS TABLE (paragraph_index int, paragraph text) AS $$
+    SELECT (t.ordinality - 1)::int, t.value
+    FROM public.stories AS s,
+         jsonb_array_elements_text(s.paragraphs) WITH ORDINALITY AS t(value, ordinality)
+    WHERE s.id = p_story_id
+      AND s.is_published = true
+      AND (p_family_id IS NULL OR s.family_id = p_family_id)
+    ORDER BY t.ordinality
+    OFFSET p_offset
+    LIMIT p_limit;
+$$ LANGUAGE sql STABLE;
+
+-- Fila de processamento de mídia (hash, redução de imagens, conversão de áudio).
+-- O admin apenas enfileira ao salvar; tools/media_worker.py processa os jobs fora da
+-- requisição. job_key é único: enfileirar o mesmo envio duas vezes não duplica o job.
+CREATE TABLE IF NOT EXISTS public.media_jobs (
+    id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+    job_key text NOT NULL UNIQUE,
+    kind text NOT NULL, -- 'image' ou 'audio'
+    story_id uuid REFERENCES public.stories(id) ON DELETE CASCADE,
+    payload jsonb NOT NULL DEFAULT '{}'::jsonb, -- bucket e caminho do arquivo enviado
+    status text NOT NULL DEFAULT 'pending'
+        CHECK (status IN ('pending', 'running', 'done', 'failed')),
+    attempts int NOT NULL DEFAULT 0,
+    max_attempts int NOT NULL DEFAULT 5,
+    last_error text,
+    result jsonb,
+    run_after timestamptz NOT NULL DEFAULT now(), -- próxima tentativa (espera crescente entre falhas)
+    locked_by text,
+    locked_at timestamptz,
+    created_at timestamptz DEFAULT now(),
+    updated_at timestamptz DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS media_jobs_ready_idx ON public.media_jobs (run_after) WHERE status = 'pending';
+CREATE INDEX IF NOT EXISTS media_jobs_story_idx ON public.media_jobs (story_id, created_at DESC);
+
+DROP TRIGGER IF EXISTS trg_media_jobs_updated_at ON public.media_jobs;
+CREATE TRIGGER trg_media_jobs_updated_at
+BEFORE UPDATE ON public.media_jobs
+FOR EACH ROW
+EXECUTE FUNCTION set_updated_at();
+
+-- Reserva até p_limit jobs prontos para um worker. FOR UPDATE SKIP LOCKED deixa vários
+-- workers buscarem ao mesmo tempo sem pegar o mesmo job; jobs "running" presos há mais de
+-- p_lock_timeout_seconds (worker que caiu) voltam a ser reservados. Se o job já gastou todas
+-- as tentativas (por exemplo, um arquivo que derruba o worker a cada vez), ele vira 'failed'
+-- em vez de ser reservado de novo para sempre.
+CREATE OR REPLACE FUNCTION public.claim_media_jobs(
+    p_worker text,
+    p_limit int DEFAULT 1,
+    p_lock_timeout_seconds int DEFAULT 900
+)
+RETURNS SETOF public.media_jobs AS $$
+    UPDATE public.media_jobs
+    SET status = 'failed',
+        last_error = coalesce(last_error || E'\n', '')
+            || 'Worker parou de responder em todas as tentativas (último: ' || coalesce(locked_by, '?') || ')',
+        locked_by = NULL,
+        locked_at = NULL
+    WHERE status = 'running'
+      AND locked_at < now() - make_interval(secs => p_lock_timeout_seconds)
+      AND attempts >= max_attempts;
+
+    UPDATE public.media_jobs AS j
+    SET status = 'running',
+        attempts = j.attempts + 1,
+        locked_by = p_worker,
+        locked_at = now()
+    WHERE j.id IN (
+        SELECT id
+        FROM public.media_jobs
+        WHERE (status = 'pending' AND run_after <= now())
+           OR (status = 'running'
+               AND locked_at < now() - make_interval(secs => p_lock_timeout_seconds)
+               AND attempts < max_attempts)
+        ORDER BY run_after
+        LIMIT p_limit
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING j.*;
+$$ LANGUAGE sql;
+
+-- Versões do catálogo para revalidação barata do cache do app (catalog_cache.py).
+-- Cada escopo guarda a versão da última alteração e começa pelo id da família:
+-- '<família>:collections' (lista de coleções), '<família>:stories' (qualquer história da
+-- família) e '<família>:<coleção>' (lista de histórias da coleção).
+-- O app lê só as linhas da sua família a cada rerun e busca de novo as listas cujo escopo mudou.
+CREATE SEQUENCE IF NOT EXISTS public.catalog_version_seq;
+
+CREATE TABLE IF NOT EXISTS public.catalog_versions (
+    scope text PRIMARY KEY,
+    version bigint NOT NULL,
+    updated_at timestamptz NOT NULL DEFAULT now()
+);
+
+-- Busca por prefixo (scope LIKE '<família>:%')
+CREATE INDEX IF NOT EXISTS catalog_versions_scope_prefix_idx
+    ON public.catalog_versions (scope text_pattern_ops);
+-- Escopos da versão sem famílias
+DELETE FROM public.catalog_versions WHERE scope NOT LIKE '%:%';
+
+-- Todos os escopos alterados no mesmo comando recebem a mesma versão nova
+CREATE OR REPLACE FUNCTION public.bump_catalog_versions(p_scopes text[])
+RETURNS void AS $$
+DECLARE
+    new_version bigint := nextval('public.catalog_version_seq');
+BEGIN
+    INSERT INTO public.catalog_versions (scope, version, updated_at)
+    SELECT DISTINCT scope, new_version, now()
+    FROM unnest(p_scopes) AS scope
+    WHERE scope IS NOT NULL
+    ON CONFLICT (scope) DO UPDATE
+        SET version = EXCLUDED.version,
+            updated_at = EXCLUDED.updated_at;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+CREATE OR REPLACE FUNCTION public.collections_bump_catalog_version()
+RETURNS TRIGGER AS $$
+DECLARE
+    scopes text[];
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        scopes := ARRAY(SELECT DISTINCT family_id || ':collections' FROM new_rows);
+    ELSIF TG_OP = 'DELETE' THEN
+        scopes := ARRAY(SELECT DISTINCT family_id || ':collections' FROM old_rows);
+    ELSE
+        scopes := ARRAY(
+            SELECT family_id || ':collections' FROM old_rows
+            UNION
+            SELECT family_id || ':collections' FROM new_rows
+        );
+    END IF;
+    PERFORM public.bump_catalog_versions(scopes);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Gatilho por comando (não por linha): uma atualização em lote gera uma única versão
+-- por coleção afetada. Em mudanças de coleção, a antiga e a nova são marcadas.
+CREATE OR REPLACE FUNCTION public.stories_bump_catalog_version()
+RETURNS TRIGGER AS $$
+DECLARE
+    scopes text[];
+BEGIN
+    -- Para cada família afetada: '<família>:stories' e '<família>:<coleção>'
+    IF TG_OP = 'INSERT' THEN
+        scopes := ARRAY(
+            SELECT family_id || ':' || scope
+            FROM new_rows, LATERAL (VALUES ('stories'), (collection_id::text)) AS t(scope)
+        );
+    ELSIF TG_OP = 'DELETE' THEN
+        scopes := ARRAY(
+            SELECT family_id || ':' || scope
+            FROM old_rows, LATERAL (VALUES ('stories'), (collection_id::text)) AS t(scope)
+        );
+    ELSE
+        scopes := ARRAY(
+            SELECT family_id || ':' || scope
+            FROM old_rows, LATERAL (VALUES ('stories'), (collection_id::text)) AS t(scope)
+            UNION
+            SELECT family_id || ':' || scope
+            FROM new_rows, LATERAL (VALUES ('stories'), (collection_id::text)) AS t(scope)
+        );
+    END IF;
+    PERFORM public.bump_catalog_versions(scopes);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Tabelas de transição só podem ser usadas com um evento por gatilho
+DROP TRIGGER IF EXISTS trg_collections_catalog_version ON public.collections;
+DROP TRIGGER IF EXISTS trg_collections_catalog_version_insert ON public.collections;
+CREATE TRIGGER trg_collections_catalog_version_insert
+AFTER INSERT ON public.collections
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT
+EXECUTE FUNCTION public.collections_bump_catalog_version();
+
+DROP TRIGGER IF EXISTS trg_collections_catalog_version_update ON public.collections;
+CREATE TRIGGER trg_collections_catalog_version_update
+AFTER UPDATE ON public.collections
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT
+EXECUTE FUNCTION public.collections_bump_catalog_version();
+
+DROP TRIGGER IF EXISTS trg_collections_catalog_version_delete ON public.collections;
+CREATE TRIGGER trg_collections_catalog_version_delete
+AFTER DELETE ON public.collections
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT
+EXECUTE FUNCTION public.collections_bump_catalog_version();
+
+DROP TRIGGER IF EXISTS trg_stories_catalog_version_insert ON public.stories;
+CREATE TRIGGER trg_stories_catalog_version_insert
+AFTER INSERT ON public.stories
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT
+EXECUTE FUNCTION public.stories_bump_catalog_version();
+
+DROP TRIGGER IF EXISTS trg_stories_catalog_version_update ON public.stories;
+CREATE TRIGGER trg_stories_catalog_version_update
+AFTER UPDATE ON public.stories
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT
+EXECUTE FUNCTION public.stories_bump_catalog_version();
+
+DROP TRIGGER IF EXISTS trg_stories_catalog_version_delete ON public.stories;
+CREATE TRIGGER trg_stories_catalog_version_delete
+AFTER DELETE ON public.stories
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT
+EXECUTE FUNCTION public.stories_bump_catalog_version();
+
+-- Capas das coleções. O admin envia a imagem original (cover_url); o worker de mídia gera
+-- uma miniatura pequena (cover_thumb_url) e um placeholder de poucos bytes (cover_placeholder,
+-- JPEG minúsculo em data URI) exibido enquanto a miniatura carrega.
+ALTER TABLE public.collections ADD COLUMN IF NOT EXISTS cover_url text;
+ALTER TABLE public.collections ADD COLUMN IF NOT EXISTS cover_thumb_url text;
+ALTER TABLE public.collections ADD COLUMN IF NOT EXISTS cover_placeholder text;
+
+-- Jobs de capa pertencem a uma coleção, não a uma história
+ALTER TABLE public.media_jobs
+    ADD COLUMN IF NOT EXISTS collection_id uuid REFERENCES public.collections(id) ON DELETE CASCADE;
+
+-- Histórico de leitura já com o título da história e o nome da coleção (sem consultas extras)
+CREATE OR REPLACE VIEW public.reading_history AS
+SELECT
+    r.id,
+    r.created_at,
+    r.story_id,
+    r.collection_id,
+    r.source,
+    s.title,
+    c.name AS collection_name,
+    r.family_id
+FROM public.reading_log AS r
+LEFT JOIN public.stories AS s ON s.id = r.story_id
+LEFT JOIN public.collections AS c ON c.id = r.collection_id;
+
+-- Paginação por chave (created_at, id): cada página continua de onde a anterior parou,
+-- usando o índice, em vez de OFFSET (que relê as linhas já mostradas).
+-- A família vem na frente: cada família só percorre as próprias leituras.
+CREATE INDEX IF NOT EXISTS idx_reading_log_family_created_at_id
+    ON public.reading_log (family_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_reading_log_family_collection_created_at
+    ON public.reading_log (family_id, collection_id, created_at DESC, id DESC);
+-- Sem família: o arquivamento do mês e a exportação de todas as famílias
+-- (export_reading_history sem p_family_id) percorrem a partição em ordem por este índice
+CREATE INDEX IF NOT EXISTS idx_reading_log_created_at_id
+    ON public.reading_log (created_at DESC, id DESC);
+-- Cobertos pelos índices acima
+DROP INDEX IF EXISTS public.idx_reading_log_created_at;
+DROP INDEX IF EXISTS public.idx_reading_log_collection_created_at;
+
+-- Leituras mais recentes com filtros opcionais (família, período, coleção, origem).
+-- Para a próxima página, passe created_at e id da última linha recebida.
+-- Função SQL simples: o Postgres a expande na consulta e descarta os filtros nulos.
+-- Versão sem p_family_id removida para não deixar duas assinaturas ambíguas
+DROP FUNCTION IF EXISTS public.get_reading_history(int, timestamptz, uuid, timestamptz, timestamptz, uuid, text);
+CREATE OR REPLACE FUNCTION public.get_reading_history(
+    p_limit int DEFAULT 20,
+    p_before_created_at timestamptz DEFAULT NULL,
+    p_before_id uuid DEFAULT NULL,
+    p_from timestamptz DEFAULT NULL,
+    p_to timestamptz DEFAULT NULL,
+    p_collection_id uuid DEFAULT NULL,
+    p_source text DEFAULT NULL,
+    p_family_id uuid DEFAULT NULL
+)
+RETURNS SETOF public.reading_history AS $$
+    SELECT h.*
+    FROM public.reading_history AS h
+    WHERE (p_before_created_at IS NULL
+           OR (h.created_at, h.id) < (p_before_created_at, p_before_id))
+      AND (p_from IS NULL OR h.created_at >= p_from)
+      AND (p_to IS NULL OR h.created_at < p_to)
+      AND (p_collection_id IS NULL OR h.collection_id = p_collection_id)
+      AND (p_source IS NULL OR h.source = p_source)
+      AND (p_family_id IS NULL OR h.family_id = p_family_id)
+    ORDER BY h.created_at DESC, h.id DESC
+    LIMIT p_limit;
+$$ LANGUAGE sql STABLE;
+
+-- Exportação completa do histórico (arquivo do mês, CSV/Parquet no admin, tools/export_reading_log.py):
+-- mesma view e filtros, em ordem crescente, continuando depois da última linha recebida.
+-- Cada página custa o mesmo, do começo ao fim do histórico.
+DROP FUNCTION IF EXISTS public.export_reading_history(int, timestamptz, uuid, timestamptz, timestamptz, uuid, text);
+CREATE OR REPLACE FUNCTION public.export_reading_history(
+    p_limit int DEFAULT 1000,
+    p_after_created_at timestamptz DEFAULT NULL,
+    p_after_id uuid DEFAULT NULL,
+    p_from timestamptz DEFAULT NULL,
+    p_to timestamptz DEFAULT NULL,
+    p_collection_id uuid DEFAULT NULL,
+    p_source text DEFAULT NULL,
+    p_family_id uuid DEFAULT NULL
+)
+RETURNS SETOF public.reading_history AS $$
+    SELECT h.*
+    FROM public.reading_history AS h
+    WHERE (p_after_created_at IS NULL
+           OR (h.created_at, h.id) > (p_after_created_at, p_after_id))
+      AND (p_from IS NULL OR h.created_at >= p_from)
+      AND (p_to IS NULL OR h.created_at < p_to)
+      AND (p_collection_id IS NULL OR h.collection_id = p_collection_id)
+      AND (p_source IS NULL OR h.source = p_source)
+      AND (p_family_id IS NULL OR h.family_id = p_family_id)
+    ORDER BY h.created_at, h.id
+    LIMIT p_limit;
+$$ LANGUAGE sql STABLE;
+
+-- Áudio em segmentos (HLS): o worker de mídia corta a narração convertida em trechos de
+-- poucos segundos e grava a playlist em audio_playlist_url. O leitor começa a tocar pelo
+-- primeiro trecho, então o tempo até o som não depende da duração da história.
+ALTER TABLE public.stories ADD COLUMN IF NOT EXISTS audio_playlist_url text;
+
+-- Trocar o áudio por fora do worker (URL editada no admin, novo envio) invalida a playlist
+-- antiga; o worker grava os dois campos juntos e por isso a mantém.
+CREATE OR REPLACE FUNCTION public.stories_clear_stale_playlist()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.audio_url IS DISTINCT FROM OLD.audio_url
+       AND NEW.audio_playlist_url IS NOT DISTINCT FROM OLD.audio_playlist_url THEN
+        NEW.audio_playlist_url := NULL;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_stories_clear_stale_playlist ON public.stories;
+CREATE TRIGGER trg_stories_clear_stale_playlist
+BEFORE UPDATE OF audio_url ON public.stories
+FOR EACH ROW
+EXECUTE FUNCTION public.stories_clear_stale_playlist();
+
+-- Leituras idempotentes: o app gera o id e o horário de cada abertura de história e grava
+-- com ON CONFLICT (id, created_at) DO NOTHING. A chave primária (id, created_at) já é a
+-- restrição única do evento, em todas as partições; repetir o envio não duplica a leitura.
+COMMENT ON COLUMN public.reading_log.id IS
+    'Id do evento de leitura, gerado pelo app a cada abertura; com created_at, torna o registro idempotente.';
+
+-- Saúde dos links de mídia: image_url e audio_url são texto livre no admin, então um link
+-- quebrado ou um arquivo enorme só apareceria na hora de dormir. media_health.py confere
+-- todos os links (HEAD ou GET de 1 byte, várias URLs em paralelo) e grava aqui o resultado
+-- mais recente de cada campo de cada história; o admin lista só as linhas marcadas.
+CREATE TABLE IF NOT EXISTS public.media_health (
+    story_id uuid NOT NULL REFERENCES public.stories(id) ON DELETE CASCADE,
+    field text NOT NULL CHECK (field IN ('image_url', 'audio_url', 'audio_playlist_url')),
+    family_id uuid NOT NULL REFERENCES public.families(id) ON DELETE CASCADE,
+    url text NOT NULL,
+    status int, -- código HTTP; vazio quando a conexão falhou
+    content_type text,
+    size_bytes bigint,
+    latency_ms int,
+    error text,
+    flagged boolean NOT NULL DEFAULT false, -- quebrado, grande demais ou de tipo inesperado
+    problem text, -- motivo exibido no admin quando flagged
+    checked_at timestamptz NOT NULL DEFAULT now(),
+    PRIMARY KEY (story_id, field)
+);
+
+-- Lista do admin: só os links com problema, da família, mais recentes primeiro
+CREATE INDEX IF NOT EXISTS media_health_family_flagged_idx
+    ON public.media_health (family_id, checked_at DESC) WHERE flagged;
+-- Limpeza dos links que não existem mais depois de uma varredura completa
+CREATE INDEX IF NOT EXISTS media_health_family_checked_idx
+    ON public.media_health (family_id, checked_at);
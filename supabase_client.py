@@ -1,19 +1,25 @@
 """Cliente Supabase com leitura via secrets do Streamlit Cloud."""
 
+import os
+import threading
+
 import streamlit as st
 
+from boot_metrics import measure
 
-@st.cache_resource
-def get_supabase_client():
-    """Cria e reutiliza o cliente Supabase se as secrets estiverem configuradas.
 
-    Retorna None quando as chaves não existem ou quando a biblioteca não está
-    disponível, permitindo que o app continue funcionando sem integração.
-    """
+_client = None
+_client_ready = False
+_client_lock = threading.Lock()
+
+
+def _create_supabase_client():
+    """Importa o pacote supabase (import pesado, feito só aqui) e cria o cliente."""
 
     # Tenta importar o cliente do pacote supabase; se não existir, seguimos sem erro.
     try:
-        from supabase import create_client
+        with measure("import supabase"):
+            from supabase import create_client
     except Exception:
         return None
 
@@ -25,7 +31,50 @@ def get_supabase_client():
         return None
 
     try:
-        return create_client(supabase_url, supabase_key)
+        with measure("criar cliente Supabase"):
+            return create_client(supabase_url, supabase_key)
     except Exception:
         # Qualquer falha de criação retorna None para não interromper o app.
         return None
+
+
+def get_supabase_client():
+    """Cria e reutiliza o cliente Supabase se as secrets estiverem configuradas.
+
+    O cliente é único por processo e pode ser criado tanto pelo aquecimento em
+    segundo plano (warmup.py) quanto pelo primeiro rerun; quem chegar depois
+    espera a criação em andamento em vez de repetir o import.
+
+    Retorna None quando as chaves não existem ou quando a biblioteca não está
+    disponível, permitindo que o app continue funcionando sem integração.
+    """
+
+    global _client, _client_ready
+
+    if _client_ready:
+        return _client
+
+    with _client_lock:
+        if not _client_ready:
+            _client = _create_supabase_client()
+            _client_ready = True
+    return _client
+
+
+def create_client_from_environment():
+    """Cliente para scripts fora do Streamlit (tools/): usa SUPABASE_URL e SUPABASE_ANON_KEY
+    do ambiente e, sem elas, os secrets do Streamlit (.streamlit/secrets.toml).
+    """
+
+    supabase_url = os.environ.get("SUPABASE_URL")
+    supabase_key = os.environ.get("SUPABASE_ANON_KEY")
+    if not supabase_url or not supabase_key:
+        return get_supabase_client()
+
+    try:
+        from supabase import create_client
+
+        return create_client(supabase_url, supabase_key)
+    except Exception as exc:
+        print(f"[Supabase] Erro ao criar cliente a partir do ambiente: {exc}")
+        return None
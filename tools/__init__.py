@@ -0,0 +1 @@
+"""Ferramentas de apoio (teste de carga, exportações e manutenção), executadas com ``python -m tools.<nome>``."""
@@ -0,0 +1,83 @@
+"""Confere os links de imagem e áudio de todas as histórias (ver media_health.py).
+
+Cada link é conferido com HEAD (ou GET do primeiro byte), vários ao mesmo tempo,
+e o resultado vai para a tabela ``media_health``; os links quebrados, grandes
+demais, lentos ou de tipo inesperado aparecem no painel admin e são listados aqui.
+
+Uso (na raiz do repositório, com SUPABASE_URL e SUPABASE_ANON_KEY no ambiente ou
+em ``.streamlit/secrets.toml``):
+
+    python -m tools.check_media_links
+    python -m tools.check_media_links --family silva --workers 32
+    python -m tools.check_media_links --fake    # catálogo falso e servidor HTTP local, sem rede
+
+Sai com código 1 se algum link estiver marcado (útil em tarefas agendadas).
+"""
+
+import argparse
+import sys
+
+from media_health import MEDIA_FIELD_LABELS, MEDIA_HEALTH_TIMEOUT_SECONDS, MEDIA_HEALTH_WORKERS, run_media_health_scan
+from stories_repository import get_family_by_slug, list_flagged_media
+from supabase_client import create_client_from_environment
+
+
+# Imagens do catálogo falso: a maioria funciona; as primeiras de cada 20 simulam problemas
+FAKE_IMAGE_PATHS = ["html/{n}.jpg", "sumiu/{n}.jpg", "lento/{n}.jpg", "sem-head/{n}.jpg"]
+
+
+def _fake_client(stories: int):
+    from tools.fake_media_server import start_fake_media_server
+    from tools.fake_supabase import FakeSupabase, seed_catalog
+
+    client = FakeSupabase(latency_ms=0, jitter_ms=0)
+    seed_catalog(client, collections=max(1, stories // 50), stories_per_collection=min(50, stories), paragraphs_per_story=1)
+    _, base_url = start_fake_media_server()
+    for index, story in enumerate(client.tables["stories"]):
+        kind = index % 20
+        image_path = FAKE_IMAGE_PATHS[kind] if kind < len(FAKE_IMAGE_PATHS) else "ok/{n}.jpg"
+        story["image_url"] = f"{base_url}/{image_path.format(n=index)}"
+        story["audio_url"] = f"{base_url}/{'grande' if index % 25 == 0 else 'ok'}/{index}.mp3"
+    return client
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--family", help="slug da família (padrão: todas)")
+    parser.add_argument("--workers", type=int, default=MEDIA_HEALTH_WORKERS, help="links conferidos ao mesmo tempo")
+    parser.add_argument("--timeout", type=float, default=MEDIA_HEALTH_TIMEOUT_SECONDS, help="espera máxima por link (s)")
+    parser.add_argument("--fake", action="store_true", help="usa um catálogo falso e um servidor HTTP local")
+    parser.add_argument("--fake-stories", type=int, default=200, help="histórias do catálogo falso")
+    args = parser.parse_args()
+
+    client = _fake_client(args.fake_stories) if args.fake else create_client_from_environment()
+    if client is None:
+        print("Supabase não configurado. Defina SUPABASE_URL e SUPABASE_ANON_KEY.")
+        sys.exit(1)
+
+    family_id = None
+    if args.family:
+        family = get_family_by_slug(client, args.family)
+        if family is None:
+            print(f"Família não encontrada: {args.family}")
+            sys.exit(1)
+        family_id = family["id"]
+
+    summary = run_media_health_scan(client, family_id, workers=max(1, args.workers), timeout=args.timeout)
+    print(
+        f"Links conferidos: {summary['links']} ({summary['urls']} endereço(s) diferentes)"
+        f"  Com problema: {summary['flagged']}  Tempo: {summary['seconds']} s"
+    )
+    if not summary["saved"]:
+        print(f"A verificação falhou: {summary['error']}.")
+        sys.exit(1)
+
+    flagged = list_flagged_media(client, family_id, limit=1000)
+    for row in flagged:
+        print(f"- {row['title']} ({MEDIA_FIELD_LABELS.get(row['field'], row['field'])}): {row['problem']}  {row['url']}")
+    if flagged:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,396 @@
+"""Confere com EXPLAIN se as consultas do app continuam usando os índices certos.
+
+Carrega ``supabase/schema.sql`` num Postgres local (use um banco descartável),
+insere um volume de dados parecido com o de produção (várias famílias dividindo
+as mesmas tabelas), roda ``ANALYZE`` e, para
+cada consulta de stories_repository.py (reescrita em SQL, como o PostgREST a
+executa), verifica no plano:
+
+- que o índice esperado aparece (em tabelas particionadas vale o índice de
+  qualquer partição criado a partir dele);
+- que não há leitura sequencial da tabela;
+- quando a consulta tem ORDER BY, que a ordem vem do índice (sem nó Sort).
+
+Tabelas pequenas por natureza (coleções, versões do catálogo) são verificadas com
+``enable_seqscan = off``: ali o Postgres prefere ler a tabela inteira, o que
+está certo, e o que interessa é o índice continuar servindo à consulta.
+
+Requer psycopg (3) ou psycopg2. Uso (na raiz do repositório):
+
+    createdb contador_plans
+    python -m tools.check_query_plans --dsn postgresql://localhost/contador_plans
+    python -m tools.check_query_plans --dsn ... --skip-schema --skip-seed   # só os planos
+
+Sai com código 1 se alguma consulta deixar de usar o índice esperado; rode
+depois de mudar o schema.
+
+As expectativas de ``QUERY_SHAPES`` são as observadas no PostgreSQL 16 com o
+volume padrão abaixo; com outro volume ou versão, confira o plano antes de mudar
+o índice (``EXPLAIN`` da consulta que falhou).
+"""
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Tuple
+import argparse
+import json
+import os
+import sys
+
+
+SCHEMA_PATH = Path(__file__).resolve().parent.parent / "supabase" / "schema.sql"
+
+
+@dataclass(frozen=True)
+class QueryShape:
+    name: str
+    sql: str
+    index: str
+    table: str
+    ordered: bool = False
+    small_table: bool = False
+    # Outros índices que atendem a consulta igualmente bem (ex.: dependendo da collation)
+    alternatives: Tuple[str, ...] = ()
+
+
+# Parâmetros: %(family_id)s, %(collection_id)s, %(story_id)s e %(reading_id)s vêm dos dados inseridos.
+# ``ordered`` só vale para listas longas (com LIMIT ou paginadas): nas listas de uma
+# família ou coleção (dezenas a centenas de linhas) o Postgres 16 prefere, com razão,
+# ler pelo índice (bitmap) e ordenar em memória, e isso não é falha.
+# O PostgREST do Supabase limita as respostas a 1000 linhas (max-rows), daí o LIMIT.
+QUERY_SHAPES: List[QueryShape] = [
+    QueryShape(
+        "get_active_collections",
+        "SELECT id, name, description, sort_order, cover_url, cover_thumb_url, cover_placeholder "
+        "FROM public.collections WHERE is_active = true AND family_id = %(family_id)s "
+        "ORDER BY sort_order, name",
+        index="collections_family_active_sort_idx",
+        table="collections",
+        small_table=True,
+    ),
+    QueryShape(
+        "get_published_stories_by_collection",
+        "SELECT id, title, image_url, audio_url, duration_seconds, sort_order, collection_id, "
+        "word_count, reading_time_seconds, paragraph_count, content_hash, updated_at "
+        "FROM public.stories WHERE is_published = true AND family_id = %(family_id)s "
+        "AND collection_id = %(collection_id)s ORDER BY sort_order, title",
+        index="stories_family_published_collection_sort_idx",
+        table="stories",
+    ),
+    QueryShape(
+        "get_random_published_story (coleção)",
+        "SELECT id, title, body, paragraphs, image_url, audio_url, duration_seconds, sort_order, "
+        "collection_id, word_count, reading_time_seconds "
+        "FROM public.stories WHERE is_published = true AND family_id = %(family_id)s "
+        "AND collection_id = %(collection_id)s",
+        index="stories_family_published_collection_sort_idx",
+        table="stories",
+    ),
+    QueryShape(
+        "get_all_published_stories",
+        "SELECT id, title, image_url, audio_url, duration_seconds, sort_order, collection_id, "
+        "word_count, reading_time_seconds, paragraph_count, content_hash "
+        "FROM public.stories WHERE is_published = true AND family_id = %(family_id)s "
+        "ORDER BY sort_order, title LIMIT 1000",
+        index="stories_family_published_sort_idx",
+        table="stories",
+        ordered=True,
+    ),
+    QueryShape(
+        "get_published_story",
+        "SELECT id, title, image_url, audio_url, duration_seconds, sort_order, collection_id, "
+        "word_count, reading_time_seconds, paragraph_count, content_hash "
+        "FROM public.stories WHERE id = %(story_id)s AND is_published = true "
+        "AND family_id = %(family_id)s LIMIT 1",
+        index="stories_pkey",
+        table="stories",
+    ),
+    QueryShape(
+        "get_story_paragraphs",
+        "SELECT * FROM public.get_story_paragraphs(%(story_id)s, 0, 8, %(family_id)s)",
+        index="stories_pkey",
+        table="stories",
+    ),
+    QueryShape(
+        "get_catalog_versions",
+        "SELECT scope, version FROM public.catalog_versions WHERE scope LIKE %(scope_prefix)s",
+        index="catalog_versions_scope_prefix_idx",
+        # Com collation C (Postgres local), a chave primária já atende o LIKE por prefixo;
+        # com en_US (padrão do Supabase), só o índice text_pattern_ops atende
+        alternatives=("catalog_versions_pkey",),
+        table="catalog_versions",
+        small_table=True,
+    ),
+    QueryShape(
+        "list_collections_for_admin",
+        "SELECT id, name, description, sort_order, is_active, cover_url, created_at, updated_at "
+        "FROM public.collections WHERE family_id = %(family_id)s ORDER BY sort_order, name",
+        index="collections_family_sort_idx",
+        table="collections",
+        small_table=True,
+    ),
+    QueryShape(
+        "list_stories_for_collection_admin",
+        "SELECT id, title, is_published, sort_order, collection_id, updated_at "
+        "FROM public.stories WHERE family_id = %(family_id)s AND collection_id = %(collection_id)s "
+        "ORDER BY sort_order, title",
+        index="stories_collection_sort_title_idx",
+        table="stories",
+    ),
+    QueryShape(
+        "refresh_missing_story_artifacts",
+        "SELECT id, body FROM public.stories WHERE family_id = %(family_id)s AND content_hash IS NULL",
+        index="stories_missing_artifacts_idx",
+        table="stories",
+    ),
+    QueryShape(
+        "get_recent_reads",
+        "SELECT * FROM public.get_reading_history(20, p_family_id => %(family_id)s)",
+        index="idx_reading_log_family_created_at_id",
+        table="reading_log",
+        ordered=True,
+    ),
+    QueryShape(
+        "get_recent_reads (próxima página)",
+        "SELECT * FROM public.get_reading_history("
+        "20, %(reading_created_at)s, %(reading_id)s, p_family_id => %(family_id)s)",
+        index="idx_reading_log_family_created_at_id",
+        table="reading_log",
+        ordered=True,
+    ),
+    QueryShape(
+        "get_recent_reads (coleção)",
+        "SELECT * FROM public.get_reading_history("
+        "20, p_collection_id => %(collection_id)s, p_family_id => %(family_id)s)",
+        index="idx_reading_log_family_collection_created_at",
+        table="reading_log",
+        ordered=True,
+    ),
+    QueryShape(
+        "export_reading_log (todas as famílias)",
+        "SELECT * FROM public.export_reading_history("
+        "1000, p_from => date_trunc('month', now()) - interval '1 month', p_to => date_trunc('month', now()))",
+        index="idx_reading_log_created_at_id",
+        table="reading_log",
+        ordered=True,
+    ),
+]
+
+
+SEED_STATEMENTS = [
+    """
+INSERT INTO public.families (slug, name)
+SELECT 'familia-' || n, 'Família ' || n
+FROM generate_series(1, %(families)s) AS n
+ON CONFLICT (slug) DO NOTHING
+""",
+    """
+INSERT INTO public.collections (family_id, name, description, sort_order, is_active)
+SELECT f.ids[1 + n %% array_length(f.ids, 1)], 'Coleção ' || n, 'Descrição da coleção ' || n, n %% 20, n %% 7 <> 0
+FROM generate_series(1, %(collections)s) AS n,
+     (SELECT array_agg(id ORDER BY slug) AS ids FROM public.families) AS f
+""",
+    """
+INSERT INTO public.stories (
+    collection_id, title, body, is_published, sort_order, paragraphs, paragraph_count,
+    word_count, reading_time_seconds, content_hash
+)
+SELECT
+    c.id,
+    'História ' || c.sort_order || '-' || n,
+    repeat('Era uma vez uma história de ninar. ', 40),
+    n %% 6 <> 0,
+    n %% 50,
+    jsonb_build_array('Era uma vez.', 'E foram felizes.'),
+    2,
+    280,
+    120,
+    CASE WHEN n %% 500 = 0 THEN NULL ELSE md5(c.id::text || n) END
+FROM public.collections AS c,
+     generate_series(1, %(stories_per_collection)s) AS n
+""",
+    """
+SELECT public.ensure_reading_log_partition((date_trunc('month', now()) - make_interval(months => m))::date)
+FROM generate_series(0, 3) AS m
+""",
+    """
+INSERT INTO public.reading_log (family_id, story_id, collection_id, source, created_at)
+SELECT s.family_id, s.id, s.collection_id,
+       CASE WHEN random() < 0.5 THEN 'random' ELSE 'manual' END,
+       now() - random() * interval '90 days'
+FROM (
+    SELECT id, collection_id, family_id FROM public.stories WHERE is_published ORDER BY random() LIMIT 2000
+) AS s,
+     generate_series(1, GREATEST(1, %(reads)s / 2000)) AS n
+""",
+]
+
+
+def _connect(dsn: str):
+    try:
+        import psycopg  # import opcional: só esta ferramenta fala direto com o Postgres
+
+        # Parâmetros interpolados no cliente, como no psycopg2: EXPLAIN não aceita $1
+        return psycopg.connect(dsn, cursor_factory=psycopg.ClientCursor)
+    except ImportError:
+        pass
+    try:
+        import psycopg2
+    except ImportError:
+        raise SystemExit("Instale psycopg (ou psycopg2) para rodar esta verificação.")
+    return psycopg2.connect(dsn)
+
+
+def _plan_nodes(node: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    yield node
+    for child in node.get("Plans", []):
+        yield from _plan_nodes(child)
+
+
+def _parents(cursor, names: List[str]) -> Dict[str, str]:
+    """Pai de cada partição ou índice de partição (nome -> nome do pai)."""
+
+    if not names:
+        return {}
+    cursor.execute(
+        "SELECT child.relname, parent.relname "
+        "FROM pg_inherits AS i "
+        "JOIN pg_class AS child ON child.oid = i.inhrelid "
+        "JOIN pg_class AS parent ON parent.oid = i.inhparent "
+        "WHERE child.relname = ANY(%(names)s)",
+        {"names": names},
+    )
+    return dict(cursor.fetchall())
+
+
+def check_shape(cursor, shape: QueryShape, params: Dict[str, Any]) -> Tuple[bool, str]:
+    if shape.small_table:
+        cursor.execute("SET LOCAL enable_seqscan = off")
+    cursor.execute("EXPLAIN (FORMAT JSON) " + shape.sql, params)
+    raw = cursor.fetchone()[0]
+    plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]["Plan"]
+    if shape.small_table:
+        cursor.execute("RESET enable_seqscan")
+
+    nodes = list(_plan_nodes(plan))
+    indexes = sorted({node["Index Name"] for node in nodes if node.get("Index Name")})
+    seq_tables = sorted({node["Relation Name"] for node in nodes if node.get("Node Type") == "Seq Scan"})
+    parents = _parents(cursor, indexes + seq_tables)
+
+    problems = []
+    if not {shape.index, *shape.alternatives} & {parents.get(name, name) for name in indexes}:
+        problems.append(f"não usa {shape.index}")
+    if shape.table in {parents.get(name, name) for name in seq_tables}:
+        problems.append(f"leitura sequencial de {shape.table}")
+    if shape.ordered and any(node.get("Node Type") in ("Sort", "Incremental Sort") for node in nodes):
+        problems.append("ordena fora do índice")
+
+    detail = ", ".join(problems) if problems else "índices: " + ", ".join(indexes)
+    return not problems, detail
+
+
+def _sample_params(cursor) -> Dict[str, Any]:
+    cursor.execute(
+        "SELECT s.family_id, s.collection_id, s.id FROM public.stories AS s "
+        "JOIN public.collections AS c ON c.id = s.collection_id "
+        "WHERE s.is_published AND c.is_active ORDER BY c.sort_order, s.sort_order LIMIT 1"
+    )
+    row = cursor.fetchone()
+    if not row:
+        raise SystemExit("Banco sem histórias publicadas: rode sem --skip-seed.")
+    family_id, collection_id, story_id = row
+    cursor.execute(
+        "SELECT created_at, id FROM public.reading_log WHERE family_id = %(family_id)s "
+        "ORDER BY created_at DESC, id DESC OFFSET 19 LIMIT 1",
+        {"family_id": family_id},
+    )
+    reading = cursor.fetchone() or (None, None)
+    return {
+        "family_id": family_id,
+        "scope_prefix": f"{family_id}:%",
+        "collection_id": collection_id,
+        "story_id": story_id,
+        "reading_created_at": reading[0],
+        "reading_id": reading[1],
+    }
+
+
+def run_checks(
+    dsn: str,
+    load_schema: bool = True,
+    seed: bool = True,
+    families: int = 8,
+    collections: int = 200,
+    stories_per_collection: int = 250,
+    reads: int = 300_000,
+) -> int:
+    """Roda as verificações e devolve quantas consultas falharam."""
+
+    connection = _connect(dsn)
+    try:
+        with connection.cursor() as cursor:
+            if load_schema:
+                cursor.execute(SCHEMA_PATH.read_text(encoding="utf-8"))
+                connection.commit()
+            if seed:
+                print(
+                    f"Inserindo {families} famílias, {collections} coleções,"
+                    f" {collections * stories_per_collection} histórias e {reads} leituras..."
+                )
+                volumes = {
+                    "families": families,
+                    "collections": collections,
+                    "stories_per_collection": stories_per_collection,
+                    "reads": reads,
+                }
+                for statement in SEED_STATEMENTS:
+                    cursor.execute(statement, volumes)
+                connection.commit()
+            cursor.execute(
+                "ANALYZE public.families, public.collections, public.stories, public.reading_log, public.catalog_versions"
+            )
+            connection.commit()
+
+            params = _sample_params(cursor)
+            failures = 0
+            for shape in QUERY_SHAPES:
+                ok, detail = check_shape(cursor, shape, params)
+                failures += 0 if ok else 1
+                print(f"{'OK   ' if ok else 'FALHA'} {shape.name}: {detail}")
+            connection.rollback()
+            return failures
+    finally:
+        connection.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", default=os.environ.get("DATABASE_URL"), help="Postgres descartável (padrão: $DATABASE_URL)")
+    parser.add_argument("--skip-schema", action="store_true", help="não recarrega supabase/schema.sql")
+    parser.add_argument("--skip-seed", action="store_true", help="usa os dados que já estão no banco")
+    parser.add_argument("--families", type=int, default=8)
+    parser.add_argument("--collections", type=int, default=200)
+    parser.add_argument("--stories-per-collection", type=int, default=250)
+    parser.add_argument("--reads", type=int, default=300_000)
+    args = parser.parse_args()
+
+    if not args.dsn:
+        parser.error("informe --dsn ou defina DATABASE_URL")
+
+    failures = run_checks(
+        args.dsn,
+        load_schema=not args.skip_schema,
+        seed=not args.skip_seed,
+        families=args.families,
+        collections=args.collections,
+        stories_per_collection=args.stories_per_collection,
+        reads=args.reads,
+    )
+    if failures:
+        print(f"{failures} consulta(s) sem o índice esperado.")
+        sys.exit(1)
+    print("Todas as consultas usam os índices esperados.")
+
+
+if __name__ == "__main__":
+    main()
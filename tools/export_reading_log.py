@@ -0,0 +1,73 @@
+"""Exporta o histórico de leitura inteiro para análise (CSV compactado ou Parquet).
+
+As leituras são buscadas em páginas e gravadas direto no arquivo, então a memória
+usada é a mesma para mil ou dez milhões de leituras. Cada linha traz título e
+coleção (view ``reading_history``).
+
+Uso (na raiz do repositório, com SUPABASE_URL e SUPABASE_ANON_KEY no ambiente ou
+em ``.streamlit/secrets.toml``):
+
+    python -m tools.export_reading_log --output leituras.csv.gz
+    python -m tools.export_reading_log --format parquet --output leituras.parquet \\
+        --from 2026-01-01 --to 2026-07-01 --source random
+    python -m tools.export_reading_log --family silva --output silva.csv.gz
+
+Parquet requer ``pip install pyarrow``.
+"""
+
+from pathlib import Path
+import argparse
+import sys
+
+from reading_log_export import EXPORT_FORMATS, export_reading_log, parquet_available
+from stories_repository import get_family_by_slug
+from supabase_client import create_client_from_environment
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--format", choices=sorted(EXPORT_FORMATS), default="csv", help="formato do arquivo")
+    parser.add_argument("--output", help="arquivo de saída (padrão: leituras + extensão do formato)")
+    parser.add_argument("--from", dest="date_from", help="data inicial, inclusiva (AAAA-MM-DD)")
+    parser.add_argument("--to", dest="date_to", help="data final, exclusiva (AAAA-MM-DD)")
+    parser.add_argument("--collection", help="id da coleção")
+    parser.add_argument("--source", choices=["random", "manual"], help="origem da leitura")
+    parser.add_argument("--family", help="slug da família (padrão: todas)")
+    args = parser.parse_args()
+
+    if args.format == "parquet" and not parquet_available():
+        parser.error("Parquet requer o pacote pyarrow (pip install pyarrow)")
+
+    client = create_client_from_environment()
+    if client is None:
+        print("Supabase não configurado. Defina SUPABASE_URL e SUPABASE_ANON_KEY.")
+        sys.exit(1)
+
+    family_id = None
+    if args.family:
+        family = get_family_by_slug(client, args.family)
+        if family is None:
+            print(f"Família não encontrada: {args.family}")
+            sys.exit(1)
+        family_id = family["id"]
+
+    output = Path(args.output or f"leituras{EXPORT_FORMATS[args.format][1]}")
+    partial = output.with_name(output.name + ".parcial")
+    try:
+        with partial.open("wb") as target:
+            total = export_reading_log(
+                client, target, args.format, args.date_from, args.date_to, args.collection, args.source, family_id
+            )
+    except KeyboardInterrupt:
+        partial.unlink(missing_ok=True)
+        sys.exit(130)
+    except Exception:
+        # Arquivo incompleto não fica com o nome final
+        partial.unlink(missing_ok=True)
+        raise
+    partial.replace(output)
+    print(f"{total} leitura(s) exportada(s) para {output}")
+
+
+if __name__ == "__main__":
+    main()
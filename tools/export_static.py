@@ -0,0 +1,475 @@
+"""Exporta o catálogo publicado como site estático e e-book (EPUB).
+
+Usa os mesmos dados do modo leitor (``get_active_collections`` e
+``get_published_stories_by_collection``) e gera, na pasta de saída:
+
+- ``index.html``, uma página por coleção e uma por história, com CSS simples,
+  prontas para qualquer hospedagem estática ou CDN;
+- ``historias.epub`` com todas as coleções da família, as imagens e links para os áudios;
+- ``images/``: imagens reduzidas (com Pillow, se instalado; sem ele, a original);
+- ``manifest.json``: o ``updated_at`` (e o nome da coleção) de cada história já exportada.
+
+A reconstrução é incremental: só as histórias com ``updated_at`` diferente do
+manifesto, ou cuja coleção foi renomeada, têm o texto e a imagem buscados de novo. As páginas cujo conteúdo não
+mudou não são regravadas, então o cache da CDN continua válido. No EPUB, os
+capítulos sem mudança são copiados do arquivo anterior.
+
+Uso (na raiz do repositório, com SUPABASE_URL e SUPABASE_ANON_KEY no ambiente ou
+em ``.streamlit/secrets.toml``):
+
+    python -m tools.export_static --output dist/site          # um site por família: dist/site/<slug>/
+    python -m tools.export_static --output dist/site --full   # ignora o manifesto
+    python -m tools.export_static --output /tmp/site --fake   # catálogo falso, sem banco
+    python -m tools.export_static --output dist/silva --family silva   # só uma família, direto na pasta
+"""
+
+from datetime import datetime, timezone
+from html import escape
+from typing import Any, Dict, List, Optional, Tuple
+import argparse
+import io
+import json
+import os
+import sys
+import urllib.request
+import uuid
+import zipfile
+
+from stories_repository import (
+    get_active_collections,
+    get_family_by_slug,
+    get_published_stories_by_collection,
+    get_story_body,
+    get_story_paragraphs,
+    list_families,
+)
+from story_artifacts import format_reading_time, split_paragraphs
+from supabase_client import create_client_from_environment
+
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+EPUB_NAME = "historias.epub"
+BOOK_TITLE = "Histórias do Benício"
+IMAGE_MAX_WIDTH = 960
+IMAGE_QUALITY = 82
+DOWNLOAD_TIMEOUT_SECONDS = 20
+IMAGE_MEDIA_TYPES = {
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".gif": "image/gif",
+    ".webp": "image/webp",
+}
+
+STYLE = """
+body { font-family: Georgia, serif; max-width: 42rem; margin: 0 auto; padding: 1.5rem; line-height: 1.6; color: #222; }
+a { color: #5b3cc4; }
+img { max-width: 100%; height: auto; border-radius: 8px; }
+ul.stories { list-style: none; padding: 0; }
+ul.stories li { margin: 0.75rem 0; }
+.caption { color: #666; font-size: 0.9rem; }
+nav { margin-bottom: 1.5rem; }
+""".strip()
+
+
+def _write_if_changed(path: str, data: bytes) -> bool:
+    """Grava o arquivo só se o conteúdo mudou (mantém data e ETag estáveis na CDN)."""
+
+    try:
+        with open(path, "rb") as handle:
+            if handle.read() == data:
+                return False
+    except OSError:
+        pass
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as handle:
+        handle.write(data)
+    os.replace(temp_path, path)
+    return True
+
+
+def _load_manifest(output_dir: str) -> Dict[str, Any]:
+    try:
+        with open(os.path.join(output_dir, MANIFEST_NAME), encoding="utf-8") as handle:
+            manifest = json.load(handle)
+    except (OSError, ValueError):
+        return {"version": MANIFEST_VERSION, "stories": {}}
+    if manifest.get("version") != MANIFEST_VERSION:
+        return {"version": MANIFEST_VERSION, "stories": {}}
+    return manifest
+
+
+def _fetch_paragraphs(client, story: Dict[str, Any], family_id: Optional[str]) -> List[str]:
+    paragraph_count = story.get("paragraph_count")
+    if paragraph_count:
+        return get_story_paragraphs(client, story["id"], 0, int(paragraph_count), family_id)
+    return split_paragraphs(get_story_body(client, story["id"], family_id) or "")
+
+
+def _download_image(url: str) -> Optional[Tuple[bytes, str]]:
+    """Baixa e reduz a imagem; devolve (bytes, extensão) ou None em falha."""
+
+    try:
+        with urllib.request.urlopen(url, timeout=DOWNLOAD_TIMEOUT_SECONDS) as response:
+            data = response.read()
+    except Exception as exc:
+        print(f"[Exportação] Erro ao baixar imagem {url}: {exc}")
+        return None
+
+    try:
+        from PIL import Image  # import opcional: sem Pillow a imagem vai no tamanho original
+    except ImportError:
+        extension = os.path.splitext(url.split("?", 1)[0])[1].lower()
+        return data, extension if extension in IMAGE_MEDIA_TYPES else ".jpg"
+
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image = image.convert("RGB")
+            image.thumbnail((IMAGE_MAX_WIDTH, IMAGE_MAX_WIDTH * 4))
+            output = io.BytesIO()
+            image.save(output, format="JPEG", quality=IMAGE_QUALITY, optimize=True, progressive=True)
+        return output.getvalue(), ".jpg"
+    except Exception as exc:
+        print(f"[Exportação] Erro ao reduzir imagem {url}: {exc}")
+        return None
+
+
+def _page(title: str, body: str, root: str) -> bytes:
+    return (
+        "<!DOCTYPE html>\n"
+        '<html lang="pt-BR">\n<head>\n<meta charset="utf-8">\n'
+        '<meta name="viewport" content="width=device-width, initial-scale=1">\n'
+        f"<title>{escape(title)}</title>\n"
+        f'<link rel="stylesheet" href="{root}style.css">\n'
+        f"</head>\n<body>\n{body}\n</body>\n</html>\n"
+    ).encode("utf-8")
+
+
+def _story_body_html(
+    story: Dict[str, Any], paragraphs: List[str], image_src: Optional[str], xhtml: bool = False
+) -> str:
+    parts = [f"<h1>{escape(story.get('title') or 'História')}</h1>"]
+    reading_time = format_reading_time(story.get("reading_time_seconds"))
+    if reading_time:
+        parts.append(f'<p class="caption">{escape(reading_time)}</p>')
+    if image_src:
+        closing = "/>" if xhtml else ' loading="lazy">'
+        parts.append(f'<img src="{escape(image_src)}" alt=""{closing}')
+    parts.extend(f"<p>{escape(paragraph)}</p>" for paragraph in paragraphs)
+    audio_url = story.get("audio_url")
+    if audio_url:
+        parts.append(
+            f'<p><a href="{escape(audio_url)}">Ouvir esta história</a></p>'
+        )
+    return "\n".join(parts)
+
+
+def _story_page(story: Dict[str, Any], collection: Dict[str, Any], paragraphs: List[str], image: Optional[str]) -> bytes:
+    image_src = f"../{image}" if image else story.get("image_url")
+    nav = (
+        f'<nav><a href="../index.html">Coleções</a> › '
+        f'<a href="../collections/{collection["id"]}.html">{escape(collection.get("name") or "Coleção")}</a></nav>'
+    )
+    body = nav + "\n" + _story_body_html(story, paragraphs, image_src)
+    audio_url = story.get("audio_url")
+    if audio_url:
+        body += f'\n<audio controls preload="none" src="{escape(audio_url)}"></audio>'
+    return _page(story.get("title") or "História", body, "../")
+
+
+def _collection_page(collection: Dict[str, Any], stories: List[Dict[str, Any]]) -> bytes:
+    items = []
+    for story in stories:
+        reading_time = format_reading_time(story.get("reading_time_seconds"))
+        caption = f' <span class="caption">{escape(reading_time)}</span>' if reading_time else ""
+        items.append(
+            f'<li><a href="../stories/{story["id"]}.html">{escape(story.get("title") or "História")}</a>{caption}</li>'
+        )
+    description = collection.get("description")
+    body = "\n".join(
+        [
+            '<nav><a href="../index.html">Coleções</a></nav>',
+            f"<h1>{escape(collection.get('name') or 'Coleção')}</h1>",
+            f'<p class="caption">{escape(description)}</p>' if description else "",
+            '<ul class="stories">',
+            *items,
+            "</ul>",
+        ]
+    )
+    return _page(collection.get("name") or "Coleção", body, "../")
+
+
+def _index_page(collections: List[Dict[str, Any]]) -> bytes:
+    items = [
+        f'<li><a href="collections/{c["id"]}.html">{escape(c.get("name") or "Coleção")}</a></li>'
+        for c in collections
+    ]
+    body = "\n".join(
+        [
+            f"<h1>{escape(BOOK_TITLE)}</h1>",
+            f'<p><a href="{EPUB_NAME}">Baixar o livro (EPUB)</a></p>',
+            '<ul class="stories">',
+            *items,
+            "</ul>",
+        ]
+    )
+    return _page(BOOK_TITLE, body, "")
+
+
+def _chapter_xhtml(story: Dict[str, Any], paragraphs: List[str], image: Optional[str]) -> bytes:
+    body = _story_body_html(story, paragraphs, f"../{image}" if image else None, xhtml=True)
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>\n<!DOCTYPE html>\n'
+        '<html xmlns="http://www.w3.org/1999/xhtml" lang="pt-BR" xml:lang="pt-BR">\n'
+        f"<head><title>{escape(story.get('title') or 'História')}</title></head>\n"
+        f"<body>\n{body}\n</body>\n</html>\n"
+    ).encode("utf-8")
+
+
+def _write_epub(
+    path: str,
+    collections: List[Dict[str, Any]],
+    stories_by_collection: Dict[str, List[Dict[str, Any]]],
+    chapters: Dict[str, bytes],
+    images: Dict[str, bytes],
+) -> None:
+    """Monta o EPUB 3 (um capítulo por história, agrupados por coleção no sumário)."""
+
+    manifest_items = ['<item id="nav" href="nav.xhtml" media-type="application/xhtml+xml" properties="nav"/>']
+    spine_items = []
+    nav_items = []
+    for collection in collections:
+        story_links = []
+        for story in stories_by_collection.get(collection["id"], []):
+            if story["id"] not in chapters:
+                continue
+            item_id = f"s-{story['id']}"
+            manifest_items.append(
+                f'<item id="{item_id}" href="chapters/{story["id"]}.xhtml" media-type="application/xhtml+xml"/>'
+            )
+            spine_items.append(f'<itemref idref="{item_id}"/>')
+            story_links.append(
+                f'<li><a href="chapters/{story["id"]}.xhtml">{escape(story.get("title") or "História")}</a></li>'
+            )
+        if story_links:
+            nav_items.append(
+                f"<li><span>{escape(collection.get('name') or 'Coleção')}</span><ol>{''.join(story_links)}</ol></li>"
+            )
+    for index, name in enumerate(sorted(images)):
+        media_type = IMAGE_MEDIA_TYPES.get(os.path.splitext(name)[1], "image/jpeg")
+        manifest_items.append(f'<item id="img-{index}" href="{name}" media-type="{media_type}"/>')
+
+    modified = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    book_id = uuid.uuid5(uuid.NAMESPACE_URL, BOOK_TITLE)
+    content_opf = (
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        '<package xmlns="http://www.idpf.org/2007/opf" version="3.0" unique-identifier="book-id" xml:lang="pt-BR">\n'
+        '<metadata xmlns:dc="http://purl.org/dc/elements/1.1/">\n'
+        f'<dc:identifier id="book-id">urn:uuid:{book_id}</dc:identifier>\n'
+        f"<dc:title>{escape(BOOK_TITLE)}</dc:title>\n<dc:language>pt-BR</dc:language>\n"
+        f'<meta property="dcterms:modified">{modified}</meta>\n</metadata>\n'
+        f"<manifest>\n{chr(10).join(manifest_items)}\n</manifest>\n"
+        f"<spine>\n{chr(10).join(spine_items)}\n</spine>\n</package>\n"
+    )
+    nav_xhtml = (
+        '<?xml version="1.0" encoding="utf-8"?>\n<!DOCTYPE html>\n'
+        '<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops" lang="pt-BR">\n'
+        f"<head><title>{escape(BOOK_TITLE)}</title></head>\n<body>\n"
+        f'<nav epub:type="toc"><h1>{escape(BOOK_TITLE)}</h1><ol>{"".join(nav_items)}</ol></nav>\n'
+        "</body>\n</html>\n"
+    )
+    container_xml = (
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        '<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">\n'
+        '<rootfiles><rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/></rootfiles>\n'
+        "</container>\n"
+    )
+
+    temp_path = f"{path}.tmp"
+    with zipfile.ZipFile(temp_path, "w") as epub:
+        # O mimetype precisa ser o primeiro arquivo e sem compressão
+        epub.writestr("mimetype", "application/epub+zip", compress_type=zipfile.ZIP_STORED)
+        epub.writestr("META-INF/container.xml", container_xml, compress_type=zipfile.ZIP_DEFLATED)
+        epub.writestr("OEBPS/content.opf", content_opf, compress_type=zipfile.ZIP_DEFLATED)
+        epub.writestr("OEBPS/nav.xhtml", nav_xhtml, compress_type=zipfile.ZIP_DEFLATED)
+        for story_id, chapter in chapters.items():
+            epub.writestr(f"OEBPS/chapters/{story_id}.xhtml", chapter, compress_type=zipfile.ZIP_DEFLATED)
+        for name, data in images.items():
+            # Imagens já são comprimidas
+            epub.writestr(f"OEBPS/{name}", data, compress_type=zipfile.ZIP_STORED)
+    os.replace(temp_path, path)
+
+
+def _previous_epub_chapters(path: str) -> Dict[str, bytes]:
+    """Capítulos do EPUB anterior, reaproveitados para histórias que não mudaram."""
+
+    chapters: Dict[str, bytes] = {}
+    try:
+        with zipfile.ZipFile(path) as epub:
+            for name in epub.namelist():
+                if name.startswith("OEBPS/chapters/") and name.endswith(".xhtml"):
+                    chapters[name[len("OEBPS/chapters/"):-len(".xhtml")]] = epub.read(name)
+    except (OSError, zipfile.BadZipFile, KeyError):
+        return {}
+    return chapters
+
+
+def export_catalog(client, output_dir: str, full: bool = False, family_id: Optional[str] = None) -> Dict[str, int]:
+    """Gera (ou atualiza) o site estático e o EPUB (de uma família, se informada). Retorna contadores do que foi feito."""
+
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = {"version": MANIFEST_VERSION, "stories": {}} if full else _load_manifest(output_dir)
+    previous = manifest.get("stories", {})
+    epub_path = os.path.join(output_dir, EPUB_NAME)
+    previous_chapters = {} if full else _previous_epub_chapters(epub_path)
+
+    collections = get_active_collections(client, family_id)
+    if not collections:
+        # Segue assim mesmo: as páginas de coleções desativadas saem e o manifesto fica vazio
+        print("[Exportação] Nenhuma coleção ativa encontrada (ou erro ao consultar o banco).")
+
+    stats = {"collections": len(collections), "stories": 0, "rebuilt": 0, "removed": 0, "pages_written": 0}
+    stories_by_collection: Dict[str, List[Dict[str, Any]]] = {}
+    entries: Dict[str, Dict[str, Any]] = {}
+    chapters: Dict[str, bytes] = {}
+    images: Dict[str, bytes] = {}
+
+    for collection in collections:
+        stories = get_published_stories_by_collection(client, collection["id"], family_id)
+        stories_by_collection[collection["id"]] = stories
+        for story in stories:
+            story_id = story["id"]
+            stats["stories"] += 1
+            known = previous.get(story_id)
+            page_path = os.path.join(output_dir, "stories", f"{story_id}.html")
+            unchanged = (
+                known is not None
+                and known.get("updated_at") == story.get("updated_at")
+                and known.get("collection_id") == collection["id"]
+                # O nome da coleção aparece na navegação da página da história
+                and known.get("collection_name") == collection.get("name")
+                and os.path.exists(page_path)
+                and story_id in previous_chapters
+                and (not known.get("image") or os.path.exists(os.path.join(output_dir, known["image"])))
+            )
+
+            if unchanged:
+                entry = known
+                chapters[story_id] = previous_chapters[story_id]
+            else:
+                paragraphs = _fetch_paragraphs(client, story, family_id)
+                image = None
+                if story.get("image_url"):
+                    downloaded = _download_image(story["image_url"])
+                    if downloaded:
+                        data, extension = downloaded
+                        image = f"images/{story_id}{extension}"
+                        _write_if_changed(os.path.join(output_dir, image), data)
+                if _write_if_changed(page_path, _story_page(story, collection, paragraphs, image)):
+                    stats["pages_written"] += 1
+                chapters[story_id] = _chapter_xhtml(story, paragraphs, image)
+                entry = {
+                    "updated_at": story.get("updated_at"),
+                    "collection_id": collection["id"],
+                    "collection_name": collection.get("name"),
+                    "image": image,
+                }
+                stats["rebuilt"] += 1
+
+            entries[story_id] = entry
+            if entry.get("image") and os.path.splitext(entry["image"])[1] in IMAGE_MEDIA_TYPES:
+                with open(os.path.join(output_dir, entry["image"]), "rb") as handle:
+                    images[entry["image"]] = handle.read()
+
+        if _write_if_changed(
+            os.path.join(output_dir, "collections", f"{collection['id']}.html"),
+            _collection_page(collection, stories),
+        ):
+            stats["pages_written"] += 1
+
+    # Histórias despublicadas ou apagadas saem do site
+    for story_id, known in previous.items():
+        if story_id in entries:
+            continue
+        stats["removed"] += 1
+        for relative in (f"stories/{story_id}.html", known.get("image")):
+            if relative:
+                try:
+                    os.remove(os.path.join(output_dir, relative))
+                except OSError:
+                    pass
+
+    # Coleções desativadas ou apagadas também saem do site
+    active_pages = {f"{collection['id']}.html" for collection in collections}
+    collections_dir = os.path.join(output_dir, "collections")
+    for name in os.listdir(collections_dir) if os.path.isdir(collections_dir) else []:
+        if name.endswith(".html") and name not in active_pages:
+            try:
+                os.remove(os.path.join(collections_dir, name))
+                stats["removed"] += 1
+            except OSError:
+                pass
+
+    for relative, data in (("index.html", _index_page(collections)), ("style.css", STYLE.encode("utf-8"))):
+        if _write_if_changed(os.path.join(output_dir, relative), data):
+            stats["pages_written"] += 1
+
+    if stats["rebuilt"] or stats["removed"] or set(chapters) != set(previous_chapters) or not os.path.exists(epub_path):
+        _write_epub(epub_path, collections, stories_by_collection, chapters, images)
+        stats["pages_written"] += 1
+
+    manifest = {"version": MANIFEST_VERSION, "stories": entries}
+    _write_if_changed(
+        os.path.join(output_dir, MANIFEST_NAME),
+        json.dumps(manifest, indent=2, sort_keys=True).encode("utf-8"),
+    )
+    return stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default=os.path.join("dist", "site"), help="pasta de saída do site")
+    parser.add_argument("--full", action="store_true", help="reconstrói tudo, ignorando o manifesto")
+    parser.add_argument("--fake", action="store_true", help="usa um catálogo falso em memória (tools/fake_supabase.py)")
+    parser.add_argument("--family", help="slug da família (padrão: todas, cada uma em <output>/<slug>)")
+    args = parser.parse_args()
+
+    if args.fake:
+        from tools.fake_supabase import FakeSupabase, seed_catalog
+
+        client = FakeSupabase(latency_ms=0, jitter_ms=0)
+        seed_catalog(client, collections=2, stories_per_collection=3)
+    else:
+        client = create_client_from_environment()
+    if client is None:
+        print("Supabase não configurado. Defina SUPABASE_URL e SUPABASE_ANON_KEY.")
+        sys.exit(1)
+
+    # Cada família tem o próprio site e livro: sem --family, uma subpasta por família
+    if args.family:
+        family = get_family_by_slug(client, args.family)
+        if family is None:
+            print(f"Família não encontrada: {args.family}")
+            sys.exit(1)
+        targets = [(family, args.output)]
+    else:
+        families = list_families(client)
+        if not families:
+            print("Nenhuma família encontrada (ou erro ao consultar o banco).")
+            sys.exit(1)
+        targets = [(family, os.path.join(args.output, family["slug"])) for family in families]
+
+    for family, output_dir in targets:
+        stats = export_catalog(client, output_dir, full=args.full, family_id=family["id"])
+        print(
+            f"[{family['slug']}] Coleções: {stats['collections']}  Histórias: {stats['stories']}"
+            f"  Reconstruídas: {stats['rebuilt']}  Removidas: {stats['removed']}"
+            f"  Arquivos gravados: {stats['pages_written']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Servidor HTTP local com mídias de mentira, para testar a varredura de links (media_health.py).
+
+Cada caminho simula um caso que a varredura precisa reconhecer, sem rede externa:
+
+- ``/ok/<nome>.jpg`` e ``/ok/<nome>.mp3``: arquivo pequeno do tipo certo;
+- ``/grande/<nome>.mp3``: áudio de 120 MB (só o tamanho é anunciado; nada é enviado);
+- ``/sem-head/<nome>.jpg``: recusa HEAD (405) e responde ao GET com Range;
+- ``/html/<nome>.jpg``: página HTML com status 200 no lugar da imagem;
+- ``/lento/<nome>.jpg``: responde depois de ``slow_ms``;
+- qualquer outro caminho: 404.
+
+Todas as respostas esperam ``latency_ms`` antes, como um servidor remoto.
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Tuple
+import threading
+import time
+
+
+SMALL_BODY = b"\xff\xd8\xff" + b"0" * 2048
+BIG_SIZE = 120 * 1024 * 1024
+HTML_BODY = b"<html><body>Arquivo nao encontrado</body></html>"
+
+
+def _handler(latency_ms: float, slow_ms: float):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            return
+
+        def _respond(self, send_body: bool) -> None:
+            time.sleep(latency_ms / 1000.0)
+            path = self.path.split("?")[0]
+            if path.startswith("/lento/"):
+                time.sleep(slow_ms / 1000.0)
+
+            if path.startswith("/sem-head/") and self.command == "HEAD":
+                self.send_response(405)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            if path.startswith(("/ok/", "/sem-head/", "/lento/")):
+                content_type = "audio/mpeg" if path.endswith(".mp3") else "image/jpeg"
+                body, size = SMALL_BODY, len(SMALL_BODY)
+            elif path.startswith("/grande/"):
+                content_type, body, size = "audio/mpeg", b"", BIG_SIZE
+            elif path.startswith("/html/"):
+                content_type, body, size = "text/html; charset=utf-8", HTML_BODY, len(HTML_BODY)
+            else:
+                self.send_response(404)
+                self.send_header("Content-Type", "text/plain")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            if self.headers.get("Range") == "bytes=0-0":
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes 0-0/{size}")
+                self.send_header("Content-Length", "1")
+                body = body[:1] or b"\0"
+            else:
+                self.send_response(200)
+                self.send_header("Content-Length", str(size))
+            self.send_header("Content-Type", content_type)
+            self.end_headers()
+            if send_body:
+                self.wfile.write(body)
+
+        def do_HEAD(self) -> None:
+            self._respond(send_body=False)
+
+        def do_GET(self) -> None:
+            self._respond(send_body=True)
+
+    return Handler
+
+
+def start_fake_media_server(latency_ms: float = 50.0, slow_ms: float = 3500.0) -> Tuple[ThreadingHTTPServer, str]:
+    """Sobe o servidor numa porta livre de 127.0.0.1, em segundo plano. Devolve o servidor e a URL base."""
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _handler(latency_ms, slow_ms))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-media-server", daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}"
@@ -0,0 +1,537 @@
+"""Substituto em memória do cliente Supabase, com latência configurável.
+
+Implementa apenas o subconjunto da API usado por stories_repository.py
+(table/select/eq/like/order/limit/range/insert/update/delete/upsert/rpc e storage),
+contando as chamadas ao "backend" para relatórios de carga.
+"""
+
+from typing import Any, Callable, Dict, List, Optional
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+# Tabelas com family_id (DEFAULT public.default_family_id() no schema)
+FAMILY_TABLES = ("collections", "stories", "reading_log")
+
+# Valores DEFAULT das colunas (supabase/schema.sql) que o app lê de volta
+TABLE_DEFAULTS: Dict[str, Dict[str, Any]] = {
+    "media_jobs": {"status": "pending", "attempts": 0, "max_attempts": 5, "payload": {}, "run_after": ""},
+}
+
+
+class FakeResponse:
+    def __init__(self, data: Any, count: Optional[int] = None) -> None:
+        self.data = data
+        self.count = count
+
+
+class FakeQuery:
+    """Construtor de consultas encadeável, executado contra as tabelas em memória."""
+
+    def __init__(self, backend: "FakeSupabase", table: str) -> None:
+        self._backend = backend
+        self._table = table
+        self._action = "select"
+        self._columns: Optional[List[str]] = None
+        self._count: Optional[str] = None
+        self._filters: List[Callable[[Dict[str, Any]], bool]] = []
+        self._orders: List[tuple] = []
+        self._limit: Optional[int] = None
+        self._offset = 0
+        self._payload: Any = None
+        self._on_conflict: Optional[str] = None
+        self._ignore_duplicates = False
+
+    # Seleção e filtros
+    def select(self, columns: str = "*", count: Optional[str] = None) -> "FakeQuery":
+        if columns != "*":
+            self._columns = [c.strip() for c in columns.split(",") if c.strip() and "(" not in c]
+        self._count = count
+        return self
+
+    def eq(self, column: str, value: Any) -> "FakeQuery":
+        self._filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def neq(self, column: str, value: Any) -> "FakeQuery":
+        self._filters.append(lambda row: row.get(column) != value)
+        return self
+
+    def is_(self, column: str, value: Any) -> "FakeQuery":
+        expected = None if value in (None, "null") else value
+        self._filters.append(lambda row: row.get(column) is expected)
+        return self
+
+    def like(self, column: str, pattern: str) -> "FakeQuery":
+        regex = re.compile(
+            "".join(".*" if char == "%" else "." if char == "_" else re.escape(char) for char in pattern) + r"\Z",
+            re.DOTALL,
+        )
+        self._filters.append(lambda row: row.get(column) is not None and regex.match(str(row.get(column))) is not None)
+        return self
+
+    def in_(self, column: str, values: List[Any]) -> "FakeQuery":
+        allowed = set(values)
+        self._filters.append(lambda row: row.get(column) in allowed)
+        return self
+
+    def gte(self, column: str, value: Any) -> "FakeQuery":
+        self._filters.append(lambda row: row.get(column) is not None and str(row.get(column)) >= str(value))
+        return self
+
+    def gt(self, column: str, value: Any) -> "FakeQuery":
+        self._filters.append(lambda row: row.get(column) is not None and str(row.get(column)) > str(value))
+        return self
+
+    def lt(self, column: str, value: Any) -> "FakeQuery":
+        self._filters.append(lambda row: row.get(column) is not None and str(row.get(column)) < str(value))
+        return self
+
+    def lte(self, column: str, value: Any) -> "FakeQuery":
+        self._filters.append(lambda row: row.get(column) is not None and str(row.get(column)) <= str(value))
+        return self
+
+    def order(self, column: str, desc: bool = False, **_: Any) -> "FakeQuery":
+        self._orders.append((column, desc))
+        return self
+
+    def limit(self, count: int) -> "FakeQuery":
+        self._limit = count
+        return self
+
+    def range(self, start: int, end: int) -> "FakeQuery":
+        self._offset = start
+        self._limit = end - start + 1
+        return self
+
+    # Escritas
+    def insert(self, payload: Any) -> "FakeQuery":
+        self._action, self._payload = "insert", payload
+        return self
+
+    def upsert(self, payload: Any, on_conflict: str = "id", ignore_duplicates: bool = False, **_: Any) -> "FakeQuery":
+        self._action, self._payload = "upsert", payload
+        self._on_conflict, self._ignore_duplicates = on_conflict, ignore_duplicates
+        return self
+
+    def update(self, payload: Dict[str, Any]) -> "FakeQuery":
+        self._action, self._payload = "update", payload
+        return self
+
+    def delete(self) -> "FakeQuery":
+        self._action = "delete"
+        return self
+
+    def _matches(self, row: Dict[str, Any]) -> bool:
+        return all(check(row) for check in self._filters)
+
+    def execute(self) -> FakeResponse:
+        self._backend.simulate_call(f"{self._action}:{self._table}")
+        with self._backend.lock:
+            rows = self._backend.tables.setdefault(self._table, [])
+            if self._action == "select" or self._table not in ("collections", "stories"):
+                return getattr(self, f"_execute_{self._action}")(rows)
+
+            # Simula os gatilhos de catalog_versions (supabase/schema.sql): escopos
+            # '<família>:collections', '<família>:stories' e '<família>:<coleção>'
+            before = [row for row in rows if self._action in ("update", "delete") and self._matches(row)]
+            before = [dict(row) for row in before]
+            response = getattr(self, f"_execute_{self._action}")(rows)
+            changed = before + list(response.data or [])
+            if self._table == "collections":
+                _bump_catalog_versions(self._backend, [f"{row['family_id']}:collections" for row in changed])
+            else:
+                _bump_catalog_versions(self._backend, _story_scopes(changed))
+            return response
+
+    def _project(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        if self._columns is None:
+            return dict(row)
+        return {column: row.get(column) for column in self._columns}
+
+    def _execute_select(self, rows: List[Dict[str, Any]]) -> FakeResponse:
+        selected = [row for row in rows if self._matches(row)]
+        for column, desc in reversed(self._orders):
+            selected.sort(key=lambda row: (row.get(column) is None, row.get(column)), reverse=desc)
+        total = len(selected)
+        end = None if self._limit is None else self._offset + self._limit
+        selected = selected[self._offset:end]
+        return FakeResponse([self._project(row) for row in selected], total if self._count else None)
+
+    def _new_row(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        row = {"id": str(uuid.uuid4()), "created_at": _now_iso(), "updated_at": _now_iso()}
+        row.update(TABLE_DEFAULTS.get(self._table, {}))
+        if self._table in FAMILY_TABLES:
+            row["family_id"] = self._backend.default_family_id
+        row.update(item)
+        self._inherit_family(row)
+        return row
+
+    def _inherit_family(self, row: Dict[str, Any]) -> None:
+        # Gatilho stories_inherit_family: a história é da família da sua coleção
+        if self._table != "stories" or not row.get("collection_id"):
+            return
+        collection = next(
+            (c for c in self._backend.tables.get("collections", []) if c["id"] == row["collection_id"]), None
+        )
+        if collection is not None:
+            row["family_id"] = collection["family_id"]
+
+    def _execute_insert(self, rows: List[Dict[str, Any]]) -> FakeResponse:
+        items = self._payload if isinstance(self._payload, list) else [self._payload]
+        created = [self._new_row(item) for item in items]
+        rows.extend(created)
+        return FakeResponse([dict(row) for row in created])
+
+    def _execute_upsert(self, rows: List[Dict[str, Any]]) -> FakeResponse:
+        items = self._payload if isinstance(self._payload, list) else [self._payload]
+        keys = [k.strip() for k in (self._on_conflict or "id").split(",")]
+        written = []
+        for item in items:
+            existing = next(
+                (row for row in rows if all(row.get(k) == item.get(k) for k in keys)), None
+            )
+            if existing is None:
+                row = self._new_row(item)
+                rows.append(row)
+                written.append(dict(row))
+            elif not self._ignore_duplicates:
+                existing.update(item)
+                existing["updated_at"] = _now_iso()
+                written.append(dict(existing))
+        return FakeResponse(written)
+
+    def _execute_update(self, rows: List[Dict[str, Any]]) -> FakeResponse:
+        updated = []
+        for row in rows:
+            if self._matches(row):
+                row.update(self._payload)
+                row["updated_at"] = _now_iso()
+                self._inherit_family(row)
+                updated.append(dict(row))
+        return FakeResponse(updated)
+
+    def _execute_delete(self, rows: List[Dict[str, Any]]) -> FakeResponse:
+        removed = [row for row in rows if self._matches(row)]
+        rows[:] = [row for row in rows if not self._matches(row)]
+        return FakeResponse([dict(row) for row in removed])
+
+
+class FakeRpc:
+    def __init__(self, backend: "FakeSupabase", name: str, params: Dict[str, Any]) -> None:
+        self._backend = backend
+        self._name = name
+        self._params = params or {}
+
+    def execute(self) -> FakeResponse:
+        self._backend.simulate_call(f"rpc:{self._name}")
+        handler = self._backend.rpc_handlers.get(self._name)
+        with self._backend.lock:
+            return FakeResponse(handler(self._backend, **self._params) if handler else None)
+
+
+class FakeBucket:
+    def __init__(self, backend: "FakeSupabase", bucket: str) -> None:
+        self._backend = backend
+        self._bucket = bucket
+
+    def upload(self, path: str, data: bytes, options: Optional[Dict[str, Any]] = None) -> None:
+        self._backend.simulate_call(f"storage:{self._bucket}")
+        with self._backend.lock:
+            self._backend.files[(self._bucket, path)] = data
+
+    def download(self, path: str) -> bytes:
+        self._backend.simulate_call(f"storage:{self._bucket}")
+        with self._backend.lock:
+            return self._backend.files.get((self._bucket, path), b"")
+
+    def get_public_url(self, path: str) -> str:
+        return f"https://storage.local/{self._bucket}/{path}"
+
+
+class FakeStorage:
+    def __init__(self, backend: "FakeSupabase") -> None:
+        self._backend = backend
+
+    def from_(self, bucket: str) -> FakeBucket:
+        return FakeBucket(self._backend, bucket)
+
+
+def _story_scopes(rows: List[Dict[str, Any]]) -> List[Optional[str]]:
+    scopes: List[Optional[str]] = []
+    for row in rows:
+        scopes.append(f"{row['family_id']}:stories")
+        if row.get("collection_id"):
+            scopes.append(f"{row['family_id']}:{row['collection_id']}")
+    return scopes
+
+
+def _bump_catalog_versions(backend: "FakeSupabase", scopes: List[Optional[str]]) -> None:
+    if not any(scopes):
+        return
+    backend.catalog_version += 1
+    versions = backend.tables.setdefault("catalog_versions", [])
+    by_scope = {row["scope"]: row for row in versions}
+    for scope in {scope for scope in scopes if scope is not None}:
+        if scope in by_scope:
+            by_scope[scope]["version"] = backend.catalog_version
+        else:
+            versions.append({"scope": scope, "version": backend.catalog_version})
+
+
+def _rpc_bulk_update_stories(
+    backend: "FakeSupabase", updates: List[Dict[str, Any]], p_family_id: Optional[str] = None
+) -> int:
+    by_id = {row["id"]: row for row in backend.tables.get("stories", [])}
+    if p_family_id:
+        families = {row["id"]: row.get("family_id") for row in backend.tables.get("collections", [])}
+        for item in updates:
+            story = by_id.get(item.get("id")) or {}
+            if story.get("family_id") != p_family_id or (
+                item.get("collection_id") and families.get(item["collection_id"]) != p_family_id
+            ):
+                raise RuntimeError("bulk_update_stories: história ou coleção de outra família")
+    affected = 0
+    changed: List[Dict[str, Any]] = []
+    for item in updates:
+        row = by_id.get(item.get("id"))
+        if row is None:
+            continue
+        changed.append(dict(row))
+        row.update({k: v for k, v in item.items() if k != "id"})
+        row["updated_at"] = _now_iso()
+        FakeQuery(backend, "stories")._inherit_family(row)
+        changed.append(dict(row))
+        affected += 1
+    scopes = _story_scopes(changed)
+    if affected:
+        _bump_catalog_versions(backend, scopes)
+    return affected
+
+
+def _rpc_get_story_paragraphs(
+    backend: "FakeSupabase", p_story_id: str, p_offset: int, p_limit: int, p_family_id: Optional[str] = None
+):
+    story = next(
+        (
+            row
+            for row in backend.tables.get("stories", [])
+            if row["id"] == p_story_id
+            and row.get("is_published")
+            and (not p_family_id or row.get("family_id") == p_family_id)
+        ),
+        None,
+    )
+    paragraphs = (story or {}).get("paragraphs") or []
+    return [
+        {"paragraph_index": index, "paragraph": paragraphs[index]}
+        for index in range(p_offset, min(len(paragraphs), p_offset + p_limit))
+    ]
+
+
+def _rpc_claim_media_jobs(backend: "FakeSupabase", p_worker: str, p_limit: int = 1, **_: Any):
+    now = _now_iso()
+    ready = sorted(
+        (
+            row
+            for row in backend.tables.get("media_jobs", [])
+            if row.get("status") == "pending" and str(row.get("run_after") or "") <= now
+        ),
+        key=lambda row: str(row.get("run_after") or ""),
+    )[:p_limit]
+    for row in ready:
+        row.update(
+            status="running",
+            attempts=int(row.get("attempts") or 0) + 1,
+            locked_by=p_worker,
+            locked_at=now,
+        )
+    return [dict(row) for row in ready]
+
+
+def _rpc_get_read_counts_by_story(backend: "FakeSupabase", p_family_id: Optional[str] = None):
+    counts: Dict[str, int] = {}
+    for row in backend.tables.get("reading_log", []):
+        if p_family_id and row.get("family_id") != p_family_id:
+            continue
+        if row.get("story_id"):
+            counts[row["story_id"]] = counts.get(row["story_id"], 0) + 1
+    titles = {row["id"]: row.get("title") for row in backend.tables.get("stories", [])}
+    ranking = [
+        {"story_id": story_id, "title": titles.get(story_id), "read_count": count}
+        for story_id, count in counts.items()
+    ]
+    return sorted(ranking, key=lambda item: item["read_count"], reverse=True)
+
+
+def _reading_history_rows(
+    backend: "FakeSupabase",
+    p_from: Optional[str] = None,
+    p_to: Optional[str] = None,
+    p_collection_id: Optional[str] = None,
+    p_source: Optional[str] = None,
+    p_family_id: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    titles = {row["id"]: row.get("title") for row in backend.tables.get("stories", [])}
+    names = {row["id"]: row.get("name") for row in backend.tables.get("collections", [])}
+    rows = []
+    for row in backend.tables.get("reading_log", []):
+        created_at = str(row.get("created_at") or "")
+        if p_from and created_at < p_from:
+            continue
+        if p_to and created_at >= p_to:
+            continue
+        if p_collection_id and row.get("collection_id") != p_collection_id:
+            continue
+        if p_source and row.get("source") != p_source:
+            continue
+        if p_family_id and row.get("family_id") != p_family_id:
+            continue
+        rows.append(
+            {
+                "id": row.get("id"),
+                "created_at": row.get("created_at"),
+                "source": row.get("source"),
+                "story_id": row.get("story_id"),
+                "collection_id": row.get("collection_id"),
+                "title": titles.get(row.get("story_id")),
+                "collection_name": names.get(row.get("collection_id")),
+                "family_id": row.get("family_id"),
+            }
+        )
+    return rows
+
+
+def _history_key(row: Dict[str, Any]) -> tuple:
+    return str(row["created_at"]), str(row["id"])
+
+
+def _rpc_get_reading_history(
+    backend: "FakeSupabase",
+    p_limit: int = 20,
+    p_before_created_at: Optional[str] = None,
+    p_before_id: Optional[str] = None,
+    **filters: Any,
+):
+    rows = _reading_history_rows(backend, **filters)
+    if p_before_created_at:
+        rows = [row for row in rows if _history_key(row) < (p_before_created_at, str(p_before_id))]
+    rows.sort(key=_history_key, reverse=True)
+    return rows[:p_limit]
+
+
+def _rpc_export_reading_history(
+    backend: "FakeSupabase",
+    p_limit: int = 1000,
+    p_after_created_at: Optional[str] = None,
+    p_after_id: Optional[str] = None,
+    **filters: Any,
+):
+    rows = _reading_history_rows(backend, **filters)
+    if p_after_created_at:
+        rows = [row for row in rows if _history_key(row) > (p_after_created_at, str(p_after_id))]
+    rows.sort(key=_history_key)
+    return rows[:p_limit]
+
+
+class FakeSupabase:
+    """Cliente falso: tabelas em memória, latência injetada e contagem de chamadas."""
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, seed: Optional[int] = None) -> None:
+        self.default_family_id = str(uuid.uuid4())
+        self.tables: Dict[str, List[Dict[str, Any]]] = {
+            "families": [
+                {"id": self.default_family_id, "slug": "principal", "name": "Família", "reader_pin": None}
+            ]
+        }
+        self.catalog_version = 0
+        self.files: Dict[tuple, bytes] = {}
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.lock = threading.RLock()
+        self.calls: Dict[str, int] = {}
+        self._calls_lock = threading.Lock()
+        self._rng = random.Random(seed)
+        self.storage = FakeStorage(self)
+        self.rpc_handlers: Dict[str, Callable[..., Any]] = {
+            "bulk_update_stories": _rpc_bulk_update_stories,
+            "get_story_paragraphs": _rpc_get_story_paragraphs,
+            "get_read_counts_by_story": _rpc_get_read_counts_by_story,
+            "reading_log_partitions": lambda backend, **_: [],
+            "ensure_reading_log_partitions": lambda backend, **_: None,
+            "apply_reading_log_retention": lambda backend, **_: 0,
+            "claim_media_jobs": _rpc_claim_media_jobs,
+            "get_reading_history": _rpc_get_reading_history,
+            "export_reading_history": _rpc_export_reading_history,
+        }
+
+    def simulate_call(self, name: str) -> None:
+        with self._calls_lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+            delay = self.latency_ms + (self._rng.uniform(0, self.jitter_ms) if self.jitter_ms else 0)
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+
+    def total_calls(self) -> int:
+        with self._calls_lock:
+            return sum(self.calls.values())
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
+
+    def rpc(self, name: str, params: Optional[Dict[str, Any]] = None) -> FakeRpc:
+        return FakeRpc(self, name, params or {})
+
+
+def seed_catalog(
+    client: FakeSupabase,
+    collections: int = 5,
+    stories_per_collection: int = 20,
+    paragraphs_per_story: int = 12,
+    seed: int = 7,
+    family_id: Optional[str] = None,
+) -> None:
+    """Preenche o cliente falso com um catálogo publicado de tamanho configurável (na família padrão, se não informada)."""
+
+    from story_artifacts import build_story_artifacts
+
+    rng = random.Random(seed)
+    words = ["era", "uma", "vez", "um", "menino", "corajoso", "floresta", "lua", "estrela", "dragão", "amigo", "noite"]
+    for c_index in range(collections):
+        collection = FakeQuery(client, "collections")._new_row(
+            {
+                "name": f"Coleção {c_index + 1}",
+                "description": "Histórias para dormir",
+                "sort_order": c_index,
+                "is_active": True,
+                "family_id": family_id or client.default_family_id,
+            }
+        )
+        client.tables.setdefault("collections", []).append(collection)
+        for s_index in range(stories_per_collection):
+            body = "\n\n".join(
+                " ".join(rng.choice(words) for _ in range(rng.randint(30, 80)))
+                for _ in range(paragraphs_per_story)
+            )
+            story = FakeQuery(client, "stories")._new_row(
+                {
+                    "collection_id": collection["id"],
+                    "title": f"História {c_index + 1}.{s_index + 1}",
+                    "body": body,
+                    "image_url": None,
+                    "audio_url": None,
+                    "is_published": True,
+                    "sort_order": s_index,
+                    "duration_seconds": None,
+                }
+            )
+            story.update(build_story_artifacts(body))
+            client.tables.setdefault("stories", []).append(story)
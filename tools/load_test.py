@@ -0,0 +1,330 @@
+"""Teste de carga com várias sessões simultâneas do app contra um Supabase falso.
+
+Cada sessão é um ``AppTest`` do Streamlit (sessão isolada, com seu próprio
+session_state) rodando app.py de verdade. O cliente Supabase é trocado por
+``FakeSupabase`` (tools/fake_supabase.py) com latência configurável, então o
+resultado mede o custo do app e do cache, não da rede.
+
+O ``AppTest`` usa um Runtime global e não roda em várias threads ao mesmo tempo,
+por isso as sessões simultâneas são processos separados. Com
+``--sessions-per-process`` maior que 1, cada processo alterna entre várias
+sessões a cada rerun, compartilhando o cache do processo como num servidor real.
+
+Sessões de leitura: PIN (reader_pin_gate) → escolhe uma coleção → "História da
+noite" → "Voltar para lista" → abre uma história manualmente → próxima página.
+Sessões de admin: login → troca a coleção gerenciada a cada rerun.
+
+Uso (na raiz do repositório):
+
+    python -m tools.load_test --readers 20 --admins 2 --iterations 5 --latency-ms 40
+    python -m tools.load_test --readers 20 --sessions-per-process 10
+
+Relata vazão (reruns/s), latência por rerun (p50/p95/p99), chamadas ao
+backend por segundo e, com ``--memory``, memória alocada por sessão.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+
+APP_PATH = str(Path(__file__).resolve().parent.parent / "app.py")
+READER_PIN = "1234"
+ADMIN_USERNAME = "admin"
+ADMIN_PASSWORD = "senha-do-teste"
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Percentil por interpolação linear (values não precisa estar ordenado)."""
+
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+class Session:
+    """Uma sessão do app com cronometragem de cada rerun."""
+
+    def __init__(self, mode: str, timeout: float) -> None:
+        from streamlit.testing.v1 import AppTest
+
+        self.app = AppTest.from_file(APP_PATH, default_timeout=timeout)
+        self.app.secrets["READER_PIN"] = READER_PIN
+        self.app.secrets["ADMIN_USERNAME"] = ADMIN_USERNAME
+        self.app.secrets["ADMIN_PASSWORD"] = ADMIN_PASSWORD
+        if mode == "admin":
+            self.app.query_params["mode"] = "admin"
+        self.latencies: List[float] = []
+        self.errors = 0
+
+    def run(self) -> None:
+        started = time.perf_counter()
+        self.app.run()
+        self.latencies.append(time.perf_counter() - started)
+        if self.app.exception:
+            self.errors += 1
+
+    def find_button(self, label: Optional[str] = None, key_prefix: Optional[str] = None, rng=None):
+        matches = [
+            button
+            for button in self.app.button
+            if (label is None or button.label == label)
+            and (key_prefix is None or str(button.key or "").startswith(key_prefix))
+            and not button.disabled
+        ]
+        if not matches:
+            return None
+        return rng.choice(matches) if rng else matches[0]
+
+    def click(self, **criteria) -> bool:
+        button = self.find_button(**criteria)
+        if button is None:
+            return False
+        button.click()
+        self.run()
+        return True
+
+    def fill(self, label: str, value: str) -> None:
+        for widget in self.app.text_input:
+            if widget.label == label:
+                widget.input(value)
+                return
+
+
+def reader_scenario(session: Session, iterations: int, rng: random.Random) -> Iterator[None]:
+    session.run()
+    yield
+
+    # reader_pin_gate
+    session.fill("PIN", READER_PIN)
+    session.click(label="Entrar")
+    yield
+
+    for _ in range(iterations):
+        session.click(key_prefix="collection_btn_", rng=rng)
+        yield
+        session.click(label="História da noite")
+        yield
+        session.click(key_prefix="next_page_")
+        yield
+        session.click(label="Voltar para lista")
+        yield
+        if session.click(key_prefix="story_btn_", rng=rng):
+            yield
+            session.click(label="Voltar para lista")
+            yield
+
+
+def admin_scenario(session: Session, iterations: int, rng: random.Random) -> Iterator[None]:
+    session.run()
+    yield
+
+    session.fill("Usuário", ADMIN_USERNAME)
+    session.fill("Senha", ADMIN_PASSWORD)
+    session.click(label="Entrar")
+    yield
+
+    for _ in range(iterations):
+        selectboxes = [s for s in session.app.selectbox if s.key == "stories_collection_select"]
+        if selectboxes and selectboxes[0].options:
+            # As opções do admin são índices (range), então o valor é o próprio índice
+            selectboxes[0].set_value(rng.randrange(len(selectboxes[0].options)))
+        session.run()
+        yield
+
+
+def install_fake_backend(args):
+    """Troca o cliente Supabase do processo pelo substituto em memória."""
+
+    # Cópia local do catálogo isolada para não reaproveitar dados de outra execução
+    os.environ.setdefault(
+        "CATALOG_SNAPSHOT_PATH", os.path.join(tempfile.mkdtemp(), "catalog_snapshot.sqlite3")
+    )
+
+    import supabase_client
+    from tools.fake_supabase import FakeSupabase, seed_catalog
+
+    fake = FakeSupabase(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, seed=args.seed)
+    seed_catalog(
+        fake,
+        collections=args.collections,
+        stories_per_collection=args.stories_per_collection,
+        paragraphs_per_story=args.paragraphs,
+        seed=args.seed,
+    )
+    supabase_client._client = fake
+    supabase_client._client_ready = True
+    return fake
+
+
+def _run_worker(jobs, args, start_at: float) -> Dict[str, object]:
+    """Executa algumas sessões num processo, alternando um rerun de cada por vez."""
+
+    fake = install_fake_backend(args)
+
+    if args.memory:
+        tracemalloc.start()
+        memory_before = tracemalloc.get_traced_memory()[0]
+
+    sessions = []
+    for kind, index in jobs:
+        session = Session(kind, args.timeout)
+        scenario = reader_scenario if kind == "reader" else admin_scenario
+        rng = random.Random(args.seed + index)
+        sessions.append((kind, session, scenario(session, args.iterations, rng)))
+
+    # Todos os processos começam juntos para que as sessões realmente se sobreponham
+    time.sleep(max(0.0, start_at - time.time()))
+
+    active = list(sessions)
+    while active:
+        for item in list(active):
+            try:
+                next(item[2])
+            except StopIteration:
+                active.remove(item)
+
+    memory = None
+    if args.memory:
+        memory = tracemalloc.get_traced_memory()[0] - memory_before
+        tracemalloc.stop()
+
+    return {
+        "latencies": [(kind, session.latencies) for kind, session, _ in sessions],
+        "errors": [(kind, session.errors) for kind, session, _ in sessions],
+        "calls": dict(fake.calls),
+        "memory": memory,
+    }
+
+
+def run_load_test(args) -> Dict[str, object]:
+    jobs = [("reader", index) for index in range(args.readers)]
+    jobs += [("admin", args.readers + index) for index in range(args.admins)]
+    per_process = max(1, args.sessions_per_process)
+    groups = [jobs[i:i + per_process] for i in range(0, len(jobs), per_process)]
+
+    # Tempo para todos os processos importarem o Streamlit antes da largada
+    start_at = time.time() + args.startup_seconds
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=max(1, len(groups)), mp_context=context) as pool:
+        futures = [pool.submit(_run_worker, group, args, start_at) for group in groups]
+        results = [future.result() for future in futures]
+    elapsed = time.time() - start_at
+
+    calls: Dict[str, int] = {}
+    for result in results:
+        for kind, count in result["calls"].items():
+            calls[kind] = calls.get(kind, 0) + count
+    total_calls = sum(calls.values())
+
+    memory_values = [result["memory"] for result in results if result["memory"] is not None]
+    memory_per_session = sum(memory_values) / len(jobs) if memory_values and jobs else None
+
+    report: Dict[str, object] = {
+        "sessions": len(jobs),
+        "processes": len(groups),
+        "elapsed_seconds": round(elapsed, 3),
+        "backend_latency_ms": args.latency_ms,
+        "backend_calls": total_calls,
+        "backend_calls_per_second": round(total_calls / elapsed, 2) if elapsed else 0,
+        "backend_calls_by_kind": dict(sorted(calls.items())),
+        "memory_per_session_kib": round(memory_per_session / 1024, 1) if memory_per_session is not None else None,
+        "by_mode": {},
+    }
+
+    all_latencies: List[float] = []
+    for mode in ("reader", "admin"):
+        latencies = [
+            value
+            for result in results
+            for kind, values in result["latencies"]
+            if kind == mode
+            for value in values
+        ]
+        errors = sum(
+            count for result in results for kind, count in result["errors"] if kind == mode
+        )
+        if not latencies:
+            continue
+        all_latencies.extend(latencies)
+        report["by_mode"][mode] = {
+            "reruns": len(latencies),
+            "errors": errors,
+            "mean_ms": round(statistics.fmean(latencies) * 1000, 1),
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        }
+
+    report["reruns"] = len(all_latencies)
+    report["throughput_reruns_per_second"] = round(len(all_latencies) / elapsed, 2) if elapsed else 0
+    return report
+
+
+def print_report(report: Dict[str, object]) -> None:
+    print(
+        f"Sessões: {report['sessions']} em {report['processes']} processo(s)"
+        f"  Tempo total: {report['elapsed_seconds']} s"
+    )
+    print(f"Vazão: {report['throughput_reruns_per_second']} reruns/s ({report['reruns']} reruns)")
+    print(
+        f"Backend: {report['backend_calls']} chamadas, {report['backend_calls_per_second']}/s"
+        f" (latência injetada {report['backend_latency_ms']} ms)"
+    )
+    if report["memory_per_session_kib"] is not None:
+        print(f"Memória por sessão: {report['memory_per_session_kib']} KiB")
+    for mode, stats in report["by_mode"].items():
+        print(
+            f"  {mode:<6} reruns={stats['reruns']:<5} erros={stats['errors']:<3}"
+            f" p50={stats['p50_ms']} ms  p95={stats['p95_ms']} ms  p99={stats['p99_ms']} ms"
+        )
+    for kind, count in report["backend_calls_by_kind"].items():
+        print(f"    {kind}: {count}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--readers", type=int, default=10, help="sessões de leitura simultâneas")
+    parser.add_argument("--admins", type=int, default=1, help="sessões de admin simultâneas")
+    parser.add_argument("--iterations", type=int, default=3, help="repetições do roteiro por sessão")
+    parser.add_argument("--latency-ms", type=float, default=30.0, help="latência injetada por chamada ao backend")
+    parser.add_argument("--jitter-ms", type=float, default=10.0, help="variação aleatória somada à latência")
+    parser.add_argument("--collections", type=int, default=5)
+    parser.add_argument("--stories-per-collection", type=int, default=20)
+    parser.add_argument("--paragraphs", type=int, default=12, help="parágrafos por história")
+    parser.add_argument("--timeout", type=float, default=60.0, help="tempo máximo de cada rerun (s)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument(
+        "--sessions-per-process", type=int, default=1,
+        help="sessões alternadas dentro de cada processo (compartilham o cache do processo)",
+    )
+    parser.add_argument(
+        "--startup-seconds", type=float, default=5.0,
+        help="espera para os processos carregarem antes da largada sincronizada",
+    )
+    parser.add_argument("--memory", action="store_true", help="mede memória por sessão (tracemalloc, mais lento)")
+    parser.add_argument("--json", dest="json_path", help="grava o relatório em JSON neste arquivo")
+    args = parser.parse_args()
+
+    report = run_load_test(args)
+    print_report(report)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
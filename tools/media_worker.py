@@ -0,0 +1,129 @@
+"""Worker da fila de mídia (tabela ``media_jobs``, ver media_jobs.py).
+
+O processo principal reserva jobs com ``claim_media_jobs`` (vários workers podem
+rodar ao mesmo tempo, em máquinas diferentes, sem pegar o mesmo job) e os
+distribui para um pool de processos. Cada processo do pool cria seu próprio
+cliente Supabase. Falhas voltam para a fila com espera crescente até
+``max_attempts``; depois disso o job fica como falho e aparece no painel admin.
+
+Uso (na raiz do repositório, com SUPABASE_URL e SUPABASE_ANON_KEY no ambiente ou
+em ``.streamlit/secrets.toml``):
+
+    python -m tools.media_worker                 # roda sem parar
+    python -m tools.media_worker --once          # esvazia a fila e sai
+    python -m tools.media_worker --processes 4
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional
+import argparse
+import os
+import socket
+import sys
+import time
+import traceback
+
+from media_jobs import next_retry_at, process_media_job
+from stories_repository import claim_media_jobs, complete_media_job, fail_media_job
+from supabase_client import create_client_from_environment
+
+
+_worker_client = None
+
+
+def _init_worker() -> None:
+    global _worker_client
+    _worker_client = create_client_from_environment()
+
+
+def _run_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    if _worker_client is None:
+        raise RuntimeError("Supabase não configurado no processo do worker.")
+    return process_media_job(_worker_client, job)
+
+
+def _finish(client, job: Dict[str, Any], result: Optional[Dict[str, Any]], error: Optional[str]) -> None:
+    owner = job.get("story_id") or job.get("collection_id")
+    label = f"{job.get('kind')} {owner} (tentativa {job.get('attempts')})"
+    if error is None:
+        complete_media_job(client, job["id"], result or {})
+        print(f"[Mídia] Concluído: {label}")
+        return
+
+    retry_at = next_retry_at(int(job.get("attempts") or 0), int(job.get("max_attempts") or 5))
+    fail_media_job(client, job, error, retry_at)
+    status = f"nova tentativa em {retry_at}" if retry_at else "sem mais tentativas"
+    print(f"[Mídia] Falhou: {label}: {error.splitlines()[-1] if error else ''} ({status})")
+
+
+def run_worker(processes: int, once: bool, poll_seconds: float) -> int:
+    """Processa jobs até a fila esvaziar (``once``) ou para sempre. Retorna quantos foram processados."""
+
+    client = create_client_from_environment()
+    if client is None:
+        print("Supabase não configurado. Defina SUPABASE_URL e SUPABASE_ANON_KEY.")
+        return 0
+
+    worker_name = f"{socket.gethostname()}:{os.getpid()}"
+    processed = 0
+    pool = ProcessPoolExecutor(max_workers=processes, initializer=_init_worker)
+    try:
+        while True:
+            jobs = claim_media_jobs(client, worker_name, limit=processes)
+            if not jobs:
+                if once:
+                    return processed
+                time.sleep(poll_seconds)
+                continue
+
+            futures = []
+            for job in jobs:
+                try:
+                    futures.append((job, pool.submit(_run_job, job)))
+                except BrokenProcessPool:
+                    # Um processo do pool morreu (falta de memória, arquivo que derruba o
+                    # decodificador...): o job reservado volta para a fila como falha
+                    futures.append((job, None))
+
+            broken = False
+            for job, future in futures:
+                try:
+                    if future is None:
+                        raise BrokenProcessPool("pool de processos quebrado antes de receber o job")
+                    result, error = future.result(), None
+                except BrokenProcessPool:
+                    broken = True
+                    result, error = None, traceback.format_exc(limit=3)
+                except Exception:
+                    result, error = None, traceback.format_exc(limit=3)
+                _finish(client, job, result, error)
+                processed += 1
+
+            if broken:
+                print("[Mídia] Pool de processos quebrado; criando um novo.")
+                pool.shutdown(wait=False, cancel_futures=True)
+                pool = ProcessPoolExecutor(max_workers=processes, initializer=_init_worker)
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "--processes", type=int, default=max(1, min(4, os.cpu_count() or 1)),
+        help="processos de trabalho (jobs em paralelo)",
+    )
+    parser.add_argument("--once", action="store_true", help="esvazia a fila e sai")
+    parser.add_argument("--poll-seconds", type=float, default=5.0, help="intervalo entre buscas com a fila vazia")
+    args = parser.parse_args()
+
+    try:
+        processed = run_worker(max(1, args.processes), args.once, args.poll_seconds)
+    except KeyboardInterrupt:
+        sys.exit(130)
+    print(f"Jobs processados: {processed}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Aquecimento do processo: cópia local do catálogo, cliente e revalidação em segundo plano.
+
+No Streamlit Cloud o app hiberna e o primeiro visitante pagaria o import do
+supabase, a criação do cliente e a busca do catálogo. ``start_background_warmup``
+carrega na hora a cópia local do catálogo (catalog_snapshot.py), se existir, e
+dispara numa thread a criação do cliente e a revalidação da cópia contra o banco
+(para a família do primeiro visitante), enquanto a página inicial (e o PIN) ainda
+está sendo exibida. As demais famílias entram no cache na primeira visita.
+
+O processo também garante, a cada ``PARTITION_CHECK_INTERVAL_SECONDS``, as
+partições mensais do histórico de leitura (mês atual e próximos), para as
+leituras não caírem em ``reading_log_default`` quando o app fica meses no ar.
+"""
+
+import threading
+import time
+
+from boot_metrics import mark, measure
+
+
+PARTITION_CHECK_INTERVAL_SECONDS = 6 * 3600
+
+_started = False
+_started_lock = threading.Lock()
+_partitions_checked_at = None
+
+
+def _load_snapshot() -> None:
+    from catalog_cache import seed_entries
+    from catalog_snapshot import load_snapshot
+
+    with measure("carregar cópia local do catálogo"):
+        loaded = load_snapshot()
+    if loaded:
+        entries, versions = loaded
+        seed_entries(entries, versions)
+
+
+def _warm(family_slug: str) -> None:
+    # Imports tardios: o módulo de cache e o cliente só são carregados na thread
+    from catalog_cache import export_entries, revalidate_catalog, warm_catalog
+    from catalog_snapshot import save_snapshot
+    from stories_repository import get_family_by_slug
+    from supabase_client import get_supabase_client
+
+    try:
+        client = get_supabase_client()
+        if client is None:
+            return
+
+        family = get_family_by_slug(client, family_slug)
+        if family is None:
+            return
+
+        with measure("consultar versão do catálogo"):
+            stale = revalidate_catalog(client, family["id"], force=True)
+
+        with measure("aquecer catálogo"):
+            fetched = warm_catalog(client, family["id"])
+        # Sem a tabela de versões não há como revalidar a cópia no próximo boot
+        if fetched and stale is not None:
+            save_snapshot(*export_entries())
+        if fetched:
+            mark(f"processo pronto ({fetched} lista(s) buscada(s) no banco)")
+        else:
+            mark("processo pronto (cópia local válida)")
+    except Exception as exc:  # pragma: no cover - aquecimento nunca derruba o app
+        print(f"[Aquecimento] Falha ao aquecer o catálogo: {exc}")
+
+
+def _ensure_partitions() -> None:
+    from stories_repository import ensure_reading_log_partitions
+    from supabase_client import get_supabase_client
+
+    try:
+        client = get_supabase_client()
+        if client is not None:
+            ensure_reading_log_partitions(client)
+    except Exception as exc:  # pragma: no cover - manutenção nunca derruba o app
+        print(f"[Aquecimento] Falha ao garantir partições do histórico: {exc}")
+
+
+def _schedule_partitions() -> None:
+    global _partitions_checked_at
+    now = time.monotonic()
+    with _started_lock:
+        if _partitions_checked_at is not None and now - _partitions_checked_at < PARTITION_CHECK_INTERVAL_SECONDS:
+            return
+        _partitions_checked_at = now
+    threading.Thread(target=_ensure_partitions, name="reading-log-partitions", daemon=True).start()
+
+
+def start_background_warmup(family_slug: str) -> None:
+    """Inicia o aquecimento (da família ``family_slug``) uma única vez por processo.
+
+    Chamadas seguintes só conferem se já é hora de garantir as partições do histórico.
+    """
+
+    _schedule_partitions()
+
+    global _started
+    with _started_lock:
+        if _started:
+            return
+        _started = True
+
+    mark("primeiro rerun")
+    _load_snapshot()
+    threading.Thread(target=_warm, args=(family_slug,), name="catalog-warmup", daemon=True).start()